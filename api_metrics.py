@@ -0,0 +1,125 @@
+# API Metrics Module
+import re
+import time
+import threading
+from urllib.parse import urlparse
+
+# Collapse object IDs so /api/dcim/devices/12/ and /api/dcim/devices/13/ count as one endpoint
+OBJECT_ID_PATTERN = re.compile(r"/\d+(?=/)")
+
+# Upper bounds (milliseconds) of the latency histogram buckets; slower requests land in the last bucket
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def endpoint_key(url):
+    return OBJECT_ID_PATTERN.sub("/{id}", urlparse(url).path)
+
+
+def latency_bucket(milliseconds):
+    for index, bound in enumerate(LATENCY_BUCKETS_MS):
+        if milliseconds <= bound:
+            return index
+    return len(LATENCY_BUCKETS_MS)
+
+
+def bucket_labels():
+    return [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+
+
+# Totals for one "METHOD /path/" endpoint
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.bytes = 0
+        self.retries = 0
+        self.errors = 0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, seconds, size, retries, ok):
+        self.requests += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.bytes += size
+        self.retries += retries
+        self.errors += not ok
+        self.histogram[latency_bucket(seconds * 1000)] += 1
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "seconds": round(self.seconds, 6),
+            "max_seconds": round(self.max_seconds, 6),
+            "bytes": self.bytes,
+            "retries": self.retries,
+            "errors": self.errors,
+            "latency_histogram": dict(zip(bucket_labels(), self.histogram)),
+        }
+
+
+# Retries urllib3 made before this response (set when the session's adapter has a Retry policy)
+def retry_count(response):
+    retries = getattr(response.raw, "retries", None)
+    history = getattr(retries, "history", None)
+    return len(history) if history else 0
+
+
+# Size of the response body as received (compressed size when the server sent Content-Length)
+def response_size(response):
+    length = response.headers.get("Content-Length")
+    if length and length.isdigit():
+        return int(length)
+    return len(response.content)
+
+
+# Count every HTTP request a requests session sends, grouped by method and endpoint, with latency,
+# response size and retries. Installed as a response hook; the lock is needed because listing pages
+# are fetched from a thread pool. With record_events each request is also kept for the JSON trace.
+class RequestCounter:
+    def __init__(self, record_events=False):
+        self.total = 0
+        self.by_endpoint = {}
+        self.stats = {}
+        self.events = [] if record_events else None
+        self._lock = threading.Lock()
+
+    def __call__(self, response, *args, **kwargs):
+        key = f"{response.request.method} {endpoint_key(response.request.url)}"
+        seconds = response.elapsed.total_seconds()
+        size = response_size(response)
+        retries = retry_count(response)
+        with self._lock:
+            self.total += 1
+            self.by_endpoint[key] = self.by_endpoint.get(key, 0) + 1
+            self.stats.setdefault(key, EndpointStats()).add(seconds, size, retries, response.ok)
+            if self.events is not None:
+                self.events.append({
+                    "endpoint": key,
+                    "status": response.status_code,
+                    "end": time.perf_counter(),
+                    "seconds": seconds,
+                    "bytes": size,
+                    "retries": retries,
+                    "thread": threading.get_ident(),
+                })
+        return response
+
+    def totals(self):
+        with self._lock:
+            stats = list(self.stats.values())
+        return {
+            "requests": sum(item.requests for item in stats),
+            "seconds": sum(item.seconds for item in stats),
+            "bytes": sum(item.bytes for item in stats),
+            "retries": sum(item.retries for item in stats),
+            "errors": sum(item.errors for item in stats),
+        }
+
+
+# Hook a counter into a session; pass `counter` to count several sessions (one per NetBox instance) together
+def count_requests(session, record_events=False, counter=None):
+    if counter is None:
+        counter = RequestCounter(record_events)
+    session.hooks["response"].append(counter)
+    return counter
@@ -0,0 +1,763 @@
+# Benchmark Module
+# Usage: python benchmark.py <benchmark_name> [options]
+import os
+import sys
+import json
+import glob
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+from exporters import CsvStreamWriter, ColumnWidthTracker, stream_csv_to_xlsx
+from mock_netbox import INVENTORY_SIZES, Inventory, MockNetBoxServer
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Startup budgets in seconds: importing netbox_api, and full runs of the subcommands that can start without a server.
+# "-d --offline" against a missing snapshot exercises get_devices startup up to the point it would read data.
+STARTUP_BUDGETS = {
+    "import netbox_api": 0.5,
+    "-h": 1.0,
+    "-d --offline --snapshot missing.db": 1.0,
+    "-r --offline --snapshot missing.db": 1.0,
+}
+
+# CLI runs measured by the suite benchmark against the mock NetBox server, in order.
+# sync runs before the offline export it feeds; update_age runs last because it changes the inventory.
+SUITE_COMMANDS = (
+    "get_devices",
+    "get_devices --backend raw",
+    "get_devices --backend graphql",
+    "get_racks",
+    "rack_occupancy",
+    "sync",
+    "get_devices --offline",
+    "update_age",
+)
+
+# Modules that must only be imported by the subcommands that use them
+LAZY_MODULES = ("pandas", "openpyxl")
+
+# Same column layout as netbox_api.headers
+headers = ['Name', 'Status', 'Site', 'Rack', 'Role', 'Manufacturer', 'Type', 'Owner', 'Birthday', 'Age (Months)', 'Service Contract', 'Warranty', 'Serial Number', 'Platform', 'Software', 'SW_Version', 'Primary IP']
+
+
+# Build a synthetic device row shaped like the ones get_devices produces
+def synthetic_device(index):
+    return {
+        'Name': f"device-{index:06d}",
+        'Status': 'Active',
+        'Site': f"site-{index % 40:02d}",
+        'Rack': f"rack-{index % 3000:04d}",
+        'Role': 'Switch',
+        'Manufacturer': 'Cisco',
+        'Type': 'C9300-48P',
+        'Owner': 'netops',
+        'Birthday': '2019-06-01',
+        'Age (Months)': 52,
+        'Service Contract': 'SC-1001',
+        'Warranty': '2025-06-01',
+        'Serial Number': f"FOC{index:08d}",
+        'Platform': 'ios-xe',
+        'SW_Version': '17.9.4',
+        'Primary IP': f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}/24",
+    }
+
+
+# Device values shaped like netbox_api.device_values returns them; 30% have no stored age
+def synthetic_values(index):
+    return {
+        'name': f"device-{index:06d}",
+        'status': 'Active' if index % 10 else 'Planned',
+        'site': f"site-{index % 40:02d}",
+        'rack': f"rack-{index % 3000:04d}",
+        'role': 'Switch',
+        'manufacturer': 'Cisco',
+        'device_type': 'C9300-48P',
+        'serial': f"FOC{index:08d}",
+        'platform': 'ios-xe',
+        'primary_ip': f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}/24",
+        'custom_fields': {
+            'owner': 'netops',
+            'Birthday': f"{2015 + index % 8}-{index % 12 + 1:02d}-{index % 28 + 1:02d}",
+            'age': None if index % 10 < 3 else index % 120,
+            'service_contract': 'SC-1001',
+            'warranty': None,
+            'SW': None,
+            'SW_Version': '17.9.4',
+        },
+    }
+
+
+# Per-row transform (one dict and one strptime per device) against the columnar DataFrame
+# transform, each followed by its CSV write; the two CSV files must be identical
+def bench_transform(size, repeat):
+    from netbox_api import assemble_device_row, headers as export_headers
+    from columnar import build_device_frame, write_frame_csv
+
+    values = [synthetic_values(index) for index in range(size)]
+    statuses = ['active']
+    timings = {('rows', 'transform'): [], ('rows', 'csv'): [], ('columnar', 'transform'): [], ('columnar', 'csv'): []}
+    with tempfile.TemporaryDirectory() as directory:
+        rows_path = os.path.join(directory, "rows.csv")
+        columnar_path = os.path.join(directory, "columnar.csv")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = [row for row in (assemble_device_row(**item) for item in values) if row['Status'].lower() in statuses]
+            middle = time.perf_counter()
+            with CsvStreamWriter(rows_path, export_headers) as csv_stream:
+                for row in rows:
+                    csv_stream.write(row)
+            timings[('rows', 'transform')].append(middle - start)
+            timings[('rows', 'csv')].append(time.perf_counter() - middle)
+
+            start = time.perf_counter()
+            frame = build_device_frame(values, export_headers, statuses)
+            middle = time.perf_counter()
+            write_frame_csv(frame, columnar_path)
+            timings[('columnar', 'transform')].append(middle - start)
+            timings[('columnar', 'csv')].append(time.perf_counter() - middle)
+
+        with open(rows_path, 'rb') as rows_file, open(columnar_path, 'rb') as columnar_file:
+            identical = rows_file.read() == columnar_file.read()
+
+    best = {key: min(seconds) for key, seconds in timings.items()}
+    print(f"{'path':<10} {'transform (s)':>14} {'csv (s)':>10} {'total (s)':>10} {'us/device':>10}")
+    for name in ('rows', 'columnar'):
+        total = best[(name, 'transform')] + best[(name, 'csv')]
+        print(f"{name:<10} {best[(name, 'transform')]:>14.3f} {best[(name, 'csv')]:>10.3f} {total:>10.3f} {total / size * 1e6:>10.2f}")
+    print(f"Transform speedup (rows/columnar): {best[('rows', 'transform')] / best[('columnar', 'transform')]:.2f}x at {size} devices")
+    if not identical:
+        print("FAIL: the columnar CSV differs from the per-row CSV")
+        return 1
+    print("OK: both transforms write identical CSV")
+    return 0
+
+
+# Sharded rack workbooks rendered with 1..N worker processes; with one shard per site the
+# wall time should drop with the process count until it reaches the core or shard count
+def bench_shards(racks, devices_per_rack, sites, process_counts):
+    from rack_shards import write_rack_shards
+
+    header = ["Device Name", "Role", "Type", "Manufacturer", "Rack Unit"]
+    entries = []
+    for index in range(racks):
+        rack_info = {"id": index + 1, "name": f"rack-{index + 1:05d}", "site": f"site-{index % sites:03d}", "location": None, "tenant": None}
+        rows = [[f"device-{index:05d}-{slot:02d}", "Switch", "C9300-48P", "Cisco", f"{42 - slot:02d}"] for slot in range(devices_per_rack)]
+        entries.append((rack_info, rows))
+
+    print(f"{racks} racks x {devices_per_rack} devices in {sites} site shards, {os.cpu_count()} CPU cores")
+    print(f"{'processes':>10} {'seconds':>10} {'speedup':>8}")
+    baseline = None
+    for processes in process_counts:
+        with tempfile.TemporaryDirectory() as directory:
+            start = time.perf_counter()
+            write_rack_shards(entries, "site", header, processes, directory)
+            seconds = time.perf_counter() - start
+        baseline = baseline or seconds
+        print(f"{processes:>10} {seconds:>10.3f} {baseline / seconds:>7.2f}x")
+    return 0
+
+
+# Rack occupancy: building the bitmaps from raw device dicts, then the "which racks at site X
+# fit an N-U device" query in memory and from the occupancy cached in a snapshot database
+def bench_occupancy(racks, devices_per_rack, sites, units, repeat):
+    import sqlite3
+    from rack_occupancy import build_occupancy, load_occupancy, racks_that_fit, refresh_occupancy
+
+    device_types = {1: {"id": 1, "u_height": 1.0}, 2: {"id": 2, "u_height": 2.0}, 3: {"id": 3, "u_height": 4.0}}
+    rack_items = [{"id": index + 1, "name": f"rack-{index + 1:05d}", "site": {"slug": f"site-{index % sites:03d}"}, "u_height": 42}
+                  for index in range(racks)]
+    device_items = []
+    for index in range(racks * devices_per_rack):
+        rack_id = index // devices_per_rack + 1
+        slot = index % devices_per_rack
+        device_items.append({"id": index + 1, "name": f"device-{index:06d}", "rack": {"id": rack_id}, "position": slot * 3 + 1,
+                             "device_type": {"id": index % 3 + 1}, "face": {"value": "front"}})
+
+    build_seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        occupancy = build_occupancy(rack_items, device_items, device_types)
+        build_seconds.append(time.perf_counter() - start)
+
+    site = "site-001"
+    memory_seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fits = racks_that_fit(occupancy, units, site)
+        memory_seconds.append(time.perf_counter() - start)
+
+    conn = sqlite3.connect(":memory:")
+    for kind in ("racks", "devices", "device_types"):
+        conn.execute(f"CREATE TABLE {kind} (id INTEGER PRIMARY KEY, last_updated TEXT, data TEXT NOT NULL)")
+    conn.executemany("INSERT INTO racks VALUES (?, NULL, ?)", [(item["id"], json.dumps(item)) for item in rack_items])
+    conn.executemany("INSERT INTO devices VALUES (?, NULL, ?)", [(item["id"], json.dumps(item)) for item in device_items])
+    conn.executemany("INSERT INTO device_types VALUES (?, NULL, ?)", [(key, json.dumps(item)) for key, item in device_types.items()])
+    refresh_occupancy(conn)
+    cached_seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cached_fits = racks_that_fit(load_occupancy(conn, site, units), units, site)
+        cached_seconds.append(time.perf_counter() - start)
+    conn.close()
+
+    print(f"{racks} racks, {len(device_items)} devices, {sites} sites; fit query for {units}U at {site}")
+    print(f"build bitmaps:        {min(build_seconds) * 1000:>8.1f} ms")
+    print(f"fit query (memory):   {min(memory_seconds) * 1000:>8.1f} ms, {len(fits)} racks")
+    print(f"fit query (snapshot): {min(cached_seconds) * 1000:>8.1f} ms, {len(cached_fits)} racks")
+    if [rack.rack_id for rack, _ in fits] != [rack.rack_id for rack, _ in cached_fits]:
+        print("FAIL: the snapshot query returned different racks")
+        return 1
+    print("OK: memory and snapshot queries agree")
+    return 0
+
+
+# Export delta: a baseline export of each size, then a second export with 1% of the devices
+# modified, 0.5% removed and 0.5% added. The per-device cost of the comparison should stay flat.
+def bench_delta(sizes, tolerance):
+    from export_delta import DeltaTracker, delta_summary
+
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            state_path = os.path.join(directory, "state.db")
+            tracker = DeltaTracker(state_path, headers)
+            for index in range(size):
+                tracker.add(synthetic_device(index))
+            tracker.finish()
+
+            start = time.perf_counter()
+            tracker = DeltaTracker(state_path, headers)
+            for index in range(size // 200, size + size // 200):
+                row = synthetic_device(index)
+                if index % 100 == 0:
+                    row['Owner'] = 'sysops'
+                tracker.add(row)
+            summary = delta_summary(tracker.finish())
+            seconds = time.perf_counter() - start
+        results.append((size, seconds))
+        print(f"{size:>8} devices: {seconds:.3f}s ({seconds / size * 1e6:.1f} us/device), {summary}")
+
+    growth = (results[-1][1] / results[-1][0]) / (results[0][1] / results[0][0])
+    print(f"Per-device cost growth from {results[0][0]} to {results[-1][0]} devices: {growth:.2f}x")
+    if growth > tolerance:
+        print(f"FAIL: per-device cost grew more than {tolerance:.1f}x")
+        return 1
+    print("OK: delta comparison scales linearly")
+    return 0
+
+
+# Time a streaming CSV export of `size` synthetic devices
+def time_csv_export(size, directory):
+    path = os.path.join(directory, f"output_{size}.csv")
+    start = time.perf_counter()
+    with CsvStreamWriter(path, headers) as csv_stream:
+        for index in range(size):
+            csv_stream.write(synthetic_device(index))
+    elapsed = time.perf_counter() - start
+    with open(path) as f_object:
+        line_count = sum(1 for _ in f_object)
+    return elapsed, line_count
+
+
+# Regression check: export time per device must stay flat as inventory grows
+def bench_csv_export(sizes, tolerance):
+    print(f"{'devices':>10} {'seconds':>10} {'us/device':>10} {'lines':>10}")
+    per_device = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            elapsed, line_count = time_csv_export(size, directory)
+            if line_count != size + 1:
+                print(f"FAIL: expected {size + 1} lines (header + one row per device), got {line_count}")
+                return 1
+            per_device.append(elapsed / size)
+            print(f"{size:>10} {elapsed:>10.3f} {elapsed / size * 1e6:>10.2f} {line_count:>10}")
+
+    growth = per_device[-1] / per_device[0]
+    print(f"Per-device cost ratio (largest/smallest): {growth:.2f} (tolerance {tolerance:.2f})")
+    if growth > tolerance:
+        print("FAIL: export time is growing faster than linearly with inventory size")
+        return 1
+    print("OK: export time grows linearly with inventory size")
+    return 0
+
+
+# Peak traced memory of a streamed CSV + XLSX export of `size` synthetic devices
+def measure_xlsx_export(size, directory):
+    csv_path = os.path.join(directory, f"output_{size}.csv")
+    xlsx_path = os.path.join(directory, f"output_{size}.xlsx")
+    tracemalloc.start()
+    start = time.perf_counter()
+    width_tracker = ColumnWidthTracker(headers)
+    with CsvStreamWriter(csv_path, headers, width_tracker) as csv_stream:
+        for index in range(size):
+            csv_stream.write(synthetic_device(index))
+    stream_csv_to_xlsx(csv_path, xlsx_path, width_tracker.widths, numeric_headers=('Age (Months)',))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+# Memory check: peak memory of the streamed XLSX export must stay roughly flat as inventory grows
+def bench_xlsx_export(sizes, tolerance):
+    print(f"{'devices':>10} {'seconds':>10} {'peak MiB':>10}")
+    peaks = []
+    with tempfile.TemporaryDirectory() as directory:
+        # Warm-up run so one-off module imports don't count towards the first size
+        measure_xlsx_export(10, directory)
+        for size in sizes:
+            elapsed, peak = measure_xlsx_export(size, directory)
+            peaks.append(peak)
+            print(f"{size:>10} {elapsed:>10.3f} {peak / 2**20:>10.2f}")
+
+    growth = peaks[-1] / peaks[0]
+    print(f"Peak memory ratio (largest/smallest): {growth:.2f} (tolerance {tolerance:.2f})")
+    if growth > tolerance:
+        print("FAIL: XLSX export memory grows with inventory size")
+        return 1
+    print("OK: XLSX export memory stays flat")
+    return 0
+
+
+# Peak traced memory of the record pipeline alone: `size` synthetic devices projected into
+# records and fanned out to the CSV, JSON and SQLite sinks (xlsx_export covers the XLSX spool)
+def measure_pipeline(size, directory):
+    from netbox_api import assemble_device_row, headers as export_headers
+    from record_pipeline import SINK_PATHS, fan_out, open_record_sinks, project_records
+
+    paths = {name: os.path.join(directory, path) for name, path in SINK_PATHS.items()}
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = (assemble_device_row(**synthetic_values(index)) for index in range(size))
+    fan_out(project_records(rows, export_headers), open_record_sinks(['csv', 'json', 'sqlite'], paths, export_headers))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+# Start the mock NetBox server in its own process and return it with its URL. Linux keeps the
+# pre-exec RSS in a child's ru_maxrss, so with the mock inventory in this process every CLI run
+# forked from it would report at least this process's size.
+def start_mock_process(devices):
+    process = subprocess.Popen([sys.executable, "-u", os.path.join(REPO_DIR, "mock_netbox.py"), "--devices", str(devices), "--port", "0"],
+                               stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    banner = process.stdout.readline()
+    if " at " not in banner:
+        process.kill()
+        raise RuntimeError("The mock NetBox server did not start")
+    return process, banner.split(" at ")[1].split()[0]
+
+
+# Memory check of get_devices per transform against the mock NetBox server: peak RSS of each CLI
+# run, plus the traced peak of the record pipeline on its own. The stream transform's peak RSS
+# must stay roughly flat from the smallest to the largest size.
+def bench_pipeline(sizes, transforms, tolerance):
+    print(f"{'devices':>8} {'transform':<10} {'seconds':>9} {'peak RSS MiB':>13}")
+    peaks = {}
+    failures = 0
+    for size in sizes:
+        server, url = start_mock_process(size)
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                prepare_workdir(directory, url)
+                for transform in transforms:
+                    exit_code, elapsed, peak_rss = run_subcommand(f"get_devices --transform {transform}", directory)
+                    failures += exit_code != 0
+                    peaks[(transform, size)] = peak_rss
+                    status = "" if exit_code == 0 else f"  FAIL (exit {exit_code})"
+                    print(f"{size:>8} {transform:<10} {elapsed:>9.2f} {peak_rss / 1024:>13.1f}{status}")
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(f"{'devices':>8} {'pipeline s':>11} {'traced peak MiB':>16}")
+    with tempfile.TemporaryDirectory() as directory:
+        # Warm-up run so one-off module imports don't count towards the first size
+        measure_pipeline(10, directory)
+        for size in sizes:
+            elapsed, peak = measure_pipeline(size, directory)
+            print(f"{size:>8} {elapsed:>11.2f} {peak / 2**20:>16.2f}")
+
+    for transform in transforms:
+        growth = peaks[(transform, sizes[-1])] / peaks[(transform, sizes[0])]
+        print(f"Peak RSS ratio {transform} ({sizes[-1]}/{sizes[0]} devices): {growth:.2f}")
+    if failures:
+        return 1
+    if 'stream' in transforms:
+        growth = peaks[('stream', sizes[-1])] / peaks[('stream', sizes[0])]
+        if growth > tolerance:
+            print(f"FAIL: stream transform peak RSS grew more than {tolerance:.1f}x")
+            return 1
+        print("OK: stream transform memory is bounded by the page size")
+    return 0
+
+
+# Regression check for the shard pool in a multi-command run: get_racks with --shard-by renders
+# its workbooks in a process pool while get_devices and rack_occupancy still run on other threads.
+# A pool forked from that process could hang, so every run must finish within `timeout` seconds
+# and write the shard manifest.
+def bench_multi_shard(size, runs, processes, timeout):
+    arguments = ["netbox_api.py", "-d", "-r", "-o", "--shard-by", "site", "--processes", str(processes)]
+    print(f"{'run':>4} {'seconds':>9}")
+    failures = 0
+    server, url = start_mock_process(size)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            prepare_workdir(directory, url)
+            manifest_path = os.path.join(directory, "rack_details_manifest.json")
+            for run in range(1, runs + 1):
+                if os.path.exists(manifest_path):
+                    os.remove(manifest_path)
+                start = time.perf_counter()
+                try:
+                    exit_code = subprocess.run([sys.executable] + arguments, cwd=directory, stdin=subprocess.DEVNULL,
+                                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=timeout).returncode
+                    status = "" if exit_code == 0 and os.path.exists(manifest_path) else f"  FAIL (exit {exit_code})"
+                except subprocess.TimeoutExpired:
+                    status = f"  FAIL (no exit within {timeout:g}s)"
+                failures += bool(status)
+                print(f"{run:>4} {time.perf_counter() - start:>9.2f}{status}")
+    finally:
+        server.terminate()
+        server.wait()
+    if failures:
+        print(f"FAIL: {failures} of {runs} runs of '{' '.join(arguments[1:])}' failed or hung")
+        return 1
+    print(f"OK: {runs} runs of '{' '.join(arguments[1:])}' finished")
+    return 0
+
+
+# Listing pages of a mock inventory's devices as the server sends them, and its lookup tables
+def device_pages(size, page_size):
+    inventory = Inventory(size, "http://netbox.invalid")
+    devices = list(inventory.devices.values())
+    pages = [json.dumps({"count": size, "results": devices[offset:offset + page_size]}).encode()
+             for offset in range(0, size, page_size)]
+    lookups = {"device_types": inventory.device_types, "manufacturers": inventory.manufacturers,
+               "roles": inventory.roles, "platforms": inventory.platforms}
+    return pages, lookups
+
+
+# Cell values of every sheet of a workbook, so two exports can be compared without their zip timestamps
+def workbook_values(path):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True)
+    values = {sheet.title: list(sheet.iter_rows(values_only=True)) for sheet in workbook.worksheets}
+    workbook.close()
+    return values
+
+
+# get_devices --backend rest against --backend raw. Both backends run through the CLI against the
+# mock NetBox server and must write the same files. In process, listing pages are decoded with
+# json into pynetbox records and rendered to export rows, against the same pages decoded with
+# decode_json (orjson when installed) and read as plain dicts; both must give equal rows. The CLI
+# runs come first: a child forked after the in-process part would inherit its RSS in ru_maxrss.
+def bench_backend(sizes, page_size, repeat):
+    import pynetbox
+    from netbox_api import assemble_device_row, device_values
+    from parallel_fetch import decode_json, orjson
+    from raw_backend import raw_device_values
+
+    failures = 0
+    print(f"{'devices':>8} {'backend':<8} {'seconds':>9} {'peak RSS MiB':>13}")
+    for size in sizes:
+        server, url = start_mock_process(size)
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                prepare_workdir(directory, url)
+                outputs = {}
+                elapsed = {}
+                for backend in ('rest', 'raw'):
+                    exit_code, elapsed[backend], peak_rss = run_subcommand(f"get_devices --backend {backend}", directory)
+                    status = "" if exit_code == 0 else f"  FAIL (exit {exit_code})"
+                    failures += exit_code != 0
+                    print(f"{size:>8} {backend:<8} {elapsed[backend]:>9.2f} {peak_rss / 1024:>13.1f}{status}")
+                    with open(os.path.join(directory, "output.csv"), "rb") as csv_file:
+                        outputs[backend] = (csv_file.read(), workbook_values(os.path.join(directory, "output.xlsx")))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{size:>8} speedup (rest/raw): {elapsed['rest'] / elapsed['raw']:.2f}x")
+        if outputs['rest'] != outputs['raw']:
+            print(f"FAIL: get_devices --backend raw wrote a different output.csv/output.xlsx at {size} devices")
+            failures += 1
+
+    endpoint = pynetbox.api("http://netbox.invalid", token="benchmark").dcim.devices
+    print(f"JSON decoder: {'orjson ' + orjson.__version__ if orjson is not None else 'json (orjson is not installed)'}")
+    print(f"{'devices':>8} {'backend':<8} {'decode (s)':>11} {'rows (s)':>9} {'total (s)':>10} {'us/device':>10}")
+    for size in sizes:
+        pages, lookups = device_pages(size, page_size)
+        timings = {('rest', 'decode'): [], ('rest', 'rows'): [], ('raw', 'decode'): [], ('raw', 'rows'): []}
+        for _ in range(repeat):
+            start = time.perf_counter()
+            records = [endpoint.return_obj(item, endpoint.api, endpoint) for page in pages for item in json.loads(page)["results"]]
+            middle = time.perf_counter()
+            rest_rows = [assemble_device_row(**device_values(record, str(record.status), lookups)) for record in records]
+            timings[('rest', 'decode')].append(middle - start)
+            timings[('rest', 'rows')].append(time.perf_counter() - middle)
+
+            start = time.perf_counter()
+            items = [item for page in pages for item in decode_json(page)["results"]]
+            middle = time.perf_counter()
+            raw_rows = [assemble_device_row(**raw_device_values(item, lookups)) for item in items]
+            timings[('raw', 'decode')].append(middle - start)
+            timings[('raw', 'rows')].append(time.perf_counter() - middle)
+
+        best = {key: min(seconds) for key, seconds in timings.items()}
+        for name in ('rest', 'raw'):
+            total = best[(name, 'decode')] + best[(name, 'rows')]
+            print(f"{size:>8} {name:<8} {best[(name, 'decode')]:>11.3f} {best[(name, 'rows')]:>9.3f} {total:>10.3f} {total / size * 1e6:>10.2f}")
+        rest_total = best[('rest', 'decode')] + best[('rest', 'rows')]
+        raw_total = best[('raw', 'decode')] + best[('raw', 'rows')]
+        print(f"{size:>8} speedup (rest/raw): {rest_total / raw_total:.2f}x")
+        if rest_rows != raw_rows:
+            print(f"FAIL: the raw backend's rows differ from the rest backend's at {size} devices")
+            failures += 1
+
+    if failures:
+        return 1
+    print("OK: both backends export identical rows, CSV and XLSX")
+    return 0
+
+
+# Cumulative import time of netbox_api in seconds, plus any lazy-only modules it pulled in
+def measure_import(directory):
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import netbox_api"],
+                               cwd=directory, capture_output=True, text=True)
+    cumulative = None
+    imported = set()
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line.split("|")
+        module = parts[2].strip()
+        imported.add(module.split(".")[0])
+        # The top-level entry (no indentation) is the module itself
+        if parts[2] == " netbox_api":
+            cumulative = int(parts[1].strip()) / 1e6
+    if completed.returncode != 0 or cumulative is None:
+        raise RuntimeError(f"Importing netbox_api failed:\n{completed.stderr[-2000:]}")
+    return cumulative, sorted(imported.intersection(LAZY_MODULES))
+
+
+# Wall time of a full CLI run with stdin closed, so an unexpected prompt fails fast instead of hanging
+def measure_run(arguments, directory):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "netbox_api.py"] + arguments.split(), cwd=directory,
+                   stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=60)
+    return time.perf_counter() - start
+
+
+# Check import time and side-effect-free startup against STARTUP_BUDGETS. The runs use a scratch
+# copy of the scripts, so they neither read the real config.py nor write netbox_api.log into the repository.
+# None of the measured paths contacts the server.
+def bench_startup(repeat):
+    failures = 0
+    print(f"{'startup path':<40} {'best (s)':>10} {'budget (s)':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        prepare_workdir(directory, "http://127.0.0.1:9")
+        for name, budget in STARTUP_BUDGETS.items():
+            if name == "import netbox_api":
+                results = [measure_import(directory) for _ in range(repeat)]
+                best = min(seconds for seconds, _ in results)
+                eager = results[0][1]
+                if eager:
+                    print(f"FAIL: importing netbox_api also imports {', '.join(eager)}")
+                    failures += 1
+            else:
+                best = min(measure_run(name, directory) for _ in range(repeat))
+            status = "OK" if best <= budget else "FAIL"
+            failures += status == "FAIL"
+            print(f"{name:<40} {best:>10.3f} {budget:>10.2f}  {status}")
+    return 1 if failures else 0
+
+
+# Copy of the scripts in a scratch directory with a config.py pointing at the mock server,
+# so the benchmark never touches the real config.py or the exports in the repository
+def prepare_workdir(directory, netbox_url):
+    for path in glob.glob(os.path.join(REPO_DIR, "*.py")):
+        if os.path.basename(path) != "config.py":
+            shutil.copy(path, directory)
+    with open(os.path.join(directory, "config.py"), "w") as config_file:
+        config_file.write("NETBOX_TOKEN = 'benchmark'\n")
+        config_file.write(f"NETBOX_URL = '{netbox_url}'\n")
+
+
+# Run one CLI subcommand and return its exit code, wall time and peak RSS in KiB.
+# os.wait4 reports the resource usage of this child alone (ru_maxrss is KiB on Linux).
+def run_subcommand(arguments, directory):
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "netbox_api.py"] + arguments.split(), cwd=directory,
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, elapsed, usage.ru_maxrss
+
+
+# Wall time of the same size and command in an earlier report, if it has one
+def baseline_seconds(baseline, size, command):
+    for result in (baseline or {}).get("results", []):
+        if result["size"] == size and result["command"] == command:
+            return result["wall_seconds"]
+    return None
+
+
+# Run every CLI subcommand against the mock NetBox server for each inventory size and
+# write wall time, HTTP requests, bytes transferred and peak RSS to a JSON report
+def bench_suite(sizes, commands, latency, report_path, baseline_path, error_rate=0.0, compress=False):
+    baseline = None
+    if baseline_path:
+        with open(baseline_path) as f_object:
+            baseline = json.load(f_object)
+
+    results = []
+    failures = 0
+    print(f"{'size':>6} {'command':<32} {'seconds':>9} {'requests':>9} {'MiB sent':>9} {'peak RSS MiB':>13} {'vs baseline':>12}")
+    for size in sizes:
+        server = MockNetBoxServer(INVENTORY_SIZES[size], latency, error_rate=error_rate, compress=compress).start()
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                prepare_workdir(directory, server.url)
+                for command in commands:
+                    server.stats.reset()
+                    exit_code, elapsed, peak_rss = run_subcommand(command, directory)
+                    stats = server.stats.snapshot()
+                    failures += exit_code != 0
+                    results.append({
+                        "size": size,
+                        "devices": INVENTORY_SIZES[size],
+                        "command": command,
+                        "exit_code": exit_code,
+                        "wall_seconds": round(elapsed, 3),
+                        "http_requests": stats["requests"],
+                        "bytes_sent": stats["bytes_sent"],
+                        "bytes_received": stats["bytes_received"],
+                        "peak_rss_kib": peak_rss,
+                        "requests_by_endpoint": stats["by_endpoint"],
+                    })
+                    previous = baseline_seconds(baseline, size, command)
+                    ratio = f"{elapsed / previous:.2f}x" if previous else "-"
+                    status = "" if exit_code == 0 else f"  FAIL (exit {exit_code})"
+                    print(f"{size:>6} {command:<32} {elapsed:>9.2f} {stats['requests']:>9} {stats['bytes_sent'] / 2**20:>9.1f} "
+                          f"{peak_rss / 1024:>13.1f} {ratio:>12}{status}")
+        finally:
+            server.stop()
+
+    report = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "latency_seconds": latency,
+        "error_rate": error_rate,
+        "gzip": compress,
+        "results": results,
+    }
+    with open(report_path, "w") as f_object:
+        json.dump(report, f_object, indent=2)
+    print(f"Report written to {report_path}")
+    return 1 if failures else 0
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="benchmark.py")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    csv_parser = subparsers.add_parser("csv_export", help="Streaming CSV export scaling check")
+    csv_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 40000])
+    csv_parser.add_argument("--tolerance", type=float, default=2.0,
+                            help="Maximum allowed growth of the per-device cost between the smallest and largest size")
+
+    xlsx_parser = subparsers.add_parser("xlsx_export", help="Streaming XLSX export peak-memory check")
+    xlsx_parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 4000, 16000])
+    xlsx_parser.add_argument("--tolerance", type=float, default=1.5,
+                             help="Maximum allowed growth of peak memory between the smallest and largest size")
+
+    startup_parser = subparsers.add_parser("startup", help="Import time and startup budget per subcommand")
+    startup_parser.add_argument("--repeat", type=int, default=3)
+
+    transform_parser = subparsers.add_parser("transform", help="Per-row vs columnar report transform")
+    transform_parser.add_argument("--size", type=int, default=100000)
+    transform_parser.add_argument("--repeat", type=int, default=3)
+
+    shards_parser = subparsers.add_parser("shards", help="Sharded rack workbooks by worker process count")
+    shards_parser.add_argument("--racks", type=int, default=2000)
+    shards_parser.add_argument("--devices-per-rack", type=int, default=20)
+    shards_parser.add_argument("--sites", type=int, default=16)
+    shards_parser.add_argument("--processes", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count() or 1}))
+
+    occupancy_parser = subparsers.add_parser("occupancy", help="Rack occupancy bitmaps and fit queries")
+    occupancy_parser.add_argument("--racks", type=int, default=10000)
+    occupancy_parser.add_argument("--devices-per-rack", type=int, default=10)
+    occupancy_parser.add_argument("--sites", type=int, default=20)
+    occupancy_parser.add_argument("--units", type=int, default=4)
+    occupancy_parser.add_argument("--repeat", type=int, default=3)
+
+    pipeline_parser = subparsers.add_parser("pipeline", help="Peak memory of get_devices per transform, and of the record pipeline")
+    pipeline_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    pipeline_parser.add_argument("--transforms", nargs="+", default=["rows", "columnar", "stream"])
+    pipeline_parser.add_argument("--tolerance", type=float, default=1.5,
+                                 help="Maximum allowed growth of the stream transform's peak RSS between the smallest and largest size")
+
+    delta_parser = subparsers.add_parser("delta", help="Export delta comparison scaling check")
+    delta_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    delta_parser.add_argument("--tolerance", type=float, default=2.0,
+                              help="Maximum allowed growth of the per-device cost between the smallest and largest size")
+
+    multi_shard_parser = subparsers.add_parser("multi_shard", help="Repeated -d -r -o --shard-by site runs, failing on a hang")
+    multi_shard_parser.add_argument("--size", type=int, default=5000)
+    multi_shard_parser.add_argument("--runs", type=int, default=8)
+    multi_shard_parser.add_argument("--processes", type=int, default=4)
+    multi_shard_parser.add_argument("--timeout", type=float, default=120.0)
+
+    backend_parser = subparsers.add_parser("backend", help="get_devices REST records vs raw JSON dicts, in process and through the CLI")
+    backend_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    backend_parser.add_argument("--page-size", type=int, default=1000)
+    backend_parser.add_argument("--repeat", type=int, default=3)
+
+    suite_parser = subparsers.add_parser("suite", help="Every CLI subcommand against the mock NetBox server")
+    suite_parser.add_argument("--sizes", nargs="+", choices=list(INVENTORY_SIZES), default=["1k", "10k"])
+    suite_parser.add_argument("--commands", nargs="+", default=list(SUITE_COMMANDS),
+                              help="CLI argument strings to run, e.g. 'get_devices' 'get_racks --rack-fetch per-rack'")
+    suite_parser.add_argument("--latency", type=float, default=0.0, help="Seconds the mock server adds to every request")
+    suite_parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests the mock answers with 503 + Retry-After")
+    suite_parser.add_argument("--gzip", action="store_true", help="Have the mock server gzip its responses")
+    suite_parser.add_argument("--report", default="benchmark_report.json")
+    suite_parser.add_argument("--baseline", default=None, help="Earlier report to compare wall times against")
+
+    args = parser.parse_args(argv)
+    if args.benchmark == "csv_export":
+        return bench_csv_export(sorted(args.sizes), args.tolerance)
+    if args.benchmark == "xlsx_export":
+        return bench_xlsx_export(sorted(args.sizes), args.tolerance)
+    if args.benchmark == "startup":
+        return bench_startup(args.repeat)
+    if args.benchmark == "transform":
+        return bench_transform(args.size, args.repeat)
+    if args.benchmark == "shards":
+        return bench_shards(args.racks, args.devices_per_rack, args.sites, args.processes)
+    if args.benchmark == "occupancy":
+        return bench_occupancy(args.racks, args.devices_per_rack, args.sites, args.units, args.repeat)
+    if args.benchmark == "pipeline":
+        return bench_pipeline(sorted(args.sizes), args.transforms, args.tolerance)
+    if args.benchmark == "delta":
+        return bench_delta(sorted(args.sizes), args.tolerance)
+    if args.benchmark == "multi_shard":
+        return bench_multi_shard(args.size, args.runs, args.processes, args.timeout)
+    if args.benchmark == "backend":
+        return bench_backend(sorted(args.sizes), args.page_size, args.repeat)
+    if args.benchmark == "suite":
+        return bench_suite(args.sizes, args.commands, args.latency, args.report, args.baseline, args.error_rate, args.gzip)
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
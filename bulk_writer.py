@@ -0,0 +1,200 @@
+# Bulk Write Module
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pynetbox
+import requests
+
+# Default number of devices sent in one bulk PATCH request
+DEFAULT_BATCH_SIZE = 100
+
+# Defaults for --write-workers, --write-rate (PATCH requests per second, 0 = unlimited) and --journal
+DEFAULT_WRITE_WORKERS = 4
+DEFAULT_WRITE_RATE = 0
+DEFAULT_JOURNAL_PATH = "update_age.journal"
+
+
+# Work out which devices need a new age, dropping updates that would not change anything
+def plan_age_updates(devices, calculate_age):
+    planned = []
+    skipped = 0
+    for device in devices:
+        birthday = device.custom_fields.get('Birthday')
+        if not birthday:
+            continue
+        new_age = calculate_age(birthday)
+        current_age = device.custom_fields.get('age')
+        if current_age is not None and str(current_age) == str(new_age):
+            skipped += 1
+            continue
+        planned.append({"id": device.id, "name": device.name, "old_age": current_age, "age": new_age})
+    return planned, skipped
+
+
+# Request body for one device in a bulk PATCH to /api/dcim/devices/
+def age_payload(update):
+    return {"id": update["id"], "custom_fields": {"age": update["age"]}}
+
+
+# Token bucket shared by the write workers: `rate` requests per second on average, bursts of up
+# to `burst`. acquire() blocks until a token is free; a rate of 0 never blocks.
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# Append-only JSON-lines checkpoint of an update_age run: the plan first, then one line per
+# written or failed batch. Each line is flushed and fsynced, so a run killed at any point
+# leaves every completed batch on record for --resume.
+class UpdateJournal:
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.plan = None
+        self.done = set()
+        self.failed = {}
+        if resume:
+            self._load()
+        self._file = open(path, 'a' if resume else 'w')
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as journal_file:
+            for line in journal_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A run killed mid-write can leave a partial last line
+                    continue
+                if entry["type"] == "plan":
+                    self.plan = entry
+                elif entry["type"] == "done":
+                    self.done.update(entry["ids"])
+                    for device_id in entry["ids"]:
+                        self.failed.pop(device_id, None)
+                elif entry["type"] == "failed":
+                    self.failed[entry["id"]] = entry["error"]
+
+    def _append(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def record_plan(self, planned, skipped, key):
+        self.plan = {"type": "plan", "key": key, "skipped": skipped, "updates": planned}
+        self._append(self.plan)
+
+    def record_done(self, batch):
+        self._append({"type": "done", "ids": [update["id"] for update in batch]})
+
+    def record_failed(self, update, error):
+        self._append({"type": "failed", "id": update["id"], "error": error})
+
+    # Planned updates not yet written; failed devices are retried
+    def remaining(self, planned):
+        return [update for update in planned if update["id"] not in self.done]
+
+    def close(self):
+        self._file.close()
+
+
+# Raised by bulk_patch when a batch fails with anything but a 400 validation error. `result` holds
+# what was written before the run stopped, and the journal has a done line for each of those batches.
+class BulkWriteAborted(Exception):
+    def __init__(self, error, result):
+        super().__init__(str(error))
+        self.error = error
+        self.result = result
+
+
+# Send one batch. When NetBox rejects it with a 400 validation error, split it in half and retry
+# each half until the devices it rejects are isolated. Any other error (401/403 for an expired or
+# revoked token, 404, 429 or 5xx still failing after the session's retries, connection errors and
+# timeouts) would fail every device the same way, so it is raised instead.
+# Every request waits for a limiter token; results are added under the lock when workers share them.
+def patch_batch(endpoint, batch, result, limiter=None, journal=None, lock=None):
+    lock = lock or threading.Lock()
+    if limiter is not None:
+        limiter.acquire()
+    try:
+        endpoint.update([age_payload(update) for update in batch])
+        with lock:
+            result["changed"] += len(batch)
+            result["requests"] += 1
+            result["written"].extend(update["id"] for update in batch)
+        if journal is not None:
+            journal.record_done(batch)
+    except (pynetbox.RequestError, requests.exceptions.RequestException) as error:
+        with lock:
+            result["requests"] += 1
+        if not isinstance(error, pynetbox.RequestError) or error.req.status_code != 400:
+            raise
+        if len(batch) == 1:
+            with lock:
+                result["failed"] += 1
+                result["errors"].append((batch[0]["name"], str(error)))
+            if journal is not None:
+                journal.record_failed(batch[0], str(error))
+            return
+        middle = len(batch) // 2
+        patch_batch(endpoint, batch[:middle], result, limiter, journal, lock)
+        patch_batch(endpoint, batch[middle:], result, limiter, journal, lock)
+
+
+# Write planned updates as bulk PATCHes of at most batch_size devices each, `workers` batches
+# at a time, throttled by limiter (a TokenBucket) and checkpointed to journal (an UpdateJournal).
+# progress (a progress.ProgressReporter) is advanced after every batch. The first error that isn't
+# a 400 validation error stops the run: batches not yet started are cancelled, the ones in flight
+# finish, and BulkWriteAborted is raised.
+def bulk_patch(endpoint, planned, batch_size=DEFAULT_BATCH_SIZE, skipped=0, progress=None, workers=1, limiter=None, journal=None):
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    result = {"changed": 0, "skipped": skipped, "failed": 0, "requests": 0, "errors": [], "written": []}
+    lock = threading.Lock()
+    batches = [planned[start:start + batch_size] for start in range(0, len(planned), batch_size)]
+
+    def write(batch):
+        patch_batch(endpoint, batch, result, limiter, journal, lock)
+        if progress is not None:
+            with lock:
+                progress.update(len(batch))
+
+    try:
+        if workers <= 1:
+            for batch in batches:
+                write(batch)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(write, batch) for batch in batches]
+                try:
+                    for future in as_completed(futures):
+                        future.result()
+                except BaseException:
+                    executor.shutdown(cancel_futures=True)
+                    raise
+    except (pynetbox.RequestError, requests.exceptions.RequestException) as error:
+        raise BulkWriteAborted(error, result) from error
+    return result
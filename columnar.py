@@ -0,0 +1,140 @@
+# Columnar Transform Module
+# Builds the device report as a pandas DataFrame: one list per column instead of one dict per
+# device, age in months computed for the whole Birthday column at once against a single 'today',
+# status filtering as a mask and the export columns as a projection. The CSV and XLSX writers
+# then read from the frame. pandas is imported lazily so startup doesn't pay for it.
+import csv
+from datetime import datetime
+
+# Export column -> key of the device values (netbox_api.device_values / graphql_device_values)
+VALUE_COLUMNS = {
+    'Name': 'name',
+    'Status': 'status',
+    'Site': 'site',
+    'Rack': 'rack',
+    'Role': 'role',
+    'Manufacturer': 'manufacturer',
+    'Type': 'device_type',
+    'Serial Number': 'serial',
+    'Platform': 'platform',
+    'Primary IP': 'primary_ip',
+}
+
+# Export column -> custom field name
+CUSTOM_FIELD_COLUMNS = {
+    'Owner': 'owner',
+    'Birthday': 'Birthday',
+    'Service Contract': 'service_contract',
+    'Warranty': 'warranty',
+    'SW': 'SW',
+    'SW_Version': 'SW_Version',
+}
+
+# Export column -> key only some device values carry (the instance of a merged multi-instance
+# export); collected when the headers ask for it
+OPTIONAL_VALUE_COLUMNS = {
+    'Instance': 'instance',
+}
+
+AGE_COLUMN = 'Age (Months)'
+
+# Rows per chunk handed to the CSV writer
+CSV_CHUNK_ROWS = 10000
+
+
+# Age in whole months for a column of 'YYYY-MM-DD' birthdays; unparseable or missing dates give NA
+def months_since(birthdays, today):
+    import pandas as pd
+
+    born = pd.to_datetime(birthdays, format='%Y-%m-%d', errors='coerce')
+    return ((today.year - born.dt.year) * 12 + today.month - born.dt.month).astype('Int64')
+
+
+# Collect device values (dicts with the keys of VALUE_COLUMNS plus custom_fields) into columns
+def collect_columns(device_values, headers=()):
+    value_keys = dict(VALUE_COLUMNS)
+    value_keys.update({header: key for header, key in OPTIONAL_VALUE_COLUMNS.items() if header in headers})
+    columns = {header: [] for header in value_keys}
+    columns.update({header: [] for header in CUSTOM_FIELD_COLUMNS})
+    stored_ages = []
+    value_columns = [(columns[header], key) for header, key in value_keys.items()]
+    custom_columns = [(columns[header], name) for header, name in CUSTOM_FIELD_COLUMNS.items()]
+    for values in device_values:
+        for column, key in value_columns:
+            column.append(values[key])
+        custom_fields = values['custom_fields']
+        for column, name in custom_columns:
+            column.append(custom_fields.get(name))
+        stored_ages.append(custom_fields.get('age'))
+    return columns, stored_ages
+
+
+# Ages for the report: the stored 'age' custom field where set, otherwise the age computed from
+# Birthday (same rule as assemble_device_row). Only the rows that need it are parsed.
+def device_ages(birthdays, stored_ages, today):
+    import pandas as pd
+
+    ages = pd.Series(stored_ages, dtype=object)
+    birthdays = pd.Series(birthdays, dtype=object)
+    needed = (ages.isna() & birthdays.notna() & (birthdays != '')).to_numpy()
+    if needed.any():
+        computed = months_since(birthdays[needed], today).astype(object)
+        ages[needed] = computed.where(computed.notna(), None)
+    return ages.tolist()
+
+
+# Build the export frame: columns in header order, ages computed per column,
+# restricted to the given status values if any
+def build_device_frame(device_values, headers, statuses=None, today=None):
+    import pandas as pd
+
+    today = today or datetime.today()
+    columns, stored_ages = collect_columns(device_values, headers)
+    columns[AGE_COLUMN] = device_ages(columns['Birthday'], stored_ages, today)
+
+    # Columns the values don't provide (e.g. 'Software') come out empty, as in the per-row export
+    empty = [None] * len(stored_ages)
+    frame = pd.DataFrame({header: columns.get(header, empty) for header in headers}, dtype=object)
+
+    if statuses:
+        wanted = [status.lower() for status in statuses]
+        frame = frame[frame['Status'].str.lower().isin(wanted).to_numpy()].reset_index(drop=True)
+    return frame
+
+
+# Widest rendered value per column (header included), as ColumnWidthTracker measures it
+def frame_column_widths(frame):
+    widths = []
+    for header in frame.columns:
+        lengths = frame[header].dropna().astype(str).str.len()
+        widths.append(max(len(str(header)), int(lengths.max()) if len(lengths) else 0))
+    return widths
+
+
+# Write the frame as CSV in chunks of rows, formatted exactly like CsvStreamWriter
+# (csv module defaults, empty cells for None)
+def write_frame_csv(frame, path, chunk_rows=CSV_CHUNK_ROWS):
+    with open(path, 'w', newline='') as f_object:
+        writer = csv.writer(f_object)
+        writer.writerow(frame.columns)
+        for start in range(0, len(frame), chunk_rows):
+            chunk = frame.iloc[start:start + chunk_rows]
+            writer.writerows(zip(*(chunk[header].tolist() for header in frame.columns)))
+    return len(frame)
+
+
+# Rows for the XLSX writer with the cell types of the CSV round trip: text cells,
+# empty cells as None and the numeric columns as integers
+def frame_xlsx_rows(frame, numeric_headers=()):
+    numeric_indexes = {index for index, header in enumerate(frame.columns) if header in numeric_headers}
+    for row in frame.itertuples(index=False, name=None):
+        values = []
+        for index, value in enumerate(row):
+            if value is None or value == '':
+                value = None
+            elif index in numeric_indexes and str(value).lstrip('-').isdigit():
+                value = int(value)
+            else:
+                value = str(value)
+            values.append(value)
+        yield values
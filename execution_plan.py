@@ -0,0 +1,186 @@
+# Execution Plan Module
+# Runs several subcommands in one invocation (python netbox_api.py -a -d -r) on one startup,
+# one health check and one fetch of each listing. Every listing is requested once with the
+# filters all of its steps have in common, and each step narrows it locally to its own filters.
+# Consecutive export steps only read the shared inventory and write their own files, so they
+# run concurrently.
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from parallel_fetch import DEFAULT_WORKERS, DEFAULT_PAGE_SIZE, fetch_raw
+from query_filters import filter_values, matches_filters
+from snapshot_store import load_raw
+
+# Short and alternative subcommand names
+COMMAND_ALIASES = {
+    "-d": "get_devices",
+    "-a": "update_age",
+    "-r": "get_racks",
+    "-o": "rack_occupancy",
+    "-j": "joke",
+    "-v": "validate_config",
+    "-h": "--help",
+    "watch": "serve",
+}
+COMMANDS = ("get_devices", "update_age", "get_racks", "rack_occupancy", "sync", "serve", "joke", "validate_config", "--help")
+
+# Steps that read the inventory and write only their own files
+EXPORT_COMMANDS = ("get_devices", "get_racks", "rack_occupancy")
+
+
+def canonical_command(name):
+    return COMMAND_ALIASES.get(name, name)
+
+
+# Split argv into the leading subcommands (by canonical name, each once, in the order given)
+# and the options after them. The first argument is always taken as a command, so an unknown
+# name still reaches main's "not recognized" error.
+def split_commands(argv):
+    commands = []
+    index = 0
+    while index < len(argv) and (index == 0 or canonical_command(argv[index]) in COMMANDS):
+        command = canonical_command(argv[index])
+        if command not in commands:
+            commands.append(command)
+        index += 1
+    return commands, argv[index:]
+
+
+# Group the steps into batches run one after the other; consecutive export steps share a batch
+def plan_batches(commands, concurrent=True):
+    batches = []
+    for command in commands:
+        if concurrent and batches and command in EXPORT_COMMANDS and batches[-1][0] in EXPORT_COMMANDS:
+            batches[-1].append(command)
+        else:
+            batches.append([command])
+    return batches
+
+
+def describe_plan(batches):
+    return " -> ".join(" + ".join(batch) for batch in batches)
+
+
+# Run one batch; the first step stays on the main thread, where the phase timer runs
+def run_batch(batch, run_step, inventory=None):
+    if len(batch) == 1:
+        run_step(batch[0])
+        return
+    if inventory is not None:
+        inventory.prefetch()
+    with ThreadPoolExecutor(max_workers=len(batch) - 1) as executor:
+        futures = [executor.submit(run_step, command) for command in batch[1:]]
+        run_step(batch[0])
+        for future in futures:
+            future.result()
+
+
+# Query filters as lists of strings, so "site": "dc1" and "site": ["dc1"] compare equal
+def normalize_filters(filters):
+    normalized = {}
+    for key, value in (filters or {}).items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        normalized[key] = [str(item) for item in values]
+    return normalized
+
+
+# Filters every step of a listing shares; these are the ones sent to NetBox
+def common_scope(filter_sets):
+    first, *rest = filter_sets
+    return {key: value for key, value in first.items()
+            if all(key in other and set(other[key]) == set(value) for other in rest)}
+
+
+# The scope's objects include everything the filters match
+def covers(scope, filters):
+    return all(key in filters and set(filters[key]) <= set(value) for key, value in scope.items())
+
+
+# Listings shared by the steps of one run: raw dicts per endpoint, fetched once on first use
+# (or all at once by prefetch), and pynetbox records built once per object, so every step sees
+# the same records
+class SharedInventory:
+    def __init__(self, workers=DEFAULT_WORKERS, page_size=DEFAULT_PAGE_SIZE, snapshot=None):
+        self.workers = workers
+        self.page_size = page_size
+        self.snapshot = snapshot
+        self.fetches = 0
+        self._needs = {}
+        self._raw = {}
+        self._records = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    # Register that a step will list `endpoint` with these filters
+    def plan(self, endpoint, filters=None):
+        with self._lock:
+            self._needs.setdefault(endpoint.url, (endpoint, []))[1].append(normalize_filters(filters))
+
+    def planned(self):
+        return [endpoint for endpoint, _ in self._needs.values()]
+
+    def _endpoint_lock(self, endpoint):
+        with self._lock:
+            return self._locks.setdefault(endpoint.url, threading.Lock())
+
+    def _load(self, endpoint, filters=None):
+        with self._endpoint_lock(endpoint):
+            if endpoint.url not in self._raw:
+                filter_sets = self._needs.get(endpoint.url, (endpoint, []))[1] or [normalize_filters(filters)]
+                if self.snapshot is not None:
+                    # The snapshot is read whole and filtered locally
+                    scope, items = {}, load_raw(self.snapshot, endpoint)
+                else:
+                    scope = common_scope(filter_sets)
+                    items = fetch_raw(endpoint, self.workers, self.page_size, **scope)
+                self._raw[endpoint.url] = (scope, items)
+                self.fetches += 1
+            return self._raw[endpoint.url]
+
+    # Fetch every planned listing not loaded yet, side by side
+    def prefetch(self):
+        endpoints = [endpoint for endpoint in self.planned() if endpoint.url not in self._raw]
+        if self.snapshot is not None or len(endpoints) < 2:
+            # SQLite connections stay on the thread that opened them
+            for endpoint in endpoints:
+                self._load(endpoint)
+            return
+        with ThreadPoolExecutor(max_workers=len(endpoints)) as executor:
+            list(executor.map(self._load, endpoints))
+
+    # Objects of a listing matching filters, as NetBox returns them, in listing order
+    def raw(self, endpoint, filters=None):
+        filters = normalize_filters(filters)
+        scope, items = self._load(endpoint, filters)
+        if not covers(scope, filters):
+            # A listing no step planned for; fetched on its own
+            return fetch_raw(endpoint, self.workers, self.page_size, **filters)
+        local = {key: value for key, value in filters.items() if key not in scope or set(value) != set(scope[key])}
+        if not local:
+            return list(items)
+        return [item for item in items if matches_filters(filter_values(item), local)]
+
+    # The same objects as pynetbox records
+    def records(self, endpoint, filters=None):
+        items = self.raw(endpoint, filters)
+        with self._endpoint_lock(endpoint):
+            cache = self._records.setdefault(endpoint.url, {})
+            records = []
+            for item in items:
+                record = cache.get(item["id"])
+                if record is None:
+                    record = cache[item["id"]] = endpoint.return_obj(item, endpoint.api, endpoint)
+                records.append(record)
+            return records
+
+    # Apply custom field values written to NetBox during the run ({object ID: value}), so later
+    # steps export what NetBox now holds without listing the objects again
+    def update_custom_field(self, endpoint, field, values):
+        with self._endpoint_lock(endpoint):
+            _, items = self._raw.get(endpoint.url, (None, []))
+            for item in items:
+                if item["id"] in values:
+                    item.setdefault("custom_fields", {})[field] = values[item["id"]]
+            for object_id, record in self._records.get(endpoint.url, {}).items():
+                if object_id in values:
+                    record.custom_fields[field] = values[object_id]
@@ -0,0 +1,170 @@
+# Export Delta Module
+# Keeps the previous get_devices export as a keyed snapshot (SQLite: one row per device with a
+# hash of its exported values) and reports only the devices added, removed or modified since then,
+# with field-level changes. Current rows are hashed as they are exported and looked up in the
+# previous hashes, so the comparison is linear; full previous rows are only read for changed keys.
+import csv
+import json
+import sqlite3
+import hashlib
+from datetime import datetime
+
+DEFAULT_DELTA_STATE = "output_state.db"
+
+# --delta choices
+DELTA_FORMATS = ('csv', 'xlsx', 'json')
+
+DELTA_HEADER = ['Change', 'Name', 'Site', 'Field', 'Old Value', 'New Value']
+
+# Rows are keyed by site and name (NetBox names are unique per site and tenant), led by the
+# instance in a merged multi-instance export; a repeated key in one export gets '#2', '#3', ...
+# in export order
+KEY_FIELDS = ('Instance', 'Site', 'Name')
+
+
+# Exported values as the CSV shows them, so both transforms and every format hash alike
+def cell_text(value):
+    return '' if value is None else str(value)
+
+
+def row_hash(values):
+    return hashlib.blake2b('\x1f'.join(values).encode('utf-8'), digest_size=16).digest()
+
+
+def open_state(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, hash BLOB NOT NULL, row TEXT NOT NULL)")
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+    conn.commit()
+    return conn
+
+
+# Collects the rows of one export and compares them against the previous export's state
+class DeltaTracker:
+    def __init__(self, state_path, headers, batch_rows=5000):
+        self.state_path = state_path
+        self.headers = list(headers)
+        self.batch_rows = batch_rows
+        self.conn = open_state(state_path)
+        self.previous_at = self._meta('exported_at')
+        self.previous = dict(self.conn.execute("SELECT key, hash FROM rows"))
+        self.conn.execute("DROP TABLE IF EXISTS rows_new")
+        self.conn.execute("CREATE TABLE rows_new (key TEXT PRIMARY KEY, hash BLOB NOT NULL, row TEXT NOT NULL)")
+        self.added = []
+        self.modified = []
+        self.seen = set()
+        self.row_count = 0
+        self._key_counts = {}
+        self._pending = []
+        self._key_indexes = [self.headers.index(field) for field in KEY_FIELDS if field in self.headers]
+
+    def _meta(self, name):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _key(self, values):
+        key = '/'.join(values[index] for index in self._key_indexes)
+        count = self._key_counts.get(key, 0) + 1
+        self._key_counts[key] = count
+        return key if count == 1 else f"{key}#{count}"
+
+    # One exported row (a sequence of values in header order)
+    def add_values(self, values):
+        values = [cell_text(value) for value in values]
+        key = self._key(values)
+        digest = row_hash(values)
+        previous = self.previous.get(key)
+        if previous is None:
+            self.added.append((key, values))
+        elif previous != digest:
+            self.modified.append((key, values))
+        self.seen.add(key)
+        self._pending.append((key, digest, json.dumps(values)))
+        if len(self._pending) >= self.batch_rows:
+            self._flush()
+        self.row_count += 1
+
+    # One exported row as a dict keyed by header
+    def add(self, row):
+        self.add_values([row.get(header) for header in self.headers])
+
+    # Every row of the columnar export frame
+    def add_frame(self, frame):
+        for values in frame[self.headers].itertuples(index=False, name=None):
+            self.add_values(values)
+
+    def _flush(self):
+        self.conn.executemany("INSERT OR REPLACE INTO rows_new VALUES (?, ?, ?)", self._pending)
+        self._pending = []
+
+    def _previous_row(self, key):
+        return json.loads(self.conn.execute("SELECT row FROM rows WHERE key = ?", (key,)).fetchone()[0])
+
+    # Compare against the previous export, store this export as the new state and return the delta.
+    # The first export only records the baseline.
+    def finish(self):
+        self._flush()
+        baseline = self.previous_at is None
+        removed = [key for key in self.previous if key not in self.seen]
+        delta = {
+            'previous_export': self.previous_at,
+            'current_export': datetime.now().isoformat(timespec='seconds'),
+            'baseline': baseline,
+            'devices': self.row_count,
+            'added': [] if baseline else [dict(zip(self.headers, values)) for _, values in self.added],
+            'removed': [dict(zip(self.headers, self._previous_row(key))) for key in removed],
+            'modified': [],
+        }
+        for key, values in self.modified:
+            old_values = self._previous_row(key)
+            changes = {header: {'old': old, 'new': new} for header, old, new in zip(self.headers, old_values, values) if old != new}
+            delta['modified'].append({'Name': values[self.headers.index('Name')], 'Site': values[self.headers.index('Site')], 'changes': changes})
+
+        self.conn.execute("DROP TABLE rows")
+        self.conn.execute("ALTER TABLE rows_new RENAME TO rows")
+        self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('exported_at', ?)", (delta['current_export'],))
+        self.conn.commit()
+        self.conn.close()
+        return delta
+
+    def close(self):
+        self.conn.close()
+
+
+# Field-level rows: one per changed field of a modified device, one per non-empty field of an
+# added (New Value) or removed (Old Value) device
+def delta_rows(delta):
+    for change, column in (('added', 'New Value'), ('removed', 'Old Value')):
+        for row in delta[change]:
+            for field, value in row.items():
+                if value != '':
+                    yield {'Change': change, 'Name': row.get('Name'), 'Site': row.get('Site'), 'Field': field, column: value}
+    for device in delta['modified']:
+        for field, change in device['changes'].items():
+            yield {'Change': 'modified', 'Name': device['Name'], 'Site': device['Site'], 'Field': field,
+                   'Old Value': change['old'], 'New Value': change['new']}
+
+
+def delta_summary(delta):
+    return {change: len(delta[change]) for change in ('added', 'removed', 'modified')}
+
+
+def write_delta(delta, delta_format, path):
+    if delta_format == 'json':
+        with open(path, 'w') as delta_file:
+            json.dump(dict(delta, summary=delta_summary(delta)), delta_file, indent=2)
+        return
+    rows = [[row.get(header) for header in DELTA_HEADER] for row in delta_rows(delta)]
+    if delta_format == 'csv':
+        with open(path, 'w', newline='') as delta_file:
+            writer = csv.writer(delta_file)
+            writer.writerow(DELTA_HEADER)
+            writer.writerows(rows)
+        return
+    if delta_format == 'xlsx':
+        from exporters import stream_table_to_xlsx
+
+        widths = [max([len(header)] + [len(str(row[index])) for row in rows if row[index] is not None]) for index, header in enumerate(DELTA_HEADER)]
+        stream_table_to_xlsx(DELTA_HEADER, rows, path, [min(width, 60) for width in widths])
+        return
+    raise ValueError(f"Unknown delta format '{delta_format}'. Expected one of: {', '.join(DELTA_FORMATS)}")
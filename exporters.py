@@ -0,0 +1,213 @@
+# Streaming Export Module
+import os
+import csv
+import warnings
+from datetime import datetime
+
+# Supported ways of handling an existing export file
+OUTPUT_MODES = ('truncate', 'timestamp')
+
+# XLSX writers: 'stream' uses openpyxl write-only worksheets, 'memory' builds the full workbook
+XLSX_WRITERS = ('stream', 'memory')
+
+# Named styles shared by every cell of the streamed workbooks
+DEVICE_HEADER_STYLE = "Device Header"
+DEVICE_CELL_STYLE = "Device Cell"
+RACK_HEADER_STYLE = "Rack Header"
+RACK_CELL_STYLE = "Rack Cell"
+
+# Excel sheet titles: at most 31 characters, none of these, unique ignoring case
+SHEET_TITLE_MAX = 31
+INVALID_SHEET_CHARS = '[]:*?/\\'
+
+
+# Resolve the export file name for the chosen output mode
+def resolve_output_path(path, mode='truncate', now=None):
+    if mode == 'truncate':
+        return path
+    if mode == 'timestamp':
+        stamp = (now or datetime.now()).strftime('%Y%m%d-%H%M%S')
+        root, ext = os.path.splitext(path)
+        return f"{root}_{stamp}{ext}"
+    raise ValueError(f"Unknown output mode '{mode}'. Expected one of: {', '.join(OUTPUT_MODES)}")
+
+
+# Track the widest value of each column while rows stream past
+class ColumnWidthTracker:
+    def __init__(self, headers):
+        self.widths = [len(str(header)) for header in headers]
+
+    def update(self, values):
+        for index, value in enumerate(values):
+            if value is None:
+                continue
+            length = len(str(value))
+            if length > self.widths[index]:
+                self.widths[index] = length
+
+
+# Write device rows to a CSV file through one handle: header once, then each row once
+class CsvStreamWriter:
+    def __init__(self, path, headers, width_tracker=None):
+        self.path = path
+        self.headers = headers
+        self.width_tracker = width_tracker
+        self.rows_written = 0
+        self._file = None
+        self._writer = None
+
+    def __enter__(self):
+        # 'w' truncates any previous run's output instead of appending to it
+        self._file = open(self.path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.headers)
+        return self
+
+    def write(self, device):
+        row = [device.get(header, '') for header in self.headers]
+        self._writer.writerow(row)
+        if self.width_tracker is not None:
+            self.width_tracker.update(row)
+        self.rows_written += 1
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._file.close()
+        return False
+
+
+# Register the shared named styles on a workbook; cells then reference them by name
+def add_named_styles(wb):
+    from openpyxl.styles import Alignment, Font, NamedStyle
+
+    wb.add_named_style(NamedStyle(name=DEVICE_HEADER_STYLE, font=Font(bold=True, color="FFFFFFFF")))
+    wb.add_named_style(NamedStyle(name=DEVICE_CELL_STYLE, alignment=Alignment(horizontal='center', vertical='center', wrap_text=True)))
+    wb.add_named_style(NamedStyle(name=RACK_HEADER_STYLE, font=Font(bold=True, color="FFFFFF")))
+    wb.add_named_style(NamedStyle(name=RACK_CELL_STYLE, font=Font(color="000000")))
+
+
+def styled_row(ws, values, style):
+    from openpyxl.cell import WriteOnlyCell
+
+    row = []
+    for value in values:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        row.append(cell)
+    return row
+
+
+# Styled table over the header plus row_count rows. Write-only sheets can't read the
+# header cells back, so the table columns are named explicitly.
+def make_table(display_name, header, row_count):
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.table import Table, TableColumn, TableStyleInfo
+
+    table = Table(displayName=display_name, ref=f"A1:{get_column_letter(len(header))}{row_count + 1}")
+    table.tableColumns = [TableColumn(id=index, name=str(name)) for index, name in enumerate(header, 1)]
+    table.tableStyleInfo = TableStyleInfo(
+        name="TableStyleMedium9", showFirstColumn=False,
+        showLastColumn=False, showRowStripes=True, showColumnStripes=False
+    )
+    return table
+
+
+# openpyxl warns on every write-only add_table; make_table already sets the columns
+def add_write_only_table(ws, table):
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="In write-only mode you must add table columns manually")
+        ws.add_table(table)
+
+
+# Stream rows into a write-only XLSX table. Column widths must be known up front,
+# because a write-only sheet needs them before its first row.
+def stream_table_to_xlsx(header, rows, xlsx_path, column_widths):
+    import openpyxl
+    from openpyxl.utils import get_column_letter
+
+    wb = openpyxl.Workbook(write_only=True)
+    add_named_styles(wb)
+    ws = wb.create_sheet()
+    for index, width in enumerate(column_widths, 1):
+        ws.column_dimensions[get_column_letter(index)].width = width + 2
+
+    ws.append(styled_row(ws, header, DEVICE_HEADER_STYLE))
+    row_count = 0
+    for values in rows:
+        ws.append(styled_row(ws, values, DEVICE_CELL_STYLE))
+        row_count += 1
+
+    add_write_only_table(ws, make_table("Table1", header, row_count))
+    wb.save(xlsx_path)
+    return row_count
+
+
+# Stream an exported CSV into a write-only XLSX table. Column widths come from the
+# tracker filled while the CSV was written. Only one row is held in memory at a time.
+def stream_csv_to_xlsx(csv_path, xlsx_path, column_widths, numeric_headers=()):
+    with open(csv_path, newline='') as f_object:
+        reader = csv.reader(f_object)
+        csv_headers = next(reader)
+        numeric_indexes = {index for index, header in enumerate(csv_headers) if header in numeric_headers}
+
+        def rows():
+            for row in reader:
+                values = []
+                for index, value in enumerate(row):
+                    # CSV holds text only; restore empty cells and numeric columns
+                    if value == '':
+                        value = None
+                    elif index in numeric_indexes and value.lstrip('-').isdigit():
+                        value = int(value)
+                    values.append(value)
+                yield values
+
+        return stream_table_to_xlsx(csv_headers, rows(), xlsx_path, column_widths)
+
+
+# A valid sheet title for name that is not in used (lower-cased titles). Rack names may hold
+# characters Excel rejects, and two sites may both have a rack 'R1'; repeats get ' (2)', ' (3)', ...
+def unique_sheet_title(name, used):
+    base = ''.join('_' if char in INVALID_SHEET_CHARS else char for char in str(name)).strip("'") or 'Sheet'
+    title = base[:SHEET_TITLE_MAX]
+    suffix = 1
+    while title.lower() in used:
+        suffix += 1
+        tail = f" ({suffix})"
+        title = base[:SHEET_TITLE_MAX - len(tail)] + tail
+    used.add(title.lower())
+    return title
+
+
+# Titles stream_rack_workbook gives sheets with these names, without writing the workbook
+def sheet_titles(names):
+    used = set()
+    return [unique_sheet_title(name, used) for name in names]
+
+
+# Table names must be unique in the workbook and can't hold spaces or dashes, so tables are
+# numbered instead of named after the sheet
+def table_display_name(index):
+    return f"Rack_{index}"
+
+
+# Write one write-only sheet per rack; sheets is an iterable of (name, header, rows).
+# Returns the sheet titles in order.
+def stream_rack_workbook(sheets, xlsx_path):
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    add_named_styles(wb)
+    used = set()
+    titles = []
+    for index, (name, header, rows) in enumerate(sheets, 1):
+        title = unique_sheet_title(name, used)
+        ws = wb.create_sheet(title=title)
+        ws.append(styled_row(ws, header, RACK_HEADER_STYLE))
+        row_count = 0
+        for row in rows:
+            ws.append(styled_row(ws, row, RACK_CELL_STYLE))
+            row_count += 1
+        add_write_only_table(ws, make_table(table_display_name(index), header, row_count))
+        titles.append(title)
+    wb.save(xlsx_path)
+    return titles
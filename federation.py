@@ -0,0 +1,104 @@
+# Federation Module
+# Runs get_devices, get_racks and update_age against several NetBox instances in one invocation
+# (one instance per region, listed as NETBOX_INSTANCES in config.py). Every instance works on its
+# own thread with its own pooled session, and the device and rack reports are merged into one
+# export with an Instance column. An instance that is down, fails or is still running at the
+# --instance-timeout deadline is reported and left out; the others still export.
+import os
+import re
+import time
+import threading
+
+# Column naming the instance of every row of a merged export
+INSTANCE_HEADER = "Instance"
+
+# Subcommands that run against several instances at once
+FEDERATED_COMMANDS = ("get_devices", "update_age", "get_racks")
+
+
+# One configured NetBox server; session and nb (the pynetbox client) are set up by main
+class NetBoxInstance:
+    def __init__(self, name, url, token):
+        self.name = name
+        self.url = url.rstrip("/")
+        self.token = token
+        self.session = None
+        self.nb = None
+
+
+# Instances from the NETBOX_INSTANCES setting, in config order:
+# {"emea": {"url": "https://netbox-emea.example.com", "token": "..."}, ...}
+def configured_instances(setting):
+    instances = []
+    for name, entry in (setting or {}).items():
+        if not isinstance(entry, dict) or not entry.get("url") or not entry.get("token"):
+            raise ValueError(f"NETBOX_INSTANCES['{name}'] needs a 'url' and a 'token'.")
+        instances.append(NetBoxInstance(str(name), entry["url"], entry["token"]))
+    return instances
+
+
+# The instances picked with --instance (every configured one by default), in config order
+def select_instances(instances, names=None):
+    if not names:
+        return instances
+    known = [instance.name for instance in instances]
+    unknown = [name for name in names if name not in known]
+    if unknown:
+        raise ValueError(f"Unknown NetBox instance {', '.join(unknown)}; configured: {', '.join(known) or 'none'}.")
+    return [instance for instance in instances if instance.name in names]
+
+
+# Per-instance variant of a file path, so concurrent instances never share a journal or plan:
+# update_age.journal -> update_age.emea.journal
+def instance_path(path, name):
+    root, extension = os.path.splitext(path)
+    return f"{root}.{re.sub(r'[^A-Za-z0-9_-]+', '-', name)}{extension}"
+
+
+# Run task(instance) for every instance, each on its own thread, and wait up to `timeout` seconds
+# for all of them. Returns (results, failures) in instance order: (instance, value) pairs for the
+# instances that finished and (instance, reason) pairs for those that raised or missed the
+# deadline. The threads are daemons, so an instance that hangs can't keep the process alive.
+def run_on_instances(instances, task, timeout=None):
+    outcomes = {}
+
+    def run(instance):
+        try:
+            outcomes[instance.name] = (True, task(instance))
+        except Exception as error:
+            outcomes[instance.name] = (False, f"{type(error).__name__}: {error}")
+
+    threads = [threading.Thread(target=run, args=(instance,), name=f"instance-{instance.name}", daemon=True) for instance in instances]
+    for thread in threads:
+        thread.start()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for thread in threads:
+        thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+
+    results = []
+    failures = []
+    for instance in instances:
+        if instance.name not in outcomes:
+            failures.append((instance, f"no result within {timeout:g}s"))
+            continue
+        ok, value = outcomes[instance.name]
+        (results if ok else failures).append((instance, value))
+    return results, failures
+
+
+# Device values of every instance in instance order, each tagged with its instance's name
+def merged_device_values(results):
+    for instance, device_values in results:
+        for values in device_values:
+            values["instance"] = instance.name
+            yield values
+
+
+# One {(instance, rack ID): (rack_info, devices_info)} mapping from each instance's racks; rack IDs
+# repeat across instances, and rack_info carries the instance for the sheet names and columns
+def merged_racks(results):
+    merged = {}
+    for instance, racks_with_devices in results:
+        for rack_id, (rack_info, devices_info) in racks_with_devices.items():
+            merged[(instance.name, rack_id)] = (dict(rack_info, instance=instance.name), devices_info)
+    return merged
@@ -0,0 +1,122 @@
+# GraphQL Fetch Backend Module
+import pynetbox
+
+from parallel_fetch import decode_json
+
+DEFAULT_GRAPHQL_PAGE_SIZE = 250
+
+# Device filters the device_list filters argument takes. NetBox 4.0-4.2 generate its DeviceFilter
+# input from the REST filterset, so the names and values are those of the REST query parameters.
+GRAPHQL_DEVICE_FILTERS = ("status", "site", "role", "tenant", "tag", "rack_id")
+
+# Only the columns of the device export, plus custom_fields (NetBox exposes them as one JSON field)
+# and the slugs the device filters match on
+DEVICE_EXPORT_QUERY = """
+query DeviceExport($offset: Int!, $limit: Int!, $filters: DeviceFilter) {
+  device_list(filters: $filters, pagination: {offset: $offset, limit: $limit}) {
+    id
+    name
+    status
+    site { name slug }
+    rack { id name }
+    role { name slug }
+    tenant { slug }
+    tags { slug }
+    device_type { model manufacturer { name } }
+    serial
+    platform { name }
+    primary_ip { address }
+    custom_fields
+  }
+}
+"""
+
+# GraphQL returns the status value; the REST export shows the choice label
+DEVICE_STATUS_LABELS = {
+    "offline": "Offline",
+    "active": "Active",
+    "planned": "Planned",
+    "staged": "Staged",
+    "failed": "Failed",
+    "inventory": "Inventory",
+    "decommissioning": "Decommissioning",
+}
+
+
+class GraphQLError(Exception):
+    pass
+
+
+# POST one query to /graphql/ and return its data, raising on HTTP or GraphQL errors
+def run_query(session, netbox_url, token, query, variables):
+    headers = {"Authorization": f"Token {token}", "Accept": "application/json", "Content-Type": "application/json"}
+    response = session.post(f"{netbox_url}/graphql/", headers=headers, json={"query": query, "variables": variables})
+    if not response.ok:
+        raise pynetbox.RequestError(response)
+    body = decode_json(response.content)
+    if body.get("errors"):
+        raise GraphQLError("; ".join(error.get("message", str(error)) for error in body["errors"]))
+    return body["data"]
+
+
+# One page of device_list, filtered by the server
+def fetch_graphql_page(session, netbox_url, token, offset, page_size, filters):
+    variables = {"offset": offset, "limit": page_size, "filters": filters or None}
+    return run_query(session, netbox_url, token, DEVICE_EXPORT_QUERY, variables)["device_list"]
+
+
+# Page through device_list with the device filters in its filters argument, so NetBox only returns
+# matching devices. Returns the devices and the filters left to apply to them: those DeviceFilter
+# has no field for, or all of them when the server rejects the argument (NetBox 4.3 replaced the
+# filterset-based DeviceFilter with a lookup-based one). The first page is fetched right away so a
+# rejected argument is caught here; GraphQL lists carry no total count, so paging stops at the
+# first short page.
+def fetch_graphql_devices(session, netbox_url, token, page_size=DEFAULT_GRAPHQL_PAGE_SIZE, filters=None):
+    pushed = {key: list(values) for key, values in (filters or {}).items() if key in GRAPHQL_DEVICE_FILTERS}
+    local = {key: values for key, values in (filters or {}).items() if key not in GRAPHQL_DEVICE_FILTERS}
+    try:
+        first_page = fetch_graphql_page(session, netbox_url, token, 0, page_size, pushed)
+    except GraphQLError:
+        if not pushed:
+            raise
+        pushed, local = {}, dict(filters)
+        first_page = fetch_graphql_page(session, netbox_url, token, 0, page_size, pushed)
+
+    def devices():
+        page = first_page
+        offset = 0
+        while True:
+            yield from page
+            if len(page) < page_size:
+                return
+            offset += page_size
+            page = fetch_graphql_page(session, netbox_url, token, offset, page_size, pushed)
+
+    return devices(), local
+
+
+# Render a related object the way str() renders the pynetbox record ('None' when unset)
+def related_str(value, key):
+    if not value:
+        return "None"
+    return str(value.get(key))
+
+
+# Render one GraphQL device into the same values the REST path produces,
+# keyed by the arguments of netbox_api.assemble_device_row
+def graphql_device_values(device):
+    device_type = device.get("device_type") or {}
+    status = device.get("status") or ""
+    return {
+        "name": device.get("name") or "",
+        "status": DEVICE_STATUS_LABELS.get(status.lower(), status),
+        "site": related_str(device.get("site"), "name"),
+        "rack": related_str(device.get("rack"), "name"),
+        "role": (device.get("role") or {}).get("name"),
+        "manufacturer": (device_type.get("manufacturer") or {}).get("name"),
+        "device_type": str(device_type.get("model")),
+        "serial": str(device.get("serial")),
+        "platform": related_str(device.get("platform"), "name"),
+        "primary_ip": related_str(device.get("primary_ip"), "address"),
+        "custom_fields": device.get("custom_fields") or {},
+    }
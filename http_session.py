@@ -0,0 +1,72 @@
+# Shared HTTP Session Module
+# Every NetBox call (pynetbox, parallel page fetches, GraphQL, the health check) and the joke
+# API go through one session built here: pooled keep-alive connections sized for the worker
+# pool, default timeouts, compressed responses, and retries with backoff for transient errors.
+import random
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Defaults for --retries, --backoff and --timeout
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 0.5
+DEFAULT_TIMEOUT = 60
+CONNECT_TIMEOUT = 10
+BACKOFF_MAX = 30
+
+# Transient statuses worth retrying; 429 and 503 usually carry a Retry-After header
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# PATCH is safe to repeat here because update_age writes absolute values, and the script's
+# only POSTs are read-only GraphQL queries
+RETRY_METHODS = ("HEAD", "GET", "OPTIONS", "PATCH", "POST")
+
+
+# Exponential backoff with full jitter, so concurrent page workers that failed together
+# don't retry in lockstep. A Retry-After header from the server takes precedence.
+class JitterRetry(Retry):
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff else 0
+
+
+# requests has no session-wide timeout; apply one to every request that doesn't set its own
+class TimeoutSession(requests.Session):
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", (CONNECT_TIMEOUT, self.timeout))
+        return super().request(method, url, **kwargs)
+
+
+def make_retry(retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    return JitterRetry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff,
+        backoff_max=BACKOFF_MAX,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(RETRY_METHODS),
+        respect_retry_after_header=True,
+        # Hand the final error response back instead of raising, so callers report the NetBox error body
+        raise_on_status=False,
+    )
+
+
+# Build the shared session; the pool holds one keep-alive connection per concurrent worker
+def make_session(workers=1, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, timeout=DEFAULT_TIMEOUT):
+    session = TimeoutSession(timeout)
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=max(workers, 1) + 1,
+        max_retries=make_retry(retries, backoff),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
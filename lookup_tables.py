@@ -0,0 +1,72 @@
+# Lookup Table Prefetch Module
+from parallel_fetch import DEFAULT_WORKERS, DEFAULT_PAGE_SIZE, fetch_raw
+from snapshot_store import load_raw
+
+# Lookup table name -> (NetBox app, endpoint attribute)
+LOOKUP_ENDPOINTS = {
+    "device_types": ("dcim", "device_types"),
+    "manufacturers": ("dcim", "manufacturers"),
+    "roles": ("dcim", "device_roles"),
+    "platforms": ("dcim", "platforms"),
+}
+
+
+# Load device types, manufacturers, roles and platforms once, keyed by ID,
+# from the API or from the local snapshot
+def prefetch_lookups(nb_instance, workers=DEFAULT_WORKERS, page_size=DEFAULT_PAGE_SIZE, snapshot=None):
+    lookups = {}
+    for name, (app, endpoint_name) in LOOKUP_ENDPOINTS.items():
+        endpoint = getattr(getattr(nb_instance, app), endpoint_name)
+        if snapshot is not None:
+            items = load_raw(snapshot, endpoint)
+        else:
+            items = fetch_raw(endpoint, workers, page_size)
+        lookups[name] = {item["id"]: item for item in items}
+    return lookups
+
+
+# Attribute as NetBox returned it, read without triggering pynetbox's lazy full_details() GET.
+# Also reads the plain dicts of the raw backend.
+def loaded_attr(record, name):
+    if record is None:
+        return None
+    if isinstance(record, dict):
+        return record.get(name)
+    return vars(record).get(name)
+
+
+# ID of the first nested object present under any of the given names
+def related_id(record, *names):
+    for name in names:
+        nested = loaded_attr(record, name)
+        if nested is not None:
+            return loaded_attr(nested, "id")
+    return None
+
+
+# Lookup tables without an object the device refers to, e.g. a role or platform created after they were loaded
+def missing_lookups(device, lookups):
+    device_type = lookups["device_types"].get(related_id(device, "device_type"))
+    wanted = {
+        "device_types": related_id(device, "device_type"),
+        "manufacturers": ((device_type or {}).get("manufacturer") or {}).get("id"),
+        "roles": related_id(device, "role", "device_role"),
+        "platforms": related_id(device, "platform"),
+    }
+    return [name for name, object_id in wanted.items() if object_id is not None and object_id not in lookups[name]]
+
+
+# Resolve a device's role, manufacturer, type model and platform from the lookup tables only
+def resolve_device(device, lookups):
+    device_type = lookups["device_types"].get(related_id(device, "device_type"), {})
+    manufacturer_id = (device_type.get("manufacturer") or {}).get("id")
+    manufacturer = lookups["manufacturers"].get(manufacturer_id, {})
+    # NetBox 3.6 renamed device_role to role
+    role = lookups["roles"].get(related_id(device, "role", "device_role"), {})
+    platform = lookups["platforms"].get(related_id(device, "platform"), {})
+    return {
+        "role": role.get("name"),
+        "manufacturer": manufacturer.get("name"),
+        "type": device_type.get("model"),
+        "platform": platform.get("name"),
+    }
@@ -0,0 +1,434 @@
+# Mock NetBox Server Module
+# Usage: python mock_netbox.py [--devices 1000] [--latency 0.05] [--error-rate 0.01] [--gzip] [--port 8000] [--webhook-url URL]
+import re
+import sys
+import gzip
+import hmac
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Synthetic inventory sizes used by the benchmark suite
+INVENTORY_SIZES = {"1k": 1000, "10k": 10000, "100k": 100000}
+
+STATUSES = [("active", "Active")] * 8 + [("planned", "Planned"), ("offline", "Offline")]
+ROLES = ["Switch", "Router", "Firewall", "Server", "PDU"]
+MANUFACTURERS = ["Cisco", "Juniper", "Arista", "Palo Alto", "Dell"]
+PLATFORMS = ["ios-xe", "junos", "eos", "panos", "linux"]
+DEVICE_TYPES = [("C9300-48P", 0), ("MX204", 1), ("7050SX3", 2), ("PA-3220", 3), ("R740", 4), ("AP8941", 4)]
+DEVICE_TYPE_HEIGHTS = [1, 1, 1, 2, 2, 0]
+RACK_HEIGHT = 42
+DEVICES_PER_RACK = 12
+MAX_PAGE_SIZE = 1000
+OBJECT_ID = re.compile(r"/\d+(?=/)")
+# Webhook model name per inventory table, as NetBox sends it
+WEBHOOK_MODELS = {("dcim", "devices"): "device", ("dcim", "racks"): "rack"}
+OBJECT_PATH = re.compile(r"^/api/(?P<app>[a-z]+)/(?P<endpoint>[a-z-]+)/(?:(?P<id>\d+)/)?$")
+
+
+# Deterministic synthetic inventory: devices with the custom fields get_devices and update_age use,
+# spread over racks and sites, plus the related objects they reference
+class Inventory:
+    def __init__(self, device_count, base_url, seed=42):
+        rng = random.Random(seed)
+        self.base_url = base_url
+        self.lock = threading.Lock()
+        self.last_updated = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.manufacturers = {index + 1: self.obj("dcim", "manufacturers", index + 1, name=name, slug=name.lower().replace(" ", "-"))
+                              for index, name in enumerate(MANUFACTURERS)}
+        self.device_types = {}
+        for index, (model, manufacturer_index) in enumerate(DEVICE_TYPES):
+            manufacturer = self.manufacturers[manufacturer_index + 1]
+            self.device_types[index + 1] = self.obj("dcim", "device-types", index + 1, model=model, slug=model.lower(),
+                                                     u_height=DEVICE_TYPE_HEIGHTS[index], manufacturer=self.brief(manufacturer, "name", "slug"))
+        self.roles = {index + 1: self.obj("dcim", "device-roles", index + 1, name=name, slug=name.lower())
+                      for index, name in enumerate(ROLES)}
+        self.platforms = {index + 1: self.obj("dcim", "platforms", index + 1, name=name, slug=name)
+                          for index, name in enumerate(PLATFORMS)}
+        self.custom_fields = {index + 1: self.obj("extras", "custom-fields", index + 1, name=name, object_types=["dcim.device"])
+                              for index, name in enumerate(["Birthday", "age", "owner", "SW_Version"])}
+
+        rack_count = max(1, device_count // DEVICES_PER_RACK)
+        site_count = max(1, rack_count // 50)
+        self.sites = {index + 1: self.obj("dcim", "sites", index + 1, name=f"site-{index + 1:03d}", slug=f"site-{index + 1:03d}")
+                      for index in range(site_count)}
+        self.racks = {}
+        for index in range(rack_count):
+            site = self.sites[index % site_count + 1]
+            self.racks[index + 1] = self.obj("dcim", "racks", index + 1, name=f"rack-{index + 1:05d}", u_height=RACK_HEIGHT,
+                                             site=self.brief(site, "name", "slug"), location=None, tenant=None)
+
+        self.devices = {}
+        for index in range(device_count):
+            device_id = index + 1
+            rack = self.racks[index // DEVICES_PER_RACK % rack_count + 1]
+            slot = index % DEVICES_PER_RACK
+            type_id = rng.randint(1, len(DEVICE_TYPES))
+            status_value, status_label = rng.choice(STATUSES)
+            birthday = (datetime(2015, 1, 1) + timedelta(days=rng.randint(0, 3000))).strftime("%Y-%m-%d")
+            device = self.devices[device_id] = self.obj(
+                "dcim", "devices", device_id,
+                name=f"device-{device_id:06d}",
+                status={"value": status_value, "label": status_label},
+                site=rack["site"],
+                rack=self.brief(rack, "name"),
+                position=slot * 3 + 1 if DEVICE_TYPE_HEIGHTS[type_id - 1] else None,
+                role=self.brief(self.roles[rng.randint(1, len(ROLES))], "name", "slug"),
+                device_type=self.brief(self.device_types[type_id], "model", "slug", "manufacturer"),
+                platform=self.brief(self.platforms[rng.randint(1, len(PLATFORMS))], "name", "slug") if rng.random() < 0.9 else None,
+                serial=f"SN{device_id:08d}",
+                tenant={"id": 1, "name": "Tenant A", "slug": "tenant-a"} if device_id % 2 else None,
+                tags=[{"id": 1, "name": "Core", "slug": "core"}] if device_id % 5 == 0 else [],
+                primary_ip={"id": device_id, "url": f"{base_url}/api/ipam/ip-addresses/{device_id}/",
+                            "address": f"10.{device_id // 65536 % 256}.{device_id // 256 % 256}.{device_id % 256}/24"},
+                custom_fields={"Birthday": birthday, "age": None if rng.random() < 0.3 else rng.randint(0, 120),
+                               "owner": rng.choice(["netops", "sysops", "security"]), "SW_Version": f"17.{rng.randint(1, 12)}.1",
+                               "service_contract": None, "warranty": None, "SW": None},
+            )
+            # NetBox 3.6/3.7 return the role under both its new and its deprecated name
+            device["device_role"] = device["role"]
+        self.tables = {
+            ("dcim", "devices"): self.devices,
+            ("dcim", "racks"): self.racks,
+            ("dcim", "sites"): self.sites,
+            ("dcim", "device-types"): self.device_types,
+            ("dcim", "manufacturers"): self.manufacturers,
+            ("dcim", "device-roles"): self.roles,
+            ("dcim", "platforms"): self.platforms,
+            ("extras", "custom-fields"): self.custom_fields,
+        }
+
+    def obj(self, app, endpoint, object_id, **fields):
+        item = {"id": object_id, "url": f"{self.base_url}/api/{app}/{endpoint}/{object_id}/",
+                "display": fields.get("name") or fields.get("model") or str(object_id),
+                "last_updated": self.last_updated.isoformat().replace("+00:00", "Z")}
+        item.update(fields)
+        return item
+
+    @staticmethod
+    def brief(item, *fields):
+        nested = {"id": item["id"], "url": item["url"], "display": item["display"]}
+        for field in fields:
+            nested[field] = item[field]
+        return nested
+
+    # Mark an object as changed now, so last_updated__gte queries pick it up
+    def touch(self, item):
+        item["last_updated"] = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+# Filters understood by the mock listing endpoints
+def matches(item, filters):
+    for key, values in filters.items():
+        value = values[-1]
+        if key == "last_updated__gte":
+            if item.get("last_updated", "") < value:
+                return False
+        elif key == "tag":
+            if not set(values).issubset(tag["slug"] for tag in item.get("tags") or []):
+                return False
+        elif key in ("site", "role", "tenant", "platform"):
+            nested = item.get(key) or {}
+            if nested.get("slug") not in values:
+                return False
+        elif key == "status":
+            if (item.get("status") or {}).get("value") not in values:
+                return False
+        elif key in ("rack_id", "site_id", "device_type_id", "role_id"):
+            nested = item.get(key[:-3]) or {}
+            if str(nested.get("id")) not in values:
+                return False
+        elif key == "rack":
+            if (item.get("rack") or {}).get("name") not in values:
+                return False
+        elif key == "id":
+            if str(item["id"]) not in values:
+                return False
+    return True
+
+
+# Per-server request statistics the benchmark harness reads back
+class ServerStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.by_endpoint = {}
+
+    def record(self, method, path, size, received=0):
+        key = f"{method} {OBJECT_ID.sub('/{id}', path)}"
+        with self.lock:
+            self.requests += 1
+            self.bytes_sent += size
+            self.bytes_received += received
+            self.by_endpoint[key] = self.by_endpoint.get(key, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {"requests": self.requests, "bytes_sent": self.bytes_sent, "bytes_received": self.bytes_received,
+                    "by_endpoint": dict(self.by_endpoint)}
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.bytes_sent = 0
+            self.bytes_received = 0
+            self.by_endpoint = {}
+
+
+class MockNetBoxHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, extra_headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if self.server.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=5)
+            self.send_header("Content-Encoding", "gzip")
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        received = int(self.headers.get("Content-Length") or 0)
+        self.server.stats.record(self.command, urlparse(self.path).path, len(body), received)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def authorized(self):
+        if self.headers.get("Authorization", "").startswith("Token "):
+            return True
+        self.send_json(403, {"detail": "Authentication credentials were not provided."})
+        return False
+
+    # Add the configured latency, and fail a share of requests with a retryable 503 + Retry-After.
+    # Returns True when the request was already answered with the injected error.
+    def delay(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            self.read_json()
+            self.send_json(503, {"detail": "Service temporarily unavailable."}, {"Retry-After": "0"})
+            return True
+        return False
+
+    def do_GET(self):
+        if self.delay() or not self.authorized():
+            return
+        url = urlparse(self.path)
+        if url.path == "/api/status/":
+            self.send_json(200, {"netbox-version": "4.1.0-mock", "python-version": sys.version.split()[0], "plugins": {}})
+            return
+        match = OBJECT_PATH.match(url.path)
+        table = self.server.inventory.tables.get((match.group("app"), match.group("endpoint"))) if match else None
+        if table is None:
+            self.send_json(404, {"detail": "Not found."})
+            return
+        if match.group("id"):
+            item = table.get(int(match.group("id")))
+            self.send_json(200 if item else 404, item or {"detail": "Not found."})
+            return
+
+        query = parse_qs(url.query)
+        limit = min(int(query.pop("limit", ["50"])[0]) or MAX_PAGE_SIZE, MAX_PAGE_SIZE)
+        offset = int(query.pop("offset", ["0"])[0])
+        brief = query.pop("brief", [""])[0] in ("1", "true", "True")
+        with self.server.inventory.lock:
+            items = [item for item in table.values() if matches(item, query)]
+        page = items[offset:offset + limit]
+        if brief:
+            page = [{"id": item["id"], "url": item["url"], "display": item["display"]} for item in page]
+        next_url = None
+        if offset + limit < len(items):
+            next_url = f"{self.server.inventory.base_url}{url.path}?limit={limit}&offset={offset + limit}"
+        self.send_json(200, {"count": len(items), "next": next_url, "previous": None, "results": page})
+
+    def do_PATCH(self):
+        if self.delay() or not self.authorized():
+            return
+        if self.server.write_denied():
+            self.read_json()
+            self.send_json(403, {"detail": "Invalid token."})
+            return
+        url = urlparse(self.path)
+        match = OBJECT_PATH.match(url.path)
+        table = self.server.inventory.tables.get((match.group("app"), match.group("endpoint"))) if match else None
+        if table is None:
+            self.send_json(404, {"detail": "Not found."})
+            return
+        payload = self.read_json()
+        if match.group("id"):
+            payload = dict(payload, id=int(match.group("id")))
+        updates = payload if isinstance(payload, list) else [payload]
+        with self.server.inventory.lock:
+            if any(update.get("id") not in table for update in updates):
+                self.send_json(400, {"detail": "Unknown object ID in bulk update."})
+                return
+            updated = []
+            for update in updates:
+                item = table[update["id"]]
+                for key, value in update.items():
+                    if key == "custom_fields":
+                        item["custom_fields"].update(value)
+                    elif key != "id":
+                        item[key] = value
+                self.server.inventory.touch(item)
+                updated.append(item)
+            changed = [json.loads(json.dumps(item)) for item in updated]
+        self.send_json(200, updated if isinstance(payload, list) else updated[0])
+        model = WEBHOOK_MODELS.get((match.group("app"), match.group("endpoint")))
+        if model:
+            self.server.emit_webhooks("updated", model, changed)
+
+    def do_POST(self):
+        if self.delay() or not self.authorized():
+            return
+        if urlparse(self.path).path != "/graphql/":
+            self.send_json(405, {"detail": "Method not allowed."})
+            return
+        self.send_json(200, self.server.graphql(self.read_json()))
+
+
+# Send one NetBox-style webhook (body and X-Hook-Signature as NetBox builds them); returns the
+# HTTP status. Also usable on its own to stand in for NetBox in front of the serve daemon.
+def post_webhook(url, event, model, data, secret=None, username="mock"):
+    body = json.dumps({
+        "event": event,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "model": model,
+        "username": username,
+        "request_id": f"{random.getrandbits(128):032x}",
+        "data": data,
+        "snapshots": {"prechange": None, "postchange": data if event != "deleted" else None},
+    }).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        headers["X-Hook-Signature"] = hmac.new(secret.encode("utf-8"), body, hashlib.sha512).hexdigest()
+    request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return response.status
+
+
+# Minimal /graphql/ support: the device_list query of graphql_backend.py, paginated and filtered
+def graphql_device(device):
+    status = device["status"]["value"]
+    return {
+        "id": str(device["id"]),
+        "name": device["name"],
+        "status": status.upper(),
+        "site": {"name": device["site"]["name"], "slug": device["site"]["slug"]},
+        "rack": {"id": str(device["rack"]["id"]), "name": device["rack"]["name"]} if device.get("rack") else None,
+        "role": {"name": device["role"]["name"], "slug": device["role"]["slug"]},
+        "tenant": {"slug": device["tenant"]["slug"]} if device.get("tenant") else None,
+        "tags": [{"slug": tag["slug"]} for tag in device.get("tags") or []],
+        "device_type": {"model": device["device_type"]["model"], "manufacturer": {"name": device["device_type"]["manufacturer"]["name"]}},
+        "serial": device["serial"],
+        "platform": {"name": device["platform"]["name"]} if device.get("platform") else None,
+        "primary_ip": {"address": device["primary_ip"]["address"]} if device.get("primary_ip") else None,
+        "custom_fields": device["custom_fields"],
+    }
+
+
+class MockNetBoxServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, device_count=1000, latency=0.0, host="127.0.0.1", port=0, error_rate=0.0, compress=False, webhook_url=None, webhook_secret=None,
+                 deny_writes_after=None):
+        super().__init__((host, port), MockNetBoxHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.compress = compress
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self.deny_writes_after = deny_writes_after
+        self.writes = 0
+        self.url = f"http://{host}:{self.server_address[1]}"
+        self.inventory = Inventory(device_count, self.url)
+        self.stats = ServerStats()
+        self._thread = None
+
+    # Like a token revoked mid-run: every PATCH after the first deny_writes_after is refused with 403
+    def write_denied(self):
+        if self.deny_writes_after is None:
+            return False
+        with self.inventory.lock:
+            self.writes += 1
+            return self.writes > self.deny_writes_after
+
+    def graphql(self, body):
+        query = (body or {}).get("query", "")
+        variables = (body or {}).get("variables") or {}
+        if "device_list" not in query:
+            return {"data": None, "errors": [{"message": "Only device_list is supported by the mock server."}]}
+        offset = int(variables.get("offset", 0))
+        limit = int(variables.get("limit", 100))
+        # DeviceFilter of NetBox 4.0-4.2: the REST filterset's fields, each taking a list of values
+        filters = {key: [str(value) for value in values] for key, values in (variables.get("filters") or {}).items()}
+        with self.inventory.lock:
+            devices = [device for device in self.inventory.devices.values() if matches(device, filters)][offset:offset + limit]
+            return {"data": {"device_list": [graphql_device(device) for device in devices]}}
+
+    # Like NetBox's background worker: one webhook per changed object, sent after the response
+    def emit_webhooks(self, event, model, items):
+        if not self.webhook_url:
+            return
+
+        def send():
+            for item in items:
+                try:
+                    post_webhook(self.webhook_url, event, model, item, self.webhook_secret)
+                except OSError:
+                    pass
+        threading.Thread(target=send, daemon=True).start()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="mock_netbox.py")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503 and Retry-After")
+    parser.add_argument("--gzip", action="store_true", help="Gzip responses for clients that accept it")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--webhook-url", default=None, help="Post a webhook here for every device or rack PATCH, e.g. http://127.0.0.1:8081/webhook")
+    parser.add_argument("--webhook-secret", default=None)
+    parser.add_argument("--deny-writes-after", type=int, default=None, help="Answer every PATCH after this many with 403, like a token revoked mid-run")
+    args = parser.parse_args(argv)
+
+    server = MockNetBoxServer(args.devices, args.latency, args.host, args.port, args.error_rate, args.gzip, args.webhook_url, args.webhook_secret,
+                              args.deny_writes_after)
+    print(f"Mock NetBox serving {args.devices} devices at {server.url} (latency {args.latency}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
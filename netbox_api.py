@@ -1,25 +1,49 @@
 # Logging Module
 import os
 import sys
+import queue
+import atexit
+import contextlib
 import logging
+import logging.handlers
 import importlib
+import importlib.util
 import requests
 
+# netbox_api.log rotates at LOG_MAX_BYTES and keeps LOG_BACKUPS old files (netbox_api.log.1, ...)
+LOG_FILE = "netbox_api.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
 
-def setup_logging():
+# Background thread that writes queued log records to the file
+log_listener = None
+
+
+def setup_logging(level="INFO"):
+    global log_listener
     logger = logging.getLogger(__name__)
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(level)
+
+    # Rebuilding the logger replaces its handlers instead of adding another set
+    stop_logging()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
 
     # Create a formatter
     formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 
-    # Create a handler for writing log messages to a file
-    file_handler = logging.FileHandler("netbox_api.log")
-    file_handler.setLevel(logging.INFO)
+    # The rotating log file is written by a QueueListener thread; logging calls only enqueue the record
+    file_handler = logging.handlers.RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, delay=True)
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    log_queue = queue.SimpleQueue()
+    log_listener = logging.handlers.QueueListener(log_queue, file_handler)
+    log_listener.start()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
 
-    # Create a handler for displaying log messages in the terminal
+    # Create a handler for displaying log messages in the terminal. It stays synchronous so
+    # warnings appear in order with the script's printed output.
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.WARNING)  # Only show warnings and errors in terminal
     console_handler.setFormatter(formatter)
@@ -27,7 +51,25 @@ def setup_logging():
 
     return logger
 
-logger = setup_logging()
+
+# Flush the queued records and stop the writer thread
+def stop_logging():
+    global log_listener
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
+
+
+# The rack shard pool starts its workers with forkserver or spawn (rack_shards.pool_context), and
+# each worker imports this script again as __mp_main__ before it runs render_shard. A worker needs
+# none of the setup below: it starts no log listener of its own and doesn't read config.py.
+SHARD_WORKER = __name__ == "__mp_main__"
+
+if SHARD_WORKER:
+    logger = logging.getLogger(__name__)
+else:
+    logger = setup_logging()
+    atexit.register(stop_logging)
 
 
 # Validate config.py
@@ -39,7 +81,43 @@ def validate_url(url):
         return False
 
 
-def validate_config():
+# Health check against /api/status/, which is cheap to serve, instead of a full device listing.
+# name labels the messages of one of several NetBox instances; with exit_on_error=False a failed
+# check raises instead of ending the script, so the other instances can carry on.
+def check_api_server(url, token, session=None, exit_on_error=True, name=None):
+    label = f"{name}: " if name else ""
+    try:
+        response = (session or requests).get(f"{url}/api/status/", headers={"Authorization": f"Token {token}", "Accept": "application/json"}, timeout=10)
+        response.raise_for_status()  # Check for HTTP errors
+        # One write per line, so the checks of instances running side by side don't run together
+        print(BOLD + BG_GREEN + WHITE + f"✅  {label}API server connection successful." + RESET + "\n", end="")
+        logger.info(f"✅  {label}API server connection successful.")
+    except requests.exceptions.RequestException:
+        print(RED + f"❌  {label}API server connection failed. Please check the provided configuration." + RESET + "\n", end="")
+        logger.error(f"❌  {label}API server connection failed. Please check the provided configuration.")
+        if not exit_on_error:
+            raise
+        sys.exit(1)
+
+
+# Check every instance of NETBOX_INSTANCES; exits with an error if any of them fails
+def validate_instances(instances, session=None):
+    failed = []
+    for instance in instances:
+        if not validate_url(instance.url):
+            print(RED + f"❌  {instance.name}: invalid URL {instance.url}" + RESET)
+            logger.error("❌  %s: invalid URL %s", instance.name, instance.url)
+            failed.append(instance.name)
+            continue
+        try:
+            check_api_server(instance.url, instance.token, instance.session or session, exit_on_error=False, name=instance.name)
+        except requests.exceptions.RequestException:
+            failed.append(instance.name)
+    if failed:
+        sys.exit(1)
+
+
+def validate_config(session=None):
     try:
         # Try importing NETBOX_TOKEN and NETBOX_URL from config.py
         from config import NETBOX_TOKEN, NETBOX_URL
@@ -56,15 +134,7 @@ def validate_config():
         logger.info("✅  Configuration validated successfully.")
 
         # Check API server using provided NETBOX_TOKEN
-        try:
-            response = requests.get(f"{NETBOX_URL}/api/dcim/devices/", headers={"Authorization": f"Token {NETBOX_TOKEN}"})
-            response.raise_for_status()  # Check for HTTP errors
-            print(BOLD + BG_GREEN + WHITE + "✅  API server connection successful." + RESET)
-            logger.info("✅  API server connection successful.")
-        except requests.exceptions.RequestException:
-            print(RED + "❌  API server connection failed. Please check the provided configuration." + RESET)
-            logger.error("❌  API server connection failed. Please check the provided configuration.")
-            sys.exit(1)
+        check_api_server(NETBOX_URL, NETBOX_TOKEN, session)
 
     except ImportError:
         logger.error("Configuration error: Missing or incomplete data in config.py.")
@@ -95,15 +165,7 @@ def validate_config():
         logger.info("✅  Configuration saved and validated successfully.")
         
         # Check API server using the newly saved NETBOX_TOKEN
-        try:
-            response = requests.get(f"{configure_url_input}/api/dcim/devices/", headers={"Authorization": f"Token {configure_token_input}"})
-            response.raise_for_status()  # Check for HTTP errors
-            print(BOLD + BG_GREEN + WHITE + "✅  API server connection successful." + RESET)
-            logger.info("✅  API server connection successful.")
-        except requests.exceptions.RequestException:
-            print(RED + "❌  API server connection failed. Please check the provided configuration." + RESET)
-            logger.error("❌  API server connection failed. Please check the provided configuration.")
-            sys.exit(1)
+        check_api_server(configure_url_input, configure_token_input, session)
 
         sys.exit(0)
 
@@ -114,13 +176,14 @@ import subprocess
 from color_definitions import BOLD, UNDERLINE, RESET, RED, GREEN, YELLOW, BLACK, BLUE, MAGENTA, CYAN, WHITE, BG_BLACK, BG_RED, BG_GREEN, BG_YELLOW, BG_BLUE, BG_MAGENTA, BG_CYAN, BG_WHITE
 
 # List of required modules
-required_modules = ['pynetbox', 'csv', 'sys', 'requests', 'pandas', 'datetime', 'openpyxl']
+required_modules = ['pynetbox', 'csv', 'sys', 'requests', 'datetime', 'openpyxl']
 
 
-# Check if a module is installed
+# Check if a module is installed (find_spec locates it without importing it)
 def is_module_installed(module_name):
     try:
-        importlib.import_module(module_name)
+        if importlib.util.find_spec(module_name) is None:
+            raise ImportError(module_name)
         return True
     except ImportError:
         warning_message = f"❌ - Module {module_name} is not installed."
@@ -180,9 +243,20 @@ def check_and_install_modules(module_list):
         logger.info("✅  All required modules are already installed.")
         logger.debug("✅  All required modules are already installed.")  # Log the same message as debug level
 
+# True when --format ndjson or --sink ndjson was requested: stdout then carries only the data rows
+def data_on_stdout(argv):
+    for index, arg in enumerate(argv):
+        if arg in ("--format=ndjson", "--sink=ndjson") or (arg in ("--format", "--sink") and argv[index + 1:index + 2] == ["ndjson"]):
+            return True
+    return False
+
+
 # Initialize logger. Start of script.
-logger.info("Script started")
-check_and_install_modules(required_modules)
+# Only when run as a script: importing netbox_api has no side effects beyond logger setup.
+if __name__ == "__main__":
+    logger.info("Script started")
+    with contextlib.redirect_stdout(sys.stderr if data_on_stdout(sys.argv[2:]) else sys.stdout):
+        check_and_install_modules(required_modules)
 
 # Main Modules
 import os
@@ -190,28 +264,54 @@ import pynetbox
 import json
 import csv
 import sys
-from csv import writer
 import random
 import requests
-import pandas as pd
 import datetime
+import time
+import signal
 from datetime import datetime
-import openpyxl
-from openpyxl.styles import Alignment
 import textwrap
 import subprocess
 import urllib.parse
-from openpyxl.styles import Font, Color, PatternFill
-from openpyxl.worksheet.table import Table, TableStyleInfo
-
-# Load sensitive data from config.py and store as environment variables
-try:
-    from config import NETBOX_TOKEN, NETBOX_URL
-    os.environ["NETBOX_TOKEN"] = NETBOX_TOKEN
-    os.environ["NETBOX_URL"] = NETBOX_URL
-except ImportError:
-    print(BG_RED + BLACK + "Error: The config.py file is missing or incomplete." + RESET)
-    sys.exit(1)
+import argparse
+from exporters import OUTPUT_MODES, XLSX_WRITERS, CsvStreamWriter, ColumnWidthTracker, resolve_output_path, stream_csv_to_xlsx, stream_table_to_xlsx, stream_rack_workbook, table_display_name, unique_sheet_title
+from columnar import build_device_frame, frame_column_widths, frame_xlsx_rows, write_frame_csv
+from export_delta import DEFAULT_DELTA_STATE, DELTA_FORMATS, DeltaTracker, delta_summary, write_delta
+from table_exports import EXPORT_FORMATS, FORMAT_EXTENSIONS, RACK_EXPORT_HEADER, export_frame, export_rows
+from bulk_writer import DEFAULT_BATCH_SIZE, DEFAULT_WRITE_WORKERS, DEFAULT_WRITE_RATE, DEFAULT_JOURNAL_PATH, BulkWriteAborted, TokenBucket, UpdateJournal, plan_age_updates, bulk_patch
+from parallel_fetch import DEFAULT_WORKERS, DEFAULT_PAGE_SIZE, fetch_raw, fetch_records, stream_raw, stream_records
+from record_pipeline import SINK_NAMES, SINK_PATHS, default_sinks, fan_out, open_record_sinks, project_records
+from snapshot_store import DEFAULT_SNAPSHOT_PATH, open_snapshot, sync_snapshot, last_synced_at, load_raw, load_records
+from lookup_tables import missing_lookups, prefetch_lookups, resolve_device
+from api_metrics import RequestCounter, count_requests
+from graphql_backend import GRAPHQL_DEVICE_FILTERS, fetch_graphql_devices, graphql_device_values
+from raw_backend import raw_export_values
+from query_filters import build_device_filters, filter_values, graphql_filter_values, matches_filters
+from http_session import DEFAULT_RETRIES, DEFAULT_BACKOFF, DEFAULT_TIMEOUT, make_session
+from progress import DEFAULT_PROGRESS_EVERY, ProgressReporter
+from rack_occupancy import OCCUPANCY_HEADER, build_occupancy, load_occupancy, occupancy_row, racks_that_fit, refresh_occupancy
+from execution_plan import SharedInventory, describe_plan, plan_batches, run_batch, split_commands
+from watch_daemon import DEFAULT_LISTEN, DEFAULT_DEBOUNCE, Debouncer, InventoryState, make_webhook_server
+from rack_shards import UNASSIGNED_SHARD, SHARD_KEYS, INDEX_PATH, MANIFEST_PATH, rack_sheet_name, remove_previous_shards, write_rack_shards, write_index_workbook, write_manifest
+from federation import INSTANCE_HEADER, FEDERATED_COMMANDS, configured_instances, select_instances, instance_path, run_on_instances, merged_device_values, merged_racks
+from profiling import phase_timer, timed_phase, timed_iter, profile_lines, write_trace
+
+# Load sensitive data from config.py and store as environment variables. NETBOX_INSTANCES
+# (optional) names several NetBox servers; NETBOX_URL and NETBOX_TOKEN may then be left out.
+if not SHARD_WORKER:
+    try:
+        import config
+        NETBOX_INSTANCES = getattr(config, "NETBOX_INSTANCES", None)
+        if NETBOX_INSTANCES:
+            NETBOX_TOKEN = getattr(config, "NETBOX_TOKEN", "")
+            NETBOX_URL = getattr(config, "NETBOX_URL", "")
+        else:
+            from config import NETBOX_TOKEN, NETBOX_URL
+        os.environ["NETBOX_TOKEN"] = NETBOX_TOKEN
+        os.environ["NETBOX_URL"] = NETBOX_URL
+    except ImportError:
+        print(BG_RED + BLACK + "Error: The config.py file is missing or incomplete." + RESET)
+        sys.exit(1)
 
 # Import ascii art from ascii_art.py
 from ascii_art import VIDGO_ASCII, FACE_ASCII, CHUCK_ASCII, NETBOX_ASCII
@@ -257,27 +357,32 @@ def display_config_file():
         error_message = f"An error occurred: {e}"
         print(error_message)
         logger.error(error_message)
-        
-try:
-    # Initialize the NetBox API connection
-    nb = pynetbox.api(NETBOX_URL, NETBOX_TOKEN)
-except IndexError as index_error:
-    error_message = "Error initializing NetBox API: {}".format(index_error)
-    logger.error(error_message)
-    print(error_message)
-    logger.error("Check your config.py file for `NETBOX_TOKEN` and `NETBOX_URL` definitions.")
-    print(BOLD + BG_RED + YELLOW + "Check your config.py file for `NETBOX_TOKEN` and `NETBOX_URL` definitions." + RESET)
-    display_config_file()
-    #logger.info(display_config_file())
-    print()
-    sys.exit(1)
-except Exception as e:
-    error_message = "An error occurred: {}".format(e)
-    logger.error(error_message)
-    print("An error occurred while initializing NetBox API.")
-    sys.exit(1)
 
-nb_devicelist = nb.dcim.devices.all()
+
+
+# Initialize the NetBox API connection on the shared session (or on an instance's own session,
+# for url and token). Building the client does no network I/O; listings are only fetched by the
+# subcommands that need them.
+def connect_netbox(session, url=None, token=None):
+    try:
+        nb = pynetbox.api(url or NETBOX_URL, token or NETBOX_TOKEN)
+        nb.http_session = session
+        return nb
+    except IndexError as index_error:
+        error_message = "Error initializing NetBox API: {}".format(index_error)
+        logger.error(error_message)
+        print(error_message)
+        logger.error("Check your config.py file for `NETBOX_TOKEN` and `NETBOX_URL` definitions.")
+        print(BOLD + BG_RED + YELLOW + "Check your config.py file for `NETBOX_TOKEN` and `NETBOX_URL` definitions." + RESET)
+        display_config_file()
+        #logger.info(display_config_file())
+        print()
+        sys.exit(1)
+    except Exception as e:
+        error_message = "An error occurred: {}".format(e)
+        logger.error(error_message)
+        print("An error occurred while initializing NetBox API.")
+        sys.exit(1)
 
 headers = ['Name', 'Status', 'Site', 'Rack', 'Role', 'Manufacturer', 'Type', 'Owner', 'Birthday', 'Age (Months)', 'Service Contract', 'Warranty', 'Serial Number', 'Platform', 'Software', 'SW_Version', 'Primary IP']
 
@@ -289,7 +394,12 @@ def calculate_age_in_months(birthday):
 	return age_months
 
 
-def csv_to_xlsx(headers, devices_data):
+def csv_to_xlsx(headers, devices_data, xlsx_path='output.xlsx'):
+    # openpyxl is only needed by the XLSX writers, so it is imported here rather than at startup
+    import openpyxl
+    from openpyxl.styles import Alignment, Font
+    from openpyxl.worksheet.table import Table, TableStyleInfo
+
     wb = openpyxl.Workbook()
     ws = wb.active
 
@@ -330,120 +440,472 @@ def csv_to_xlsx(headers, devices_data):
     table.tableStyleInfo = style
     ws.add_table(table)
 
-    wb.save('output.xlsx')
+    wb.save(xlsx_path)
 	
 
-def get_devices(nb_devicelist, headers):
-    devices_data = []  # List to hold device information
+# Assemble one export row. The REST, raw and GraphQL backends all render their fields
+# to the same values and go through here, so the CSV/XLSX output doesn't depend on the backend.
+# instance is set for the rows of a merged multi-instance export.
+def assemble_device_row(name, status, site, rack, role, manufacturer, device_type, serial, platform, primary_ip, custom_fields, instance=None):
+    result = {}
+    if instance is not None:
+        result[INSTANCE_HEADER] = instance
+    result['Name'] = name
+    result['Status'] = status
+    result['Site'] = site
+    result['Rack'] = rack
+    result['Role'] = role
+    result['Manufacturer'] = manufacturer
+    result['Type'] = device_type
+    result['Owner'] = custom_fields.get('owner')
+    result['Birthday'] = custom_fields.get('Birthday')
+    age = custom_fields.get('age')
+    if age is None and result['Birthday']:
+        result['Age (Months)'] = calculate_age_in_months(result['Birthday'])
+    else:
+        result['Age (Months)'] = age
+    result['Service Contract'] = custom_fields.get('service_contract')
+    result['Warranty'] = custom_fields.get('warranty')
+    result['Serial Number'] = serial
+    result['Platform'] = platform
+    result['SW'] = custom_fields.get('SW')
+    result['SW_Version'] = custom_fields.get('SW_Version')
+    result['Primary IP'] = primary_ip
+    return result
+
+
+# Render one pynetbox device record into the values assemble_device_row takes
+def device_values(nb_device, status, lookups=None):
+    # Prefetched lookup tables resolve related objects without a GET per device
+    if lookups is not None:
+        resolved = resolve_device(nb_device, lookups)
+        role = resolved['role']
+        manufacturer = resolved['manufacturer']
+        device_type = str(resolved['type'])
+        platform = str(resolved['platform'])
+    else:
+        role = nb_device.device_role.name
+        manufacturer = nb_device.device_type.manufacturer.name
+        device_type = str(nb_device.device_type)
+        platform = str(nb_device.platform)
+    return {
+        "name": str(nb_device),
+        "status": status,
+        "site": str(nb_device.site),
+        "rack": str(nb_device.rack),
+        "role": role,
+        "manufacturer": manufacturer,
+        "device_type": device_type,
+        "serial": str(nb_device.serial),
+        "platform": platform,
+        "primary_ip": str(nb_device.primary_ip),
+        "custom_fields": nb_device.custom_fields,
+    }
+
+
+# Build the export row for one pynetbox device record
+def build_device_row(nb_device, status, lookups=None):
+    return assemble_device_row(**device_values(nb_device, status, lookups))
+
+
+# Device values for a pynetbox device listing. Status and the other device filters were
+# already applied by NetBox (or by the snapshot), so every device returned is exported.
+def record_device_values(nb_devicelist, lookups=None):
+    for nb_device in nb_devicelist:
+        yield device_values(nb_device, str(nb_device.status), lookups)
+
+
+# Device values for the devices returned by the GraphQL backend that match the device filters
+def graphql_export_values(graphql_devices, filters=None):
+    for device in graphql_devices:
+        if filters and not matches_filters(graphql_filter_values(device), filters):
+            continue
+        yield graphql_device_values(device)
+
+
+# Device values of the GraphQL backend. The device filters go into the query; the ones the server
+# can't take are applied to the returned devices. With the columnar transform handling status
+# (statuses set), status isn't checked again per device.
+def graphql_device_listing(session, netbox_url, netbox_token, page_size, device_filters, statuses=None):
+    graphql_devices, local_filters = fetch_graphql_devices(session, netbox_url, netbox_token, page_size, device_filters)
+    rejected = [key for key in local_filters if key in GRAPHQL_DEVICE_FILTERS]
+    if rejected:
+        logger.warning("NetBox's GraphQL schema rejected the device filters (%s); fetching every device and filtering locally.", ", ".join(rejected))
+    row_filters = {key: value for key, value in local_filters.items() if not (statuses and key == "status")}
+    return graphql_export_values(timed_iter(graphql_devices, "fetch"), row_filters)
+
+
+# Ways of turning device values into report rows: a pandas DataFrame, one dict per device, or
+# the record pipeline streaming compact records to every sink in one pass
+TRANSFORMS = ('columnar', 'rows', 'stream')
+
+
+# The columnar transform needs pandas; without it the report is built row by row. The stream
+# transform always spools its workbook, so --xlsx-writer memory builds the rows instead.
+def resolve_transform(transform, xlsx_writer='stream'):
+    if transform == 'columnar' and importlib.util.find_spec('pandas') is None:
+        logger.warning("pandas is not installed; using the per-row transform.")
+        return 'rows'
+    if transform == 'stream' and xlsx_writer == 'memory':
+        return 'rows'
+    return transform
+
+
+def get_devices(device_values, headers, output_mode='truncate', xlsx_writer='stream', total=None, progress_every=DEFAULT_PROGRESS_EVERY, transform='rows', statuses=None, export_format='xlsx', stream=None, delta=None, sinks=None):
+    devices_data = []  # List to hold device information (only kept for the in-memory XLSX writer)
+    width_tracker = ColumnWidthTracker(headers)
+    csv_path = resolve_output_path('output.csv', output_mode)
+    xlsx_path = resolve_output_path('output.xlsx', output_mode)
+    export_path = resolve_output_path('output' + FORMAT_EXTENSIONS.get(export_format, ''), output_mode)
     logger.info("Getting device information from Netbox...")
     print()
     print(BOLD + BG_GREEN + WHITE +"Getting device information from Netbox..." + RESET)
     print(UNDERLINE + BG_GREEN + BLACK + "................................................" + RESET)
     print()
     print(GREEN + NETBOX_ASCII + RESET)
-    str1 = 'Active'
-    for nb_device in nb_devicelist:
-        result = {}
-        status = str(nb_device.status)
-        if status == str1:
-            result['Name'] = str(nb_device)
-            result['Status'] = status
-            result['Site'] = str(nb_device.site)
-            result['Rack'] = str(nb_device.rack)
-            result['Role'] = nb_device.device_role.name
-            result['Manufacturer'] = nb_device.device_type.manufacturer.name
-            result['Type'] = str(nb_device.device_type)
-            result['Owner'] = nb_device.custom_fields.get('owner')
-            result['Birthday'] = nb_device.custom_fields.get('Birthday')
-            age = nb_device.custom_fields.get('age')
-            if age is None and result['Birthday']:
-                result['Age (Months)'] = calculate_age_in_months(result['Birthday'])
-            else:
-                result['Age (Months)'] = age
-            result['Service Contract'] = nb_device.custom_fields.get('service_contract')
-            result['Warranty'] = nb_device.custom_fields.get('warranty')
-            result['Serial Number'] = str(nb_device.serial)
-            result['Platform'] = str(nb_device.platform)
-            result['SW'] = nb_device.custom_fields.get('SW')
-            result['SW_Version'] = nb_device.custom_fields.get('SW_Version')
-            result['Primary IP'] = str(nb_device.primary_ip)
-
-            devices_data.append(result)
-
-        # Logging information for each device processed
-        if 'Name' in result:
-            logger.info("Processed device: %s", result['Name'])
-
-        with open('output.csv', 'a', newline='') as f_object:
-            writer_object = writer(f_object)
-            for device in devices_data:
-                writer_object.writerow([device.get(header, '') for header in headers])
-
-    csv_to_xlsx(headers, devices_data)
-    logger.info("Device information written to output.csv and output.xlsx")
-    print(BOLD + BG_GREEN + WHITE + "Device information written to output.csv and output.xlsx" + RESET)
+    progress = ProgressReporter(logger, "devices", total, progress_every)
+    if transform == 'columnar':
+        write_device_frame(device_values, headers, csv_path, xlsx_path, xlsx_writer, progress, statuses, export_format, export_path, stream, delta)
+        report_devices_written(csv_path, xlsx_path, export_format, export_path)
+        return
+    if transform == 'stream':
+        destination = stream_device_records(device_values, headers, sinks or default_sinks(export_format), output_mode, progress, stream, delta)
+        report_devices_written(csv_path, xlsx_path, destination=destination)
+        return
+
+    device_rows = (assemble_device_row(**values) for values in device_values)
+    if export_format != 'xlsx':
+        # Parquet/Arrow/NDJSON: rows are converted and written in chunks as they are built
+        def tracked(rows):
+            for row in rows:
+                progress.update()
+                if delta is not None:
+                    delta.add(row)
+                yield row
+
+        with timed_phase("export"):
+            export_rows(timed_iter(tracked(device_rows), "transform"), headers, export_format, export_path, stream=stream)
+        progress.finish()
+        report_devices_written(csv_path, xlsx_path, export_format, export_path)
+        return
+
+    # One file handle for the whole run; each device row is written once as it is processed
+    # Building each row is timed as 'transform' (and the pages it pulls as 'fetch'), writing it as 'csv'
+    with CsvStreamWriter(csv_path, headers, width_tracker) as csv_stream:
+        for result in timed_iter(device_rows, "transform"):
+            if xlsx_writer == 'memory':
+                devices_data.append(result)
+            phase_timer.push("csv")
+            csv_stream.write(result)
+            phase_timer.pop()
+            if delta is not None:
+                delta.add(result)
+
+            # Per-device lines only at --log-level DEBUG; INFO gets a summary every progress_every devices
+            logger.debug("Processed device: %s", result['Name'])
+            progress.update()
+    progress.finish()
+
+    with timed_phase("xlsx"):
+        if xlsx_writer == 'memory':
+            csv_to_xlsx(headers, devices_data, xlsx_path)
+        else:
+            # Stream the CSV back into a write-only workbook; widths were measured while writing the CSV
+            stream_csv_to_xlsx(csv_path, xlsx_path, width_tracker.widths, numeric_headers=('Age (Months)',))
+    report_devices_written(csv_path, xlsx_path)
+
+
+# Columnar transform: collect the device values into a DataFrame (age, status filter and column
+# projection computed once per column), then write the CSV and XLSX from that frame
+def write_device_frame(device_values, headers, csv_path, xlsx_path, xlsx_writer, progress, statuses=None, export_format='xlsx', export_path=None, stream=None, delta=None):
+    def counted(values):
+        for item in values:
+            progress.update()
+            yield item
+
+    with timed_phase("transform"):
+        frame = build_device_frame(counted(device_values), headers, statuses)
+    progress.finish()
+    logger.info("Built device frame: %d rows x %d columns.", len(frame), len(frame.columns))
+    if delta is not None:
+        with timed_phase("transform"):
+            delta.add_frame(frame)
+
+    if export_format != 'xlsx':
+        with timed_phase("export"):
+            export_frame(frame, export_format, export_path, stream=stream)
+        return
+
+    with timed_phase("csv"):
+        write_frame_csv(frame, csv_path)
+    with timed_phase("xlsx"):
+        if xlsx_writer == 'memory':
+            csv_to_xlsx(headers, frame.to_dict('records'), xlsx_path)
+        else:
+            stream_table_to_xlsx(headers, frame_xlsx_rows(frame, ('Age (Months)',)), xlsx_path, frame_column_widths(frame))
+
+
+# Stream transform: each device's values become one compact record that every sink writes in
+# the same pass. Returns the destinations for the summary line.
+def stream_device_records(device_values, headers, sink_names, output_mode='truncate', progress=None, stream=None, delta=None):
+    paths = {name: resolve_output_path(path, output_mode) for name, path in SINK_PATHS.items()}
+    sinks = open_record_sinks(sink_names, paths, headers, stream, delta)
+    rows = (assemble_device_row(**values) for values in device_values)
+    count = fan_out(timed_iter(project_records(rows, headers), "transform"), sinks, progress)
+    if progress is not None:
+        progress.finish()
+    logger.info("Streamed %d device records to %s.", count, ", ".join(sink_names))
+    return ", ".join("stdout (NDJSON)" if name == 'ndjson' else paths[name] for name in SINK_NAMES if name in sink_names)
+
+
+# Compare the export just written with the previous one and save only the changes
+def report_device_delta(delta, delta_format, output_mode='truncate'):
+    with timed_phase("transform"):
+        changes = delta.finish()
+    if changes['baseline']:
+        message = f"Delta: no previous export in {delta.state_path}; recorded {changes['devices']} devices as the baseline."
+        logger.info(message)
+        print(BOLD + BG_GREEN + WHITE + message + RESET)
+        return
+    delta_path = resolve_output_path('output_delta.' + delta_format, output_mode)
+    with timed_phase("export"):
+        write_delta(changes, delta_format, delta_path)
+    summary = delta_summary(changes)
+    message = (f"Delta since {changes['previous_export']}: {summary['added']} added, {summary['removed']} removed, "
+               f"{summary['modified']} modified. Saved to {delta_path}")
+    logger.info(message)
+    print(BOLD + BG_GREEN + WHITE + message + RESET)
+
+
+# destination overrides the files named after the export format (the stream transform's sinks)
+def report_devices_written(csv_path, xlsx_path, export_format='xlsx', export_path=None, destination=None):
+    if destination is None:
+        if export_format == 'ndjson':
+            destination = "stdout (NDJSON)"
+        elif export_format != 'xlsx':
+            destination = export_path
+        else:
+            destination = f"{csv_path} and {xlsx_path}"
+    logger.info("Device information written to %s", destination)
+    print(BOLD + BG_GREEN + WHITE + f"Device information written to {destination}" + RESET)
     logger.info("Finished getting device information from Netbox")
     print(BOLD + BG_GREEN + WHITE + "Finished getting device information from Netbox" + RESET)
     print(UNDERLINE + BG_GREEN + BLACK + "................................................" + RESET)
     print()
 
 
-def update_age(nb_devicelist):
+UPDATE_PLAN_PATH = 'update_age_plan.csv'
+UPDATE_PLAN_HEADER = ['Device', 'ID', 'Current Age', 'New Age']
+
+
+def print_update_age_banner():
     logger.info("Updating age information for devices...")
     print()
     print(BG_CYAN + BLACK + "Updating age information for devices..." + RESET)
     print(UNDERLINE + BG_CYAN + BLACK + "................................................" + RESET)
     print()
     print(CYAN + NETBOX_ASCII + RESET)
-    for nb_device in nb_devicelist:
-        status = str(nb_device.status)
-        if status == "Active":
-            birthday = nb_device.custom_fields.get('Birthday')
-            if birthday:
-                new_age = calculate_age_in_months(birthday)
-                # Update the 'age' custom field in NetBox
-                nb_device.custom_fields['age'] = new_age
-                nb_device.save()
-                logger.info("Updated age for device %s to %d months.", nb_device.name, new_age)
-    
+
+
+# A journaled plan is only resumed by a run for the same month and the same device filters;
+# in another month every planned age would be stale
+def update_plan_key(device_filters):
+    return json.loads(json.dumps({"month": datetime.today().strftime("%Y-%m"), "filters": device_filters}))
+
+
+# Fetch the devices matching device_filters and work out which ages change. With resume, a plan
+# from the journal is reused instead (no device listing), minus the devices it already wrote.
+# Returns the summary line. Several instances updating side by side pass banner=False and their
+# own journal and plan paths.
+def update_age(devices_endpoint, device_filters=None, batch_size=DEFAULT_BATCH_SIZE, progress_every=DEFAULT_PROGRESS_EVERY, workers=DEFAULT_WORKERS, page_size=DEFAULT_PAGE_SIZE,
+               write_workers=DEFAULT_WRITE_WORKERS, write_rate=DEFAULT_WRITE_RATE, journal_path=DEFAULT_JOURNAL_PATH, resume=False, dry_run=False, inventory=None,
+               plan_path=None, banner=True):
+    plan_path = plan_path or UPDATE_PLAN_PATH
+    if banner:
+        print_update_age_banner()
+
+    key = update_plan_key(device_filters or {})
+    journal = None
+    planned = None
+    if resume and not dry_run:
+        journal = UpdateJournal(journal_path, resume=True)
+        if journal.plan is not None and journal.plan["key"] == key:
+            planned = journal.remaining(journal.plan["updates"])
+            skipped = journal.plan["skipped"]
+            message = f"Resuming {journal_path}: {len(journal.done)} devices already written, {len(planned)} left ({len(journal.failed)} failed last time)."
+            logger.info(message)
+            print(BOLD + BG_CYAN + BLACK + message + RESET)
+        else:
+            if journal.plan is not None:
+                logger.warning("Journal %s was planned for another month or other filters; starting a new run.", journal_path)
+            journal.close()
+            journal = None
+
+    if planned is None:
+        # Compute every new age first so devices whose 'age' is already current are never written.
+        # The listing is filtered server-side (active devices by default).
+        with timed_phase("fetch"):
+            nb_devicelist = fetch_listing(devices_endpoint, None, workers, page_size, filters=device_filters, inventory=inventory)
+        with timed_phase("transform"):
+            planned, skipped = plan_age_updates(nb_devicelist, calculate_age_in_months)
+        for update in planned:
+            logger.debug("Planned age update for device %s: %s -> %d months.", update["name"], update["old_age"], update["age"])
+        logger.info("Planned %d age updates, %d devices already current.", len(planned), skipped)
+
+    if dry_run:
+        with CsvStreamWriter(plan_path, UPDATE_PLAN_HEADER) as csv_stream:
+            for update in planned:
+                csv_stream.write({'Device': update["name"], 'ID': update["id"], 'Current Age': update["old_age"], 'New Age': update["age"]})
+        summary = f"Dry run: {len(planned)} devices would change, {skipped} already current. Planned changes saved to {plan_path}; nothing was written."
+        logger.info(summary)
+        if banner:
+            print(BOLD + BG_CYAN + BLACK + summary + RESET)
+            print()
+            print(UNDERLINE + BG_CYAN + BLACK + "................................................" + RESET)
+            print()
+        return summary
+
+    if journal is None:
+        journal = UpdateJournal(journal_path)
+        journal.record_plan(planned, skipped, key)
+
+    # Send the remaining changes to NetBox as batched bulk PATCHes, write_workers at a time. An
+    # expired token or a NetBox that stops answering ends the run; the journal keeps what was
+    # written so --resume picks up from there.
+    limiter = TokenBucket(write_rate) if write_rate else None
+    progress = ProgressReporter(logger, "devices written", len(planned), progress_every)
+    try:
+        with timed_phase("write"):
+            result = bulk_patch(devices_endpoint, planned, batch_size, skipped, progress, write_workers, limiter, journal)
+    except BulkWriteAborted as aborted:
+        message = f"Age update stopped after {aborted.result['changed']} devices were written: {aborted}. Rerun with --resume to continue; progress is in {journal_path}."
+        logger.error(message)
+        if not banner:
+            raise RuntimeError(message) from aborted
+        print(BOLD + BG_RED + WHITE + f"❌  {message}" + RESET)
+        sys.exit(1)
+    finally:
+        journal.close()
+    progress.finish()
+    if inventory is not None:
+        # Later steps of this run export the ages just written
+        written = set(result["written"])
+        inventory.update_custom_field(devices_endpoint, 'age', {update["id"]: update["age"] for update in planned if update["id"] in written})
+    for device_name, error in result["errors"]:
+        logger.error("Failed to update age for device %s: %s", device_name, error)
+
+    summary = "Age update: {changed} changed, {skipped} skipped (already current), {failed} failed in {requests} write requests.".format(**result)
+    logger.info(summary)
+    if banner:
+        print(BOLD + BG_CYAN + BLACK + summary + RESET)
+    if result["failed"]:
+        message = f"Rerun with --resume to retry the failed devices; progress is in {journal_path}."
+        logger.warning(message)
+        if banner:
+            print(BOLD + BG_YELLOW + BLACK + message + RESET)
+        summary += " " + message
     logger.info("Age information update complete.")
-    print()
-    print(UNDERLINE + BG_CYAN + BLACK + "................................................" + RESET)
-    print()
+    if banner:
+        print()
+        print(UNDERLINE + BG_CYAN + BLACK + "................................................" + RESET)
+        print()
+    return summary
+
+RACK_SHEET_HEADER = ["Device Name", "Role", "Type", "Manufacturer", "Rack Unit"]
+
+
+# Rows of one rack sheet, highest rack unit first
+def rack_unit_sort_key(device_info):
+    rack_unit = device_info["rack_unit"]
+    if isinstance(rack_unit, (int, float)):
+        return (1, rack_unit)
+    return (0, 0)
+
+
+# True for a merged multi-instance rack report, whose racks are tagged with their instance
+def merged_rack_report(racks_with_devices):
+    return any("instance" in rack_info for rack_info, _ in racks_with_devices.values())
+
+
+# Columns of the rack sheets; a merged multi-instance report leads with the Instance column
+def rack_sheet_header(racks_with_devices):
+    return [INSTANCE_HEADER] + RACK_SHEET_HEADER if merged_rack_report(racks_with_devices) else RACK_SHEET_HEADER
+
+
+def rack_sheet_rows(devices_info, instance=None):
+    rows = []
+    # Sort devices_info by the "Rack Unit" in decreasing order; unracked devices ('N/A') go last
+    devices_info = sorted(devices_info, key=rack_unit_sort_key, reverse=True)
+
+    for device_info in devices_info:
+        # Format the "Rack Unit" to display single digits as double digits
+        rack_unit = device_info['rack_unit']
+        if isinstance(rack_unit, (int, float)):
+            rack_unit_formatted = f"{int(rack_unit):02d}"  # Format as two-digit string
+        else:
+            rack_unit_formatted = str(rack_unit)  # Keep other values as they are
+
+        row = [
+            device_info["name"],
+            device_info["role"],
+            device_info["type"],
+            device_info["manufacturer"],
+            rack_unit_formatted
+        ]
+        if instance is not None:
+            row.insert(0, instance)
+        rows.append(row)
+    return rows
+
+
+# Flat rack report for the table formats: one row per device, highest rack unit first within each rack
+def rack_export_rows(racks_with_devices):
+    for rack_info, devices_info in racks_with_devices.values():
+        for device_info in sorted(devices_info, key=rack_unit_sort_key, reverse=True):
+            rack_unit = device_info["rack_unit"]
+            yield {
+                INSTANCE_HEADER: rack_info.get("instance"),
+                "Rack": rack_info["name"],
+                "Site": rack_info["site"],
+                "Device Name": device_info["name"],
+                "Role": device_info["role"],
+                "Type": device_info["type"],
+                "Manufacturer": device_info["manufacturer"],
+                "Rack Unit": int(rack_unit) if isinstance(rack_unit, (int, float)) else None,
+            }
+
+
+# racks_with_devices maps rack ID -> (rack_info, devices_info); racks at different sites may share a name
+def save_rack_details_to_xlsx(racks_with_devices, xlsx_writer='stream'):
+    header = rack_sheet_header(racks_with_devices)
+    if xlsx_writer == 'stream':
+        # Write-only sheets with shared named styles instead of a Font object per cell
+        sheets = ((rack_sheet_name(rack_info), header, rack_sheet_rows(devices_info, rack_info.get("instance"))) for rack_info, devices_info in racks_with_devices.values())
+        stream_rack_workbook(sheets, 'rack_details_with_devices.xlsx')
+        return
+
+    import openpyxl
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.table import Table, TableStyleInfo
 
-def save_rack_details_to_xlsx(racks_with_devices):
     wb = openpyxl.Workbook()
     # Remove the default "Sheet"
     wb.remove(wb.active)
+    used_titles = set()
 
-    for rack_name, devices_info in racks_with_devices.items():
-        ws = wb.create_sheet(title=rack_name)
-        ws.append(["Device Name", "Role", "Type", "Manufacturer", "Rack Unit"])
-
-        # Sort devices_info by the "Rack Unit" in decreasing order
-        devices_info = sorted(devices_info, key=lambda x: x["rack_unit"], reverse=True)
+    for index, (rack_info, devices_info) in enumerate(racks_with_devices.values(), 1):
+        ws = wb.create_sheet(title=unique_sheet_title(rack_sheet_name(rack_info), used_titles))
+        ws.append(header)
 
-        for device_info in devices_info:
-            # Format the "Rack Unit" to display single digits as double digits
-            rack_unit = device_info['rack_unit']
-            if isinstance(rack_unit, (int, float)):
-                rack_unit_formatted = f"{int(rack_unit):02d}"  # Format as two-digit string
-            else:
-                rack_unit_formatted = str(rack_unit)  # Keep other values as they are
-
-            ws.append([
-                device_info["name"],
-                device_info["role"],
-                device_info["type"],
-                device_info["manufacturer"],
-                rack_unit_formatted
-            ])
+        for row in rack_sheet_rows(devices_info, rack_info.get("instance")):
+            ws.append(row)
         
         # Define a table range including headers
-        table_range = f"A1:E{len(devices_info) + 1}"
+        table_range = f"A1:{get_column_letter(len(header))}{len(devices_info) + 1}"
 
         # Create a table
-        table = Table(displayName=rack_name, ref=table_range)
+        table = Table(displayName=table_display_name(index), ref=table_range)
 
         # Apply a predefined table style with blue colors
         table_style = TableStyleInfo(
@@ -471,44 +933,88 @@ def save_rack_details_to_xlsx(racks_with_devices):
     wb.save('rack_details_with_devices.xlsx')
 
 
-def get_rack_details_with_devices(nb_instance):
+# One workbook per shard under rack_details/, rendered in a process pool, plus the index
+# workbook and manifest linking them. With `only`, just the shards with those values are rewritten.
+# Returns the manifest.
+def save_rack_shards(racks_with_devices, shard_by, processes=None, only=None):
+    entries = [(rack_info, rack_sheet_rows(devices_info, rack_info.get("instance"))) for rack_info, devices_info in racks_with_devices.values()]
+    manifest = write_rack_shards(entries, shard_by, rack_sheet_header(racks_with_devices), processes, only=only)
+    remove_previous_shards(keep={shard['path'] for shard in manifest['shards']})
+    write_index_workbook(manifest)
+    write_manifest(manifest)
+    return manifest
+
+
+# Ways of collecting the devices installed in each rack
+RACK_FETCH_MODES = ('bulk', 'per-rack')
+
+
+# Rack details kept with each rack sheet; site, location and tenant are the --shard-by keys
+def build_rack_info(rack):
+    return {
+        "id": rack.id,
+        "name": rack.name,
+        "site": rack.site.name,
+        "location": str(rack.location) if rack.location else None,
+        "tenant": str(rack.tenant) if rack.tenant else None,
+        "height": rack.u_height
+    }
+
+
+# Build the per-device row shown on a rack sheet
+def build_rack_device_info(device, lookups=None):
+    if lookups is not None:
+        resolved = resolve_device(device, lookups)
+        return {
+            "name": device.name,
+            "role": resolved["role"] or "N/A",
+            "type": resolved["type"] or "N/A",
+            "manufacturer": resolved["manufacturer"] or "N/A",
+            "rack_unit": device.position if device.position else "N/A"
+        }
+    return {
+        "name": device.name,
+        "role": device.device_role.name if device.device_role else "N/A",
+        "type": device.device_type.model if device.device_type else "N/A",
+        "manufacturer": device.device_type.manufacturer.name if device.device_type and device.device_type.manufacturer else "N/A",
+        "rack_unit": device.position if device.position else "N/A"
+    }
+
+
+# Fetch a listing from an endpoint with concurrent page requests. site and filters are passed
+# to NetBox as query parameters, so only matching objects are transferred. With a snapshot
+# connection the listing is read and filtered from the local SQLite store instead of the API.
+# With the shared inventory of a multi-command run, the listing comes from its single fetch.
+# raw returns the plain dicts instead of pynetbox records.
+def fetch_listing(endpoint, site=None, workers=DEFAULT_WORKERS, page_size=DEFAULT_PAGE_SIZE, snapshot=None, filters=None, inventory=None, raw=False):
+    filters = dict(filters or {})
+    if site:
+        filters["site"] = [site]
+    if inventory is not None:
+        return inventory.raw(endpoint, filters) if raw else inventory.records(endpoint, filters)
+    if snapshot is not None:
+        return load_raw(snapshot, endpoint, filters) if raw else load_records(snapshot, endpoint, filters)
+    if raw:
+        return fetch_raw(endpoint, workers, page_size, **filters)
+    return fetch_records(endpoint, workers, page_size, **filters)
+
+
+# Index racked devices by rack ID so each rack is resolved in memory instead of with its own query
+def index_devices_by_rack(devices):
+    devices_by_rack = {}
+    for device in devices:
+        if device.rack:
+            devices_by_rack.setdefault(device.rack.id, []).append(device)
+    return devices_by_rack
+
+
+def get_rack_details_with_devices(nb_instance, site=None, rack_fetch='bulk', workers=DEFAULT_WORKERS, page_size=DEFAULT_PAGE_SIZE, snapshot=None, xlsx_writer='stream', lookups=None, progress_every=DEFAULT_PROGRESS_EVERY, export_format='xlsx', stream=None, shard_by='none', processes=None, inventory=None):
     try:
-        logger.info("Fetching rack details and associated devices from NetBox...")
-        print(BOLD + BG_GREEN + WHITE + "Fetching rack details and associated devices from NetBox..." + RESET)
-        print(UNDERLINE + BG_GREEN + BLACK + "................................................" + RESET)
-
-        print(GREEN + NETBOX_ASCII + RESET)
-        racks_with_devices = {}
-
-        # Fetch all racks from NetBox
-        racks = nb_instance.dcim.racks.all()
-
-        for rack in racks:
-            rack_info = {
-                "name": rack.name,
-                "site": rack.site.name,
-                "location": rack.location,
-                "height": rack.u_height
-            }
-
-            devices_info = []
-            for device in nb_instance.dcim.devices.filter(rack_id=rack.id):
-                device_info = {
-                    "name": device.name,
-                    "role": device.device_role.name if device.device_role else "N/A",
-                    "type": device.device_type.model if device.device_type else "N/A",
-                    "manufacturer": device.device_type.manufacturer.name if device.device_type and device.device_type.manufacturer else "N/A",
-                    "rack_unit": device.position if device.position else "N/A"
-                }
-                devices_info.append(device_info)
-
-            racks_with_devices[rack.name] = devices_info
-
+        print_rack_banner()
+        racks_with_devices = collect_rack_details(nb_instance, site, rack_fetch, workers, page_size, snapshot, lookups, progress_every, inventory)
         logger.info("Retrieved rack details and associated devices.")
         print(BOLD + BG_GREEN + WHITE + "Retrieved rack details and associated devices." + RESET)
-        save_rack_details_to_xlsx(racks_with_devices)
-        logger.info("Saved rack details with associated devices to rack_details_with_devices.xlsx")
-        print(BOLD + BG_GREEN + WHITE + "Saved rack details with associated devices to rack_details_with_devices.xlsx" + RESET)
+        write_rack_details(racks_with_devices, xlsx_writer, export_format, stream, shard_by, processes)
 
     except pynetbox.RequestError as pnb_error:
         logger.error("A pynetbox error occurred: %s", pnb_error)
@@ -518,17 +1024,289 @@ def get_rack_details_with_devices(nb_instance):
     print()
 
 
-def get_rack_names(nb_instance):
+def print_rack_banner():
+    logger.info("Fetching rack details and associated devices from NetBox...")
+    print(BOLD + BG_GREEN + WHITE + "Fetching rack details and associated devices from NetBox..." + RESET)
+    print(UNDERLINE + BG_GREEN + BLACK + "................................................" + RESET)
+
+    print(GREEN + NETBOX_ASCII + RESET)
+
+
+# Fetch the racks (at site) and the devices installed in each, as rack ID -> (rack_info, devices_info)
+def collect_rack_details(nb_instance, site=None, rack_fetch='bulk', workers=DEFAULT_WORKERS, page_size=DEFAULT_PAGE_SIZE, snapshot=None, lookups=None, progress_every=DEFAULT_PROGRESS_EVERY, inventory=None):
+    racks_with_devices = {}
+
+    # Fetch all racks from NetBox
+    with timed_phase("fetch"):
+        racks = fetch_listing(nb_instance.dcim.racks, site, workers, page_size, snapshot, inventory=inventory)
+
+    # Bulk mode pulls every device once (one paginated listing) and groups it by rack in memory.
+    # A snapshot always uses it, since per-rack queries would go to the API.
+    devices_by_rack = None
+    if rack_fetch == 'bulk' or snapshot is not None:
+        with timed_phase("fetch"):
+            devices_by_rack = index_devices_by_rack(fetch_listing(nb_instance.dcim.devices, site, workers, page_size, snapshot, inventory=inventory))
+        logger.info("Indexed racked devices for %d racks.", len(devices_by_rack))
+
+    progress = ProgressReporter(logger, "racks", len(racks), progress_every)
+    phase_timer.push("transform")
+    for rack in racks:
+        rack_info = build_rack_info(rack)
+
+        if devices_by_rack is not None:
+            rack_devices = devices_by_rack.get(rack.id, [])
+        else:
+            rack_devices = timed_iter(nb_instance.dcim.devices.filter(rack_id=rack.id), "fetch")
+
+        devices_info = [build_rack_device_info(device, lookups) for device in rack_devices]
+
+        racks_with_devices[rack.id] = (rack_info, devices_info)
+        progress.update()
+    phase_timer.pop()
+    progress.finish()
+    return racks_with_devices
+
+
+# Write the rack report: one workbook, sharded workbooks, or a Parquet/Arrow/NDJSON table.
+# Returns where it went.
+def write_rack_details(racks_with_devices, xlsx_writer='stream', export_format='xlsx', stream=None, shard_by='none', processes=None):
+    if export_format != 'xlsx':
+        if shard_by != 'none':
+            logger.warning("--shard-by only applies to --format xlsx; writing one %s export.", export_format)
+        export_path = 'rack_details_with_devices' + FORMAT_EXTENSIONS.get(export_format, '')
+        header = [INSTANCE_HEADER] + RACK_EXPORT_HEADER if merged_rack_report(racks_with_devices) else RACK_EXPORT_HEADER
+        with timed_phase("export"):
+            export_rows(rack_export_rows(racks_with_devices), header, export_format, export_path, stream=stream)
+        destination = "stdout (NDJSON)" if export_format == 'ndjson' else export_path
+    elif shard_by != 'none':
+        with timed_phase("xlsx"):
+            manifest = save_rack_shards(racks_with_devices, shard_by, processes)
+        logger.info("Wrote %d rack workbooks sharded by %s.", len(manifest["shards"]), shard_by)
+        destination = f"{len(manifest['shards'])} workbooks in rack_details/ (index {INDEX_PATH}, manifest {MANIFEST_PATH})"
+    else:
+        with timed_phase("xlsx"):
+            save_rack_details_to_xlsx(racks_with_devices, xlsx_writer)
+        destination = "rack_details_with_devices.xlsx"
+    logger.info("Saved rack details with associated devices to %s", destination)
+    print(BOLD + BG_GREEN + WHITE + f"Saved rack details with associated devices to {destination}" + RESET)
+    return destination
+
+
+# Write output.csv and output.xlsx from finished export rows
+def write_device_rows(rows, headers, csv_path='output.csv', xlsx_path='output.xlsx'):
+    width_tracker = ColumnWidthTracker(headers)
+    with CsvStreamWriter(csv_path, headers, width_tracker) as csv_stream:
+        for row in rows:
+            csv_stream.write(row)
+    stream_csv_to_xlsx(csv_path, xlsx_path, width_tracker.widths, numeric_headers=('Age (Months)',))
+    return csv_stream.rows_written
+
+
+# serve/watch: pull devices and racks once, write the device and rack exports, then keep both in
+# memory and apply NetBox webhooks (POST /webhook) as they arrive. After a quiet period of
+# `debounce` seconds the export rows of the changed devices and the sheets of the changed racks
+# are rebuilt, and only the affected files (or, sharded, the affected rack workbooks) are rewritten.
+def serve_inventory(nb_instance, device_filters=None, site=None, lookups=None, workers=DEFAULT_WORKERS, page_size=DEFAULT_PAGE_SIZE, shard_by='none', processes=None,
+                    listen=DEFAULT_LISTEN, debounce=DEFAULT_DEBOUNCE, secret=None):
+    logger.info("Loading the device and rack inventory into memory...")
+    print(BOLD + BG_GREEN + WHITE + "Loading the device and rack inventory into memory..." + RESET)
+    devices_endpoint = nb_instance.dcim.devices
+    racks_endpoint = nb_instance.dcim.racks
+    # Devices are pulled for every status: a webhook can move a device into the filtered set
+    scope = {"site": site} if site else {}
+    with timed_phase("fetch"):
+        state = InventoryState(fetch_raw(devices_endpoint, workers, page_size, **scope), fetch_raw(racks_endpoint, workers, page_size, **scope))
+    device_rows = {}
+    racks_with_devices = {}
+
+    def device_record(item):
+        return devices_endpoint.return_obj(item, devices_endpoint.api, devices_endpoint)
+
+    def refresh_devices(device_ids):
+        for device_id in device_ids:
+            item = state.devices.get(device_id)
+            if item is not None and matches_filters(filter_values(item), device_filters or {}):
+                record = device_record(item)
+                device_rows[device_id] = build_device_row(record, str(record.status), lookups)
+            else:
+                device_rows.pop(device_id, None)
+
+    def refresh_racks(rack_ids):
+        for rack_id in rack_ids:
+            item = state.racks.get(rack_id)
+            if item is not None and (not site or (item.get("site") or {}).get("slug") == site):
+                rack = racks_endpoint.return_obj(item, racks_endpoint.api, racks_endpoint)
+                devices_info = [build_rack_device_info(device_record(state.devices[device_id]), lookups)
+                                for device_id in sorted(state.rack_devices.get(rack_id, ()))]
+                racks_with_devices[rack_id] = (build_rack_info(rack), devices_info)
+            else:
+                racks_with_devices.pop(rack_id, None)
+
+    def write_reports(write_devices, shards):
+        if write_devices:
+            with timed_phase("csv"):
+                write_device_rows((device_rows[device_id] for device_id in sorted(device_rows)), headers)
+        if shards is not None:
+            ordered = dict(sorted(racks_with_devices.items()))
+            with timed_phase("xlsx"):
+                if shard_by != 'none':
+                    save_rack_shards(ordered, shard_by, processes, only=shards or None)
+                else:
+                    save_rack_details_to_xlsx(ordered)
+
+    def regenerate(device_ids, rack_ids):
+        started = time.perf_counter()
+        with state.lock:
+            # A device type, manufacturer, role or platform created after startup: reload the lookup tables once
+            if lookups is not None and any(missing_lookups(state.devices[device_id], lookups) for device_id in device_ids if device_id in state.devices):
+                lookups.update(prefetch_lookups(nb_instance, workers, page_size))
+            refresh_devices(device_ids)
+            shard_values = set()
+            if shard_by != 'none':
+                shard_values = {str(racks_with_devices[rack_id][0].get(shard_by) or UNASSIGNED_SHARD) for rack_id in rack_ids if rack_id in racks_with_devices}
+            refresh_racks(rack_ids)
+            if shard_by != 'none':
+                shard_values |= {str(racks_with_devices[rack_id][0].get(shard_by) or UNASSIGNED_SHARD) for rack_id in rack_ids if rack_id in racks_with_devices}
+        write_reports(bool(device_ids), shard_values if rack_ids else None)
+        message = f"Regenerated {len(device_ids)} device rows and {len(rack_ids)} rack sheets in {time.perf_counter() - started:.2f}s."
+        logger.info(message)
+        print(BOLD + BG_CYAN + WHITE + message + RESET)
+
+    with timed_phase("transform"):
+        refresh_devices(list(state.devices))
+        refresh_racks(list(state.racks))
+    write_reports(True, set())
+    message = f"Loaded {len(state.devices)} devices and {len(state.racks)} racks; wrote output.csv, output.xlsx and the rack workbooks."
+    logger.info(message)
+    print(BOLD + BG_GREEN + WHITE + message + RESET)
+
+    debouncer = Debouncer(regenerate, debounce)
+    server = make_webhook_server(listen, state, debouncer, secret, logger)
+    host, port = server.server_address[:2]
+    message = f"Listening for NetBox webhooks on http://{host}:{port}/webhook (status on /status). Press Ctrl+C to stop."
+    logger.info(message)
+    print(BOLD + BG_GREEN + WHITE + message + RESET)
+
+    # SIGTERM (e.g. from systemd) stops the daemon like Ctrl+C
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        debouncer.stop()
+    message = f"Stopped after {state.events} webhook events and {debouncer.regenerations} regenerations."
+    logger.info(message)
+    print(BOLD + BG_GREEN + WHITE + message + RESET)
+
+
+def sync_inventory(nb_instance, snapshot_path=DEFAULT_SNAPSHOT_PATH, workers=DEFAULT_WORKERS, page_size=DEFAULT_PAGE_SIZE):
+    logger.info("Syncing local inventory snapshot %s from NetBox...", snapshot_path)
+    print(BOLD + BG_GREEN + WHITE + f"Syncing local inventory snapshot {snapshot_path} from NetBox..." + RESET)
+    print(UNDERLINE + BG_GREEN + BLACK + "................................................" + RESET)
+    snapshot = open_snapshot(snapshot_path)
+    try:
+        with timed_phase("sync"):
+            results = sync_snapshot(snapshot, nb_instance, workers, page_size)
+        for result in results:
+            message = "Synced {kind}: {updated} changed, {deleted} deleted, {total} total.".format(**result)
+            logger.info(message)
+            print(BOLD + BG_GREEN + WHITE + message + RESET)
+        # Cache the rack occupancy bitmaps so rack_occupancy --offline is a single query
+        with timed_phase("transform"):
+            rack_count = refresh_occupancy(snapshot)
+        logger.info("Cached rack occupancy for %d racks.", rack_count)
+    finally:
+        snapshot.close()
+    print(UNDERLINE + BG_GREEN + BLACK + "................................................" + RESET)
+    print()
+
+
+# Rack occupancy from the API (raw listings, no pynetbox records) or from the occupancy cached
+# in the snapshot. Writes rack_occupancy.csv; with fit_units, lists the racks with room for it.
+# Prefetched lookup tables and the shared inventory of a multi-command run are reused when given.
+def rack_occupancy_report(nb_instance, site=None, fit_units=None, workers=DEFAULT_WORKERS, page_size=DEFAULT_PAGE_SIZE, snapshot=None, lookups=None, inventory=None):
+    logger.info("Computing rack occupancy...")
+    print(BOLD + BG_GREEN + WHITE + "Computing rack occupancy..." + RESET)
+    print(UNDERLINE + BG_GREEN + BLACK + "................................................" + RESET)
+    started = time.perf_counter()
+    if snapshot is not None:
+        with timed_phase("fetch"):
+            occupancy = load_occupancy(snapshot, site, fit_units or 0)
+    else:
+        filters = {"site": site} if site else {}
+        with timed_phase("fetch"):
+            if inventory is not None:
+                racks = inventory.raw(nb_instance.dcim.racks, filters)
+                devices = inventory.raw(nb_instance.dcim.devices, filters)
+            else:
+                racks = fetch_raw(nb_instance.dcim.racks, workers, page_size, **filters)
+                devices = fetch_raw(nb_instance.dcim.devices, workers, page_size, **filters)
+            if lookups is not None:
+                device_types = lookups["device_types"]
+            else:
+                device_types = {item["id"]: item for item in fetch_raw(nb_instance.dcim.device_types, workers, page_size)}
+        with timed_phase("transform"):
+            occupancy = build_occupancy(racks, devices, device_types)
+    built = time.perf_counter()
+
+    if fit_units:
+        fits = racks_that_fit(occupancy, fit_units, site)
+        elapsed_ms = (time.perf_counter() - built) * 1000
+        where = f" at {site}" if site else ""
+        message = f"{len(fits)} racks{where} can fit a {fit_units}U device (query {elapsed_ms:.1f} ms)."
+        for rack, position in fits:
+            print(f"{rack.name:<24} {rack.site or '':<20} free from U{position:<4} largest block {rack.largest_free_block}U")
+        logger.info(message)
+        print(BOLD + BG_GREEN + WHITE + message + RESET)
+    else:
+        with timed_phase("csv"):
+            with CsvStreamWriter('rack_occupancy.csv', OCCUPANCY_HEADER) as csv_stream:
+                for rack in occupancy:
+                    csv_stream.write(occupancy_row(rack))
+        used = sum(rack.used_units for rack in occupancy)
+        total = sum(rack.u_height for rack in occupancy)
+        conflicts = sum(len(rack.conflicts) for rack in occupancy)
+        message = (f"Rack occupancy: {len(occupancy)} racks, {used}/{total} U used "
+                   f"({used / total * 100 if total else 0:.1f}%), {conflicts} conflicts. Saved to rack_occupancy.csv")
+        for rack in occupancy:
+            for name, other in rack.conflicts:
+                logger.info("Rack %s: %s", rack.name, f"{name} overlaps {other}" if other else f"{name} is outside the rack")
+        logger.info(message)
+        print(BOLD + BG_GREEN + WHITE + message + RESET)
+    logger.info("Rack occupancy computed in %.3fs.", built - started)
+    print(UNDERLINE + BG_GREEN + BLACK + "................................................" + RESET)
+    print()
+
+
+# Open the snapshot for an offline run, refusing to render from one that was never synced
+def open_offline_snapshot(snapshot_path):
+    if not os.path.exists(snapshot_path):
+        return None
+    snapshot = open_snapshot(snapshot_path)
+    synced_at = last_synced_at(snapshot)
+    if synced_at is None:
+        snapshot.close()
+        return None
+    logger.info("Offline mode: reading inventory from %s (last synced %s UTC).", snapshot_path, synced_at)
+    print(BOLD + BG_CYAN + WHITE + f"Offline mode: reading inventory from {snapshot_path} (last synced {synced_at} UTC)." + RESET)
+    return snapshot
+
+
+def get_rack_names(nb_instance, workers=DEFAULT_WORKERS, page_size=DEFAULT_PAGE_SIZE):
     rack_names = []
-    racks = nb_instance.dcim.racks.all()
+    racks = fetch_listing(nb_instance.dcim.racks, None, workers, page_size)
     for rack in racks:
         rack_names.append(rack.name)
     return rack_names
 
 
-def joke():
+def joke(session=None):
     try:
-        response = requests.get("https://api.chucknorris.io/jokes/random")
+        response = (session or requests).get("https://api.chucknorris.io/jokes/random")
         response.raise_for_status()  # Check for HTTP errors
         joke_data = response.json()
         joke_text = joke_data.get("value")
@@ -562,10 +1340,34 @@ def show_help():
     print(BOLD + "Available functions:" + RESET)
     print(" ► " + BG_GREEN + BLACK + "get_devices" + RESET + " or " + BG_GREEN + BLACK + "-d" + RESET + " ► GETS active device info from Netbox, writes output.csv and converts to output.xlsx file.")
     print (" ► " + BG_GREEN + BLACK + "get_racks" + RESET + " or " + BG_GREEN + BLACK + "-r" + RESET + " ► GETS rack with device details, and saves file rack_details_with_devices.xlsx.")
+    print(" ► " + BG_GREEN + BLACK + "rack_occupancy" + RESET + " or " + BG_GREEN + BLACK + "-o" + RESET + " ► Computes U-slot occupancy per rack (utilization, largest free block, overlapping devices) and saves rack_occupancy.csv.")
     print(" ► " + BG_BLUE + WHITE + "update_age" + RESET + " or " + BG_BLUE + WHITE + "-a" + RESET + " ► This will update the age for all active devices on Netbox server.")
+    print(" ► " + BG_MAGENTA + WHITE + "sync" + RESET + " ► Syncs the local inventory snapshot (netbox_snapshot.db) with only the objects changed since the last sync.")
+    print(" ► " + BG_MAGENTA + WHITE + "serve" + RESET + " or " + BG_MAGENTA + WHITE + "watch" + RESET + " ► Keeps devices and racks in memory, applies NetBox webhooks and rewrites only the changed exports.")
     print(" ► " + BG_YELLOW + BLACK + "joke:" + RESET + " or " + BG_YELLOW + BLACK + "-j" + RESET +  " ► Prints random Chuck Norris joke.")
     print(" ► " + BG_WHITE + BLACK + "validate_config:" + RESET + " or " + BG_WHITE + BLACK + "-v" + RESET +  " ► Validates script config.py file.")
-    print(BOLD + WHITE + " ► Usage: python netbox_api.py <function_name>")
+    print(BOLD + WHITE + " ► Usage: python netbox_api.py <function_name> [<function_name> ...] [options]   e.g. -a -d -r runs all three on one shared device fetch")
+    print(BOLD + WHITE + " ► Options: --output-mode truncate|timestamp (get_devices: overwrite output files or write timestamped copies)" + RESET)
+    print(BOLD + WHITE + "            --site <slug> (limit devices and racks to a site), --rack-fetch bulk|per-rack (get_racks: how rack devices are fetched)" + RESET)
+    print(BOLD + WHITE + "            --shard-by none|site|location|tenant|instance, --processes <n> (get_racks: one workbook per shard rendered in parallel, with an index workbook and manifest)" + RESET)
+    print(BOLD + WHITE + "            --fit <units> (rack_occupancy: list racks at --site with room for a device of that height; with --offline from the cached occupancy)" + RESET)
+    print(BOLD + WHITE + "            --status <status>, --role <slug>, --tag <slug>, --tenant <slug>, --rack <id> (get_devices/update_age: filters applied by NetBox, also with --backend graphql on NetBox 4.0-4.2; default status active)" + RESET)
+    print(BOLD + WHITE + "            --listen <host:port>, --debounce <seconds>, --webhook-secret <secret> (serve: webhook endpoint, quiet period before rewriting, signature check)" + RESET)
+    print(BOLD + WHITE + "            --batch-size <n> (update_age: devices per bulk PATCH request)" + RESET)
+    print(BOLD + WHITE + "            --write-workers <n>, --write-rate <req/s>, --journal <path>, --resume, --dry-run (update_age: concurrent throttled writes, checkpoint and resume, plan only)" + RESET)
+    print(BOLD + WHITE + "            --instance <name>, --instance-timeout <seconds> (NETBOX_INSTANCES: run on these instances only; leave out instances slower than this)" + RESET)
+    print(BOLD + WHITE + "            --workers <n>, --page-size <n> (all listings: concurrent page requests and objects per page)" + RESET)
+    print(BOLD + WHITE + "            --offline/--from-cache, --snapshot <path> (get_devices/get_racks/rack_occupancy: render from the local snapshot without the API)" + RESET)
+    print(BOLD + WHITE + "            --backend rest|raw|graphql (get_devices: fetch devices through the REST API as pynetbox records or as plain JSON, or with a GraphQL query of only the exported columns)" + RESET)
+    print(BOLD + WHITE + "            --no-prefetch (get_devices/get_racks: resolve related objects per device instead of prefetched lookup tables)" + RESET)
+    print(BOLD + WHITE + "            --xlsx-writer stream|memory (get_devices/get_racks: constant-memory or in-memory workbooks)" + RESET)
+    print(BOLD + WHITE + "            --retries <n>, --backoff <seconds>, --timeout <seconds> (retry, backoff and read timeout of every HTTP request)" + RESET)
+    print(BOLD + WHITE + "            --format xlsx|parquet|arrow|ndjson (get_devices/get_racks: output format; ndjson is written to stdout)" + RESET)
+    print(BOLD + WHITE + "            --delta csv|xlsx|json, --delta-state <path> (get_devices: save only the devices changed since the previous export)" + RESET)
+    print(BOLD + WHITE + "            --transform stream|rows|columnar (get_devices: streamed records with bounded memory (default), per-device report building, or a pandas DataFrame)" + RESET)
+    print(BOLD + WHITE + "            --sink csv|xlsx|json|sqlite|parquet|arrow|ndjson (get_devices: repeatable outputs written in one streamed pass)" + RESET)
+    print(BOLD + WHITE + "            --log-level DEBUG|INFO|WARNING|ERROR, --progress-every <n> (netbox_api.log detail and progress summary interval)" + RESET)
+    print(BOLD + WHITE + "            --profile, --profile-trace <file.json>, --profile-cprofile <file.prof> (phase timings and HTTP stats; trace or cProfile dump)" + RESET)
     print(UNDERLINE + BG_CYAN + "................................................" + RESET)
     print()
     
@@ -574,34 +1376,420 @@ def show_help():
     
     sys.exit(0)
 
+
+# Log and print how many NetBox API requests the run made, per endpoint
+def report_api_calls(request_counter):
+    for endpoint, count in sorted(request_counter.by_endpoint.items()):
+        logger.info("API calls %s: %d", endpoint, count)
+    message = f"NetBox API calls this run: {request_counter.total}"
+    logger.info(message)
+    print(BOLD + BG_CYAN + WHITE + message + RESET)
+
+
+# Log the phase timings and HTTP stats of every run; print them as a table with --profile
+def report_profile(request_counter, show=False, trace_path=None):
+    lines = profile_lines(request_counter)
+    for line in lines:
+        logger.info("Profile: %s", line)
+    if show:
+        print()
+        for line in lines:
+            print(BOLD + WHITE + line + RESET)
+    if trace_path:
+        write_trace(trace_path, request_counter)
+        logger.info("Profile trace written to %s", trace_path)
+        print(BOLD + BG_CYAN + WHITE + f"Profile trace written to {trace_path}" + RESET)
+
+
+# Subcommands (canonical names) that talk to NetBox and therefore run the config/health check first
+NETBOX_COMMANDS = ("get_devices", "update_age", "get_racks", "rack_occupancy", "sync", "serve")
+
+
+# Subcommands that don't list or write NetBox objects. validate_config checks every configured
+# instance when config.py has NETBOX_INSTANCES.
+def run_local_command(function_name, session, instances=None):
+    if function_name == "joke":
+        joke(session)
+    elif function_name == "validate_config":
+        if instances:
+            validate_instances(instances, session)
+        else:
+            validate_config(session)
+    elif function_name == "--help":
+        show_help()
+    else:
+        logger.error(f"Function '{function_name}' not recognized.")
+
+
+# Shared inventory of a multi-command run: devices are listed once for update_age, get_devices,
+# get_racks and rack_occupancy, racks once for get_racks and rack_occupancy
+def plan_inventory(nb, commands, options, device_filters, snapshot=None):
+    inventory = SharedInventory(options.workers, options.page_size, snapshot)
+    site_filters = {"site": [options.site]} if options.site else {}
+    if "update_age" in commands or ("get_devices" in commands and options.backend != "graphql"):
+        inventory.plan(nb.dcim.devices, device_filters)
+    if "get_racks" in commands or "rack_occupancy" in commands:
+        inventory.plan(nb.dcim.racks, site_filters)
+    if ("get_racks" in commands and (options.rack_fetch == "bulk" or snapshot is not None)) or (snapshot is None and "rack_occupancy" in commands):
+        inventory.plan(nb.dcim.devices, site_filters)
+    return inventory
+
+
+# Several NetBox instances: each one runs its share of the steps on its own thread and session
+# (update_age writes, the listings for the exports), then the device and rack reports are written
+# once, merged with an Instance column. Instances that fail or miss the deadline are left out.
+def run_federation(commands, instances, options, device_filters, data_stream=None):
+    transform = 'stream' if options.sink else resolve_transform(options.transform, options.xlsx_writer)
+    statuses = device_filters.get("status") if transform == 'columnar' else None
+    graphql_export = options.backend == "graphql"
+
+    def instance_steps(instance):
+        check_api_server(instance.url, instance.token, instance.session, exit_on_error=False, name=instance.name)
+        lookups = None
+        if options.prefetch and ("get_racks" in commands or ("get_devices" in commands and not graphql_export)):
+            lookups = prefetch_lookups(instance.nb, options.workers, options.page_size)
+        inventory = plan_inventory(instance.nb, commands, options, device_filters) if len(commands) > 1 else None
+        collected = {}
+        for command in commands:
+            if command == "update_age":
+                collected[command] = update_age(instance.nb.dcim.devices, device_filters, options.batch_size, options.progress_every, options.workers, options.page_size,
+                                                options.write_workers, options.write_rate, instance_path(options.journal, instance.name), options.resume, options.dry_run, inventory,
+                                                instance_path(UPDATE_PLAN_PATH, instance.name), banner=False)
+            elif command == "get_devices" and graphql_export:
+                collected[command] = list(graphql_device_listing(instance.session, instance.url, instance.token, options.page_size, device_filters, statuses))
+            elif command == "get_devices" and options.backend == "raw":
+                raw_devices = fetch_listing(instance.nb.dcim.devices, None, options.workers, options.page_size, filters=device_filters, inventory=inventory, raw=True)
+                collected[command] = list(raw_export_values(raw_devices, lookups))
+            elif command == "get_devices":
+                nb_devicelist = fetch_listing(instance.nb.dcim.devices, None, options.workers, options.page_size, filters=device_filters, inventory=inventory)
+                collected[command] = list(record_device_values(nb_devicelist, lookups))
+            elif command == "get_racks":
+                collected[command] = collect_rack_details(instance.nb, options.site, options.rack_fetch, options.workers, options.page_size,
+                                                          lookups=lookups, progress_every=options.progress_every, inventory=inventory)
+        return collected
+
+    message = f"Running {' + '.join(commands)} on {len(instances)} NetBox instances: {', '.join(instance.name for instance in instances)}"
+    logger.info(message)
+    print(BOLD + BG_CYAN + WHITE + message + RESET)
+    if "update_age" in commands:
+        print_update_age_banner()
+    # The instances work on their own threads; the wait is what the main thread spends fetching
+    with timed_phase("fetch"):
+        results, failures = run_on_instances(instances, instance_steps, options.instance_timeout)
+    for instance, reason in failures:
+        logger.error("NetBox instance %s left out of this run: %s", instance.name, reason)
+        print(BOLD + BG_RED + WHITE + f"❌  NetBox instance {instance.name} left out of this run: {reason}" + RESET)
+    if not results:
+        logger.error("No NetBox instance returned results.")
+        print(RED + "No NetBox instance returned results." + RESET)
+        sys.exit(1)
+
+    for instance, collected in results:
+        if "update_age" in collected:
+            print(BOLD + BG_CYAN + BLACK + f"{instance.name}: {collected['update_age']}" + RESET)
+    if "get_devices" in commands:
+        device_results = [(instance, collected["get_devices"]) for instance, collected in results]
+        merged_headers = [INSTANCE_HEADER] + headers
+        delta = DeltaTracker(options.delta_state, merged_headers) if options.delta else None
+        get_devices(merged_device_values(device_results), merged_headers, options.output_mode, options.xlsx_writer, sum(len(values) for _, values in device_results),
+                    options.progress_every, transform, statuses, options.format, data_stream, delta, options.sink)
+        if delta is not None:
+            report_device_delta(delta, options.delta, options.output_mode)
+    if "get_racks" in commands:
+        print_rack_banner()
+        write_rack_details(merged_racks([(instance, collected["get_racks"]) for instance, collected in results]),
+                           options.xlsx_writer, options.format, data_stream, options.shard_by, options.processes)
+
+    for instance, collected in results:
+        counts = []
+        if "get_devices" in collected:
+            counts.append(f"{len(collected['get_devices'])} devices")
+        if "get_racks" in collected:
+            counts.append(f"{len(collected['get_racks'])} racks")
+        message = f"✅  {instance.name}: " + (", ".join(counts) or "done")
+        logger.info(message)
+        print(BOLD + BG_GREEN + WHITE + message + RESET)
+    if failures:
+        message = f"{len(failures)} of {len(instances)} NetBox instances failed: {', '.join(instance.name for instance, _ in failures)}"
+        logger.warning(message)
+        print(BOLD + BG_YELLOW + BLACK + message + RESET)
+        # An age update that stopped on an instance has to be resumed there
+        if "update_age" in commands:
+            sys.exit(1)
+
+
+# Parse the optional --flags that follow the function name
+def parse_options(argv):
+    parser = argparse.ArgumentParser(prog="netbox_api.py <function_name> [<function_name> ...]", add_help=False)
+    parser.add_argument("--output-mode", choices=OUTPUT_MODES, default="truncate",
+                        help="truncate: overwrite output.csv/output.xlsx; timestamp: write to a new timestamped file")
+    parser.add_argument("--site", default=None,
+                        help="Only fetch racks and devices for this site slug")
+    parser.add_argument("--status", action="append", default=None,
+                        help="Device status to fetch, repeatable (default: active; 'any' for every status)")
+    parser.add_argument("--role", action="append", default=None, help="Device role slug, repeatable")
+    parser.add_argument("--tag", action="append", default=None, help="Tag slug; repeat to require several tags")
+    parser.add_argument("--tenant", action="append", default=None, help="Tenant slug, repeatable")
+    parser.add_argument("--rack", action="append", type=int, default=None, help="Rack ID, repeatable")
+    parser.add_argument("--rack-fetch", choices=RACK_FETCH_MODES, default="bulk",
+                        help="bulk: one device listing grouped by rack; per-rack: one device query per rack")
+    parser.add_argument("--shard-by", choices=SHARD_KEYS, default="none",
+                        help="get_racks: one workbook per site/location/tenant under rack_details/, plus an index workbook and manifest")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Worker processes rendering the rack shards (default: one per CPU core)")
+    parser.add_argument("--fit", type=int, default=None, metavar="UNITS",
+                        help="rack_occupancy: list the racks (at --site) with a free block of this many U")
+    parser.add_argument("--listen", default=DEFAULT_LISTEN, metavar="HOST:PORT",
+                        help="serve: address of the webhook endpoint")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE,
+                        help="serve: seconds without webhook events before the exports are rewritten")
+    parser.add_argument("--webhook-secret", default=os.environ.get("NETBOX_WEBHOOK_SECRET"),
+                        help="serve: secret of the NetBox webhook; requests without a matching X-Hook-Signature are rejected")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Devices per bulk PATCH request (update_age)")
+    parser.add_argument("--write-workers", type=int, default=DEFAULT_WRITE_WORKERS,
+                        help="Concurrent bulk PATCH requests (update_age)")
+    parser.add_argument("--write-rate", type=float, default=DEFAULT_WRITE_RATE,
+                        help="Maximum PATCH requests per second across all write workers; 0 for no limit (update_age)")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL_PATH,
+                        help="Checkpoint file of written devices (update_age)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the update_age run recorded in --journal instead of starting over")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="update_age: save the planned age changes to update_age_plan.csv without writing to NetBox")
+    parser.add_argument("--instance", action="append", default=None, metavar="NAME",
+                        help="NetBox instance from NETBOX_INSTANCES in config.py, repeatable (default: every configured instance)")
+    parser.add_argument("--instance-timeout", type=float, default=None, metavar="SECONDS",
+                        help="With several instances: leave out the ones that haven't finished after this many seconds")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Concurrent page requests per listing")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help="Objects requested per page (capped by the server's MAX_PAGE_SIZE)")
+    parser.add_argument("--offline", "--from-cache", dest="offline", action="store_true",
+                        help="Render get_devices/get_racks from the local snapshot without touching the API")
+    parser.add_argument("--snapshot", default=DEFAULT_SNAPSHOT_PATH,
+                        help="Path of the local SQLite inventory snapshot (sync, --offline)")
+    parser.add_argument("--backend", choices=("rest", "raw", "graphql"), default="rest",
+                        help="How get_devices fetches devices: REST listing as pynetbox records, REST listing read as plain JSON, or a GraphQL query selecting only the exported columns")
+    parser.add_argument("--no-prefetch", dest="prefetch", action="store_false",
+                        help="Resolve device types, manufacturers, roles and platforms per device instead of prefetching lookup tables")
+    parser.add_argument("--xlsx-writer", choices=XLSX_WRITERS, default="stream",
+                        help="stream: constant-memory write-only workbooks; memory: build the whole workbook in memory")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                        help="Retries for connection errors and 429/5xx responses (Retry-After is honoured)")
+    parser.add_argument("--backoff", type=float, default=DEFAULT_BACKOFF,
+                        help="Backoff factor in seconds; retry n waits a random time up to backoff * 2^(n-1)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="Read timeout in seconds for every HTTP request")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="xlsx",
+                        help="xlsx: CSV + styled XLSX; parquet/arrow: typed columnar files; ndjson: JSON lines on stdout")
+    parser.add_argument("--delta", choices=DELTA_FORMATS, default=None,
+                        help="get_devices: also save the devices added, removed or modified since the previous export as output_delta.<format>")
+    parser.add_argument("--delta-state", default=DEFAULT_DELTA_STATE,
+                        help="Keyed snapshot of the previous export that --delta compares against")
+    parser.add_argument("--transform", choices=TRANSFORMS, default="stream",
+                        help="stream (default): record pipeline with memory bounded by the page size; rows: one dict per device; columnar: build the report as a pandas DataFrame (holds the whole fleet)")
+    parser.add_argument("--sink", action="append", choices=SINK_NAMES, default=None,
+                        help="get_devices: output of the stream transform, repeatable (default: csv and xlsx, or the --format); implies --transform stream")
+    parser.add_argument("--log-level", choices=LOG_LEVELS, default="INFO",
+                        help="Level written to netbox_api.log; DEBUG adds one line per device")
+    parser.add_argument("--progress-every", type=int, default=DEFAULT_PROGRESS_EVERY,
+                        help="Log a progress summary (count, rate, ETA) every N devices or racks")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print per-phase timings and per-endpoint HTTP stats at the end of the run")
+    parser.add_argument("--profile-trace", default=None,
+                        help="Write a Chrome trace-event JSON of every HTTP request and the phase totals (implies --profile)")
+    parser.add_argument("--profile-cprofile", default=None,
+                        help="Run under cProfile and dump the stats to this file (implies --profile)")
+    return parser.parse_args(argv)
+
 	
 def main():
+    snapshot = None
+    profiler = None
+    stdout = sys.stdout
     try:
-        # Validate config.py
-        validate_config()
-
-        # Set up NetBox API connection
-        nb = pynetbox.api(NETBOX_URL, NETBOX_TOKEN)
-        
         if len(sys.argv) < 2:
             show_help()
 
-        function_name = sys.argv[1]
-
-        if function_name == "get_devices" or function_name == "-d":
-            get_devices(nb_devicelist, headers)
-        elif function_name == "update_age" or function_name == "-a":
-            update_age(nb_devicelist)
-        elif function_name == "get_racks" or function_name == "-r":
-             get_rack_details_with_devices(nb)
-        elif function_name == "joke" or function_name == "-j":
-            joke()
-        elif function_name == "validate_config" or function_name == "-v":
-            validate_config()
-        elif function_name == "--help" or function_name == "-h":
-            show_help()
-        else:
-            logger.error(f"Function '{function_name}' not recognized.")
+        # Several subcommands can be given at once, e.g. -a -d -r; options follow them
+        commands, option_args = split_commands(sys.argv[1:])
+        options = parse_options(option_args)
+        logger.setLevel(options.log_level)
+
+        # NDJSON rows own stdout so they can be piped; banners and messages go to stderr
+        data_stream = stdout
+        ndjson_output = options.format == "ndjson" or "ndjson" in (options.sink or [])
+        if ndjson_output:
+            sys.stdout = sys.stderr
+        options.profile = options.profile or bool(options.profile_trace or options.profile_cprofile)
+        if options.profile_cprofile:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        if options.offline and options.backend == "graphql":
+            logger.error("--backend graphql can't be combined with --offline.")
+            print(RED + "--backend graphql can't be combined with --offline." + RESET)
+            sys.exit(1)
+        # The raw backend reads related names from the lookup tables only
+        if options.backend == "raw" and not options.prefetch:
+            logger.warning("--backend raw needs the prefetched lookup tables; using --backend rest with --no-prefetch.")
+            print(YELLOW + "--backend raw needs the prefetched lookup tables; using --backend rest with --no-prefetch." + RESET)
+            options.backend = "rest"
+
+        if "serve" in commands and len(commands) > 1:
+            logger.error("serve runs until stopped and can't be combined with other functions.")
+            print(RED + "serve runs until stopped and can't be combined with other functions." + RESET)
+            sys.exit(1)
+
+        # NetBox instances from NETBOX_INSTANCES (none when config.py holds a single NETBOX_URL).
+        # One chosen instance runs like a single-server config; several are federated.
+        if options.instance and not NETBOX_INSTANCES:
+            logger.error("--instance needs NETBOX_INSTANCES in config.py.")
+            print(RED + "--instance needs NETBOX_INSTANCES in config.py." + RESET)
+            sys.exit(1)
+        try:
+            instances = select_instances(configured_instances(NETBOX_INSTANCES), options.instance)
+        except ValueError as error:
+            logger.error("%s", error)
+            print(RED + str(error) + RESET)
+            sys.exit(1)
+        federated = len(instances) > 1 and any(command in NETBOX_COMMANDS for command in commands)
+        if federated:
+            single = [command for command in commands if command in NETBOX_COMMANDS and command not in FEDERATED_COMMANDS]
+            if single or options.offline:
+                message = f"{', '.join(single) or '--offline'} works on one NetBox instance; choose it with --instance NAME."
+                logger.error(message)
+                print(RED + message + RESET)
+                sys.exit(1)
+        netbox_url, netbox_token = (instances[0].url, instances[0].token) if len(instances) == 1 else (NETBOX_URL, NETBOX_TOKEN)
+
+        if options.offline:
+            # Offline runs read the local snapshot and never contact the API
+            if any(command not in ("get_devices", "get_racks", "rack_occupancy") for command in commands):
+                logger.error("--offline only applies to get_devices, get_racks and rack_occupancy.")
+                print(RED + "--offline only applies to get_devices, get_racks and rack_occupancy." + RESET)
+                sys.exit(1)
+            snapshot = open_offline_snapshot(options.snapshot)
+            if snapshot is None:
+                logger.error("No synced snapshot found at %s. Run 'python netbox_api.py sync' first.", options.snapshot)
+                print(RED + f"No synced snapshot found at {options.snapshot}. Run 'python netbox_api.py sync' first." + RESET)
+                sys.exit(1)
+
+        # One pooled session with retries and timeouts carries every HTTP request of the run.
+        # A multi-command run lists devices and racks side by side, so it gets twice the connections.
+        pool_size = max(options.workers, options.write_workers) * (2 if len(commands) > 1 else 1)
+        session = make_session(pool_size, options.retries, options.backoff, options.timeout)
+
+        # Device filters (active only by default) are pushed to NetBox as query parameters
+        device_filters = build_device_filters(options.status, options.site, options.role, options.tag, options.tenant, options.rack)
+
+        if federated:
+            # Every instance gets a pool of its own; one counter times the requests of all of them
+            request_counter = RequestCounter(record_events=bool(options.profile_trace))
+            for instance in instances:
+                instance.session = make_session(pool_size, options.retries, options.backoff, options.timeout)
+                count_requests(instance.session, counter=request_counter)
+                instance.nb = connect_netbox(instance.session, instance.url, instance.token)
+            run_federation(commands, instances, options, device_filters, data_stream)
+            for command in commands:
+                if command not in NETBOX_COMMANDS:
+                    run_local_command(command, session, instances)
+            report_api_calls(request_counter)
+            report_profile(request_counter, options.profile, options.profile_trace)
+            return
+
+        # Set up NetBox API connection (no network I/O until a listing is fetched). Every request
+        # on its session, including the health check, is counted and timed.
+        nb = None
+        request_counter = None
+        if any(command in NETBOX_COMMANDS for command in commands):
+            nb = connect_netbox(session, netbox_url, netbox_token)
+            request_counter = count_requests(session, record_events=bool(options.profile_trace))
+            if instances and not options.offline:
+                check_api_server(netbox_url, netbox_token, session, name=instances[0].name)
+            elif not options.offline:
+                # Validate config.py
+                validate_config(session)
+
+        # Device types, manufacturers, roles and platforms are loaded once up front for the exports
+        # (the GraphQL backend selects related names in its query and doesn't need them)
+        lookups = None
+        graphql_export = options.backend == "graphql"
+        needs_lookups = "get_racks" in commands or "serve" in commands or ("get_devices" in commands and not graphql_export)
+        if options.prefetch and needs_lookups:
+            with timed_phase("fetch"):
+                lookups = prefetch_lookups(nb, options.workers, options.page_size, snapshot)
+
+        # Several steps share one fetch of each listing
+        inventory = None
+        if len(commands) > 1 and nb is not None:
+            inventory = plan_inventory(nb, commands, options, device_filters, snapshot)
+
+        def run_step(function_name):
+            if function_name == "get_devices":
+                device_total = None
+                # --sink selects outputs of the record pipeline
+                transform = 'stream' if options.sink else resolve_transform(options.transform, options.xlsx_writer)
+                # The columnar transform filters status on the whole frame; the other filters stay per device
+                statuses = device_filters.get("status") if transform == 'columnar' else None
+                if options.backend == "graphql":
+                    with timed_phase("fetch"):
+                        export_values = graphql_device_listing(session, netbox_url, netbox_token, options.page_size, device_filters, statuses)
+                elif transform == 'stream' and snapshot is None and inventory is None:
+                    # Pages are pulled as the pipeline consumes them, a few ahead, instead of listing every device first
+                    with timed_phase("fetch"):
+                        device_total, raw_devices = stream_raw(nb.dcim.devices, options.workers, options.page_size, **device_filters)
+                    if options.backend == "raw":
+                        export_values = raw_export_values(timed_iter(raw_devices, "fetch"), lookups)
+                    else:
+                        export_values = record_device_values(stream_records(nb.dcim.devices, timed_iter(raw_devices, "fetch")), lookups)
+                elif options.backend == "raw":
+                    with timed_phase("fetch"):
+                        raw_devices = fetch_listing(nb.dcim.devices, None, options.workers, options.page_size, snapshot, device_filters, inventory, raw=True)
+                    export_values = raw_export_values(raw_devices, lookups)
+                    device_total = len(raw_devices)
+                else:
+                    with timed_phase("fetch"):
+                        nb_devicelist = fetch_listing(nb.dcim.devices, None, options.workers, options.page_size, snapshot, device_filters, inventory)
+                    export_values = record_device_values(nb_devicelist, lookups)
+                    device_total = len(nb_devicelist)
+                delta = DeltaTracker(options.delta_state, headers) if options.delta else None
+                get_devices(export_values, headers, options.output_mode, options.xlsx_writer, device_total, options.progress_every, transform, statuses, options.format, data_stream, delta, options.sink)
+                if delta is not None:
+                    report_device_delta(delta, options.delta, options.output_mode)
+            elif function_name == "update_age":
+                update_age(nb.dcim.devices, device_filters, options.batch_size, options.progress_every, options.workers, options.page_size,
+                           options.write_workers, options.write_rate, options.journal, options.resume, options.dry_run, inventory)
+            elif function_name == "get_racks":
+                get_rack_details_with_devices(nb, options.site, options.rack_fetch, options.workers, options.page_size, snapshot, options.xlsx_writer, lookups, options.progress_every,
+                                              options.format, data_stream, options.shard_by, options.processes, inventory)
+            elif function_name == "rack_occupancy":
+                rack_occupancy_report(nb, options.site, options.fit, options.workers, options.page_size, snapshot, lookups, inventory)
+            elif function_name == "serve":
+                serve_inventory(nb, device_filters, options.site, lookups, options.workers, options.page_size, options.shard_by, options.processes,
+                                options.listen, options.debounce, options.webhook_secret)
+            elif function_name == "sync":
+                sync_inventory(nb, options.snapshot, options.workers, options.page_size)
+            else:
+                run_local_command(function_name, session, instances)
+
+        # Consecutive export steps write different files and run side by side, except when they
+        # would share stdout (NDJSON) or the snapshot connection (offline)
+        batches = plan_batches(commands, concurrent=not ndjson_output and snapshot is None)
+        if len(commands) > 1:
+            message = f"Execution plan: {describe_plan(batches)}"
+            logger.info(message)
+            print(BOLD + BG_CYAN + WHITE + message + RESET)
+        for batch in batches:
+            run_batch(batch, run_step, inventory)
+        if inventory is not None:
+            logger.info("Shared inventory: %d listings fetched for %d steps.", inventory.fetches, len(commands))
+
+        if nb is not None:
+            report_api_calls(request_counter)
+        report_profile(request_counter, options.profile, options.profile_trace)
 
     except pynetbox.RequestError as pnb_error:
         logger.error("A pynetbox error occurred: %s", pnb_error)
@@ -609,6 +1797,14 @@ def main():
         logger.error(f"An error occurred: {e}")
     
     finally:
+        sys.stdout = stdout
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(options.profile_cprofile)
+            logger.info("cProfile stats written to %s", options.profile_cprofile)
+            print(BOLD + BG_CYAN + WHITE + f"cProfile stats written to {options.profile_cprofile} (view with: python -m pstats {options.profile_cprofile})" + RESET)
+        if snapshot is not None:
+            snapshot.close()
         # Log a message at the end of the script run
         logger.info("Script completed")
 
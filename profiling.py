@@ -0,0 +1,129 @@
+# Run Profiling Module
+# Times the phases of a run (fetch, transform, CSV write, XLSX write, ...) and renders the
+# --profile summary and JSON trace from the phase totals and the api_metrics request counter.
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+from api_metrics import bucket_labels
+
+# Phases in the order they are reported
+PHASES = ("fetch", "transform", "csv", "xlsx", "export", "write", "sync")
+
+
+# Exclusive wall time per phase. Phases nest: while an inner phase runs the outer one is paused,
+# so a row generator that pulls pages from the API is split into 'transform' and 'fetch' time.
+# Only the main thread is timed; the page fetches of the worker pool show up as the main
+# thread's wait in 'fetch'.
+class PhaseTimer:
+    def __init__(self):
+        self.totals = {}
+        self.started = time.perf_counter()
+        self._stack = []
+        self._mark = None
+        self._thread = threading.main_thread()
+
+    def _charge(self, now):
+        if self._stack:
+            name = self._stack[-1]
+            self.totals[name] = self.totals.get(name, 0.0) + now - self._mark
+        self._mark = now
+
+    def push(self, name):
+        if threading.current_thread() is not self._thread:
+            return
+        self._charge(time.perf_counter())
+        self._stack.append(name)
+
+    def pop(self):
+        if threading.current_thread() is not self._thread:
+            return
+        self._charge(time.perf_counter())
+        self._stack.pop()
+
+
+phase_timer = PhaseTimer()
+
+
+@contextmanager
+def timed_phase(name):
+    phase_timer.push(name)
+    try:
+        yield
+    finally:
+        phase_timer.pop()
+
+
+# Charge the time spent producing each item of an iterable to a phase
+def timed_iter(iterable, name):
+    iterator = iter(iterable)
+    while True:
+        phase_timer.push(name)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            phase_timer.pop()
+        yield item
+
+
+# Phase and HTTP summary lines; the HTTP time is the sum of request latencies (server and
+# network), while transform/csv/xlsx are local CPU and disk time
+def profile_lines(request_counter=None, timer=phase_timer):
+    wall = time.perf_counter() - timer.started
+    lines = [f"Run: {wall:.3f}s wall, {time.process_time():.3f}s CPU"]
+    lines.append(f"{'phase':<12} {'seconds':>10} {'% of run':>9}")
+    for name in sorted(timer.totals, key=lambda name: PHASES.index(name) if name in PHASES else len(PHASES)):
+        seconds = timer.totals[name]
+        lines.append(f"{name:<12} {seconds:>10.3f} {seconds / wall * 100 if wall else 0:>8.1f}%")
+    other = wall - sum(timer.totals.values())
+    lines.append(f"{'other':<12} {other:>10.3f} {other / wall * 100 if wall else 0:>8.1f}%")
+    if request_counter is None or not request_counter.stats:
+        return lines
+
+    totals = request_counter.totals()
+    lines.append(f"HTTP: {totals['requests']} requests, {totals['seconds']:.3f}s summed latency, "
+                 f"{totals['bytes'] / 2**20:.2f} MiB received, {totals['retries']} retries, {totals['errors']} errors")
+    lines.append(f"{'endpoint':<44} {'requests':>9} {'avg ms':>9} {'max ms':>9} {'KiB':>10} {'retries':>8}")
+    for key, stats in sorted(request_counter.stats.items()):
+        lines.append(f"{key:<44} {stats.requests:>9} {stats.seconds / stats.requests * 1000:>9.1f} "
+                     f"{stats.max_seconds * 1000:>9.1f} {stats.bytes / 1024:>10.1f} {stats.retries:>8}")
+    histogram = [0] * len(bucket_labels())
+    for stats in request_counter.stats.values():
+        histogram = [count + added for count, added in zip(histogram, stats.histogram)]
+    lines.append("Latency histogram: " + ", ".join(f"{label} {count}" for label, count in zip(bucket_labels(), histogram) if count))
+    return lines
+
+
+# Chrome trace-event JSON (chrome://tracing, Perfetto): one complete event per HTTP request on
+# the thread that sent it, with the phase totals and per-endpoint stats as metadata
+def write_trace(path, request_counter=None, timer=phase_timer):
+    pid = os.getpid()
+    events = []
+    for event in (request_counter.events or []) if request_counter is not None else []:
+        start = event["end"] - event["seconds"] - timer.started
+        events.append({
+            "name": event["endpoint"],
+            "cat": "http",
+            "ph": "X",
+            "ts": round(start * 1e6),
+            "dur": round(event["seconds"] * 1e6),
+            "pid": pid,
+            "tid": event["thread"],
+            "args": {"status": event["status"], "bytes": event["bytes"], "retries": event["retries"]},
+        })
+    trace = {
+        "traceEvents": events,
+        "displayTimeUnit": "ms",
+        "otherData": {
+            "wall_seconds": round(time.perf_counter() - timer.started, 6),
+            "cpu_seconds": round(time.process_time(), 6),
+            "phases": {name: round(seconds, 6) for name, seconds in timer.totals.items()},
+            "endpoints": {key: stats.as_dict() for key, stats in sorted(request_counter.stats.items())} if request_counter is not None else {},
+        },
+    }
+    with open(path, "w") as trace_file:
+        json.dump(trace, trace_file, indent=1)
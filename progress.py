@@ -0,0 +1,44 @@
+# Progress Reporting Module
+# Hot loops report one summary line every N items (count, rate, ETA) instead of logging each item.
+import time
+
+# Default for --progress-every
+DEFAULT_PROGRESS_EVERY = 1000
+
+
+def format_eta(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+
+class ProgressReporter:
+    def __init__(self, logger, label, total=None, every=DEFAULT_PROGRESS_EVERY):
+        self.logger = logger
+        self.label = label
+        self.total = total
+        self.every = max(1, every)
+        self.count = 0
+        self.started = time.perf_counter()
+        self._next_report = self.every
+
+    def update(self, count=1):
+        self.count += count
+        if self.count >= self._next_report:
+            self._next_report = (self.count // self.every + 1) * self.every
+            self.report()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        rate = self.count / elapsed if elapsed else 0.0
+        if self.total:
+            remaining = (self.total - self.count) / rate if rate else 0.0
+            self.logger.info("Progress: %d/%d %s (%.1f%%), %.1f/s, ETA %s", self.count, self.total, self.label,
+                             self.count / self.total * 100, rate, format_eta(remaining))
+        else:
+            self.logger.info("Progress: %d %s, %.1f/s", self.count, self.label, rate)
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.started
+        rate = self.count / elapsed if elapsed else 0.0
+        self.logger.info("Done: %d %s in %.1fs (%.1f/s)", self.count, self.label, elapsed, rate)
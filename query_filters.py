@@ -0,0 +1,66 @@
+# Query Filter Module
+# Device filters are sent to NetBox as query parameters so the server only returns matching
+# devices. The same filters are applied locally where there is no server to push them to (the
+# offline snapshot), or when the GraphQL backend's server rejects them.
+
+# Default device status filter; "any" disables status filtering
+DEFAULT_DEVICE_STATUS = ["active"]
+
+
+# Build the device listing query parameters from the CLI filter options
+def build_device_filters(status=None, site=None, role=None, tag=None, tenant=None, rack=None):
+    filters = {}
+    statuses = status or DEFAULT_DEVICE_STATUS
+    if "any" not in statuses:
+        filters["status"] = list(statuses)
+    if site:
+        filters["site"] = [site] if isinstance(site, str) else list(site)
+    if role:
+        filters["role"] = list(role)
+    if tag:
+        filters["tag"] = list(tag)
+    if tenant:
+        filters["tenant"] = list(tenant)
+    if rack:
+        filters["rack_id"] = [str(rack_id) for rack_id in rack]
+    return filters
+
+
+def slug(value):
+    return (value or {}).get("slug")
+
+
+# Filterable values of an object as returned by the REST API
+def filter_values(item):
+    return {
+        "status": (item.get("status") or {}).get("value"),
+        "site": slug(item.get("site")),
+        "role": slug(item.get("role") or item.get("device_role")),
+        "tenant": slug(item.get("tenant")),
+        "tag": [tag.get("slug") for tag in item.get("tags") or []],
+        "rack_id": (item.get("rack") or {}).get("id"),
+    }
+
+
+# Filterable values of a device as returned by the GraphQL backend
+def graphql_filter_values(device):
+    rack = device.get("rack") or {}
+    return {
+        "status": (device.get("status") or "").lower(),
+        "site": slug(device.get("site")),
+        "role": slug(device.get("role")),
+        "tenant": slug(device.get("tenant")),
+        "tag": [tag.get("slug") for tag in device.get("tags") or []],
+        "rack_id": rack.get("id"),
+    }
+
+
+# Local equivalent of the NetBox filtering: any listed value matches, except tags which must all be present
+def matches_filters(values, filters):
+    for key, wanted in filters.items():
+        if key == "tag":
+            if not set(wanted).issubset(values["tag"]):
+                return False
+        elif key not in values or values[key] is None or str(values[key]) not in wanted:
+            return False
+    return True
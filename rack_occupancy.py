@@ -0,0 +1,201 @@
+# Rack Occupancy Module
+# Builds a U-slot bitmap per rack face from device positions and device-type heights, and derives
+# utilization, free blocks and overlapping devices from it. Each face is one Python int with
+# bit i set when unit starting_unit + i is taken, so a fit check is a few shifts and ANDs.
+# Positions are rounded down and heights up to whole units; 0U devices take no slots.
+# The occupancy of every rack is also cached in the snapshot database at sync time, so
+# "which racks at site X fit a 4U device" is one indexed SQLite query.
+import json
+import math
+
+# Snapshot table holding the occupancy of every rack
+OCCUPANCY_TABLE = "rack_occupancy"
+
+OCCUPANCY_HEADER = ['Rack', 'Site', 'Height (U)', 'Devices', 'Used (U)', 'Utilization %', 'Largest Free Block (U)', 'Conflicts']
+
+
+class RackOccupancy:
+    def __init__(self, rack_id, name, site, u_height, starting_unit=1):
+        self.rack_id = rack_id
+        self.name = name
+        self.site = site
+        self.u_height = int(u_height or 0)
+        self.starting_unit = int(starting_unit or 1)
+        self.front = 0
+        self.rear = 0
+        self.device_count = 0
+        self.conflicts = []
+        self._placed = []
+
+    @property
+    def full_mask(self):
+        return (1 << self.u_height) - 1
+
+    @property
+    def occupied(self):
+        return self.front | self.rear
+
+    # Mark the units a device takes. Full-depth devices take both faces; a half-depth device
+    # only its own face, so a front and a rear half-depth device can share a unit.
+    # Overlaps with devices already placed, and units outside the rack, are recorded as conflicts.
+    def place(self, name, position, height, face=None, full_depth=True):
+        self.device_count += 1
+        units = math.ceil(height or 0)
+        if not position or units <= 0:
+            return
+        offset = int(position) - self.starting_unit
+        mask = ((1 << units) - 1) << offset if offset >= 0 else ((1 << units) - 1) >> -offset
+        if offset < 0 or offset + units > self.u_height:
+            self.conflicts.append((name, None))
+            mask &= self.full_mask
+        front = full_depth or face != 'rear'
+        rear = full_depth or face == 'rear'
+        taken = (self.front if front else 0) | (self.rear if rear else 0)
+        if mask & taken:
+            for other, other_mask, other_front, other_rear in self._placed:
+                if other_mask & mask and ((front and other_front) or (rear and other_rear)):
+                    self.conflicts.append((name, other))
+        if front:
+            self.front |= mask
+        if rear:
+            self.rear |= mask
+        self._placed.append((name, mask, front, rear))
+
+    @property
+    def used_units(self):
+        return bin(self.occupied).count('1')
+
+    @property
+    def utilization(self):
+        return self.used_units / self.u_height * 100 if self.u_height else 0.0
+
+    # Runs of free units as (first unit, length), bottom of the rack first
+    def free_blocks(self):
+        return free_blocks(self.occupied, self.u_height, self.starting_unit)
+
+    @property
+    def largest_free_block(self):
+        return max((length for _, length in self.free_blocks()), default=0)
+
+    # Lowest unit where a full-depth device of `units` U fits, or None
+    def first_fit(self, units):
+        return first_fit(self.occupied, self.u_height, self.starting_unit, units)
+
+
+def free_blocks(occupied, u_height, starting_unit=1):
+    blocks = []
+    start = None
+    for index in range(u_height):
+        if occupied >> index & 1:
+            if start is not None:
+                blocks.append((starting_unit + start, index - start))
+                start = None
+        elif start is None:
+            start = index
+    if start is not None:
+        blocks.append((starting_unit + start, u_height - start))
+    return blocks
+
+
+def first_fit(occupied, u_height, starting_unit, units):
+    if units <= 0 or units > u_height:
+        return None
+    window = (1 << units) - 1
+    for index in range(u_height - units + 1):
+        if not occupied & (window << index):
+            return starting_unit + index
+    return None
+
+
+def nested_value(item, name, key):
+    nested = item.get(name)
+    if isinstance(nested, dict):
+        return nested.get(key)
+    return nested
+
+
+# Occupancy of every rack from raw API/snapshot dicts (racks, devices, device types keyed by ID),
+# in rack order
+def build_occupancy(racks, devices, device_types):
+    occupancy = {}
+    for rack in racks:
+        occupancy[rack['id']] = RackOccupancy(rack['id'], rack['name'], nested_value(rack, 'site', 'slug'),
+                                              rack.get('u_height'), rack.get('starting_unit'))
+    for device in devices:
+        rack = occupancy.get(nested_value(device, 'rack', 'id'))
+        if rack is None:
+            continue
+        device_type = device_types.get(nested_value(device, 'device_type', 'id'), {})
+        rack.place(device.get('name'), device.get('position'), device_type.get('u_height', 1),
+                   nested_value(device, 'face', 'value'), device_type.get('is_full_depth', True))
+    return list(occupancy.values())
+
+
+# Racks with room for a full-depth device of `units` U, as (rack, first free unit)
+def racks_that_fit(occupancy, units, site=None):
+    fits = []
+    for rack in occupancy:
+        if site and rack.site != site:
+            continue
+        position = rack.first_fit(units)
+        if position is not None:
+            fits.append((rack, position))
+    return fits
+
+
+def occupancy_row(rack):
+    return {
+        'Rack': rack.name,
+        'Site': rack.site,
+        'Height (U)': rack.u_height,
+        'Devices': rack.device_count,
+        'Used (U)': rack.used_units,
+        'Utilization %': f"{rack.utilization:.1f}",
+        'Largest Free Block (U)': rack.largest_free_block,
+        'Conflicts': '; '.join(f"{name} overlaps {other}" if other else f"{name} outside rack" for name, other in rack.conflicts),
+    }
+
+
+# Snapshot cache. The bitmaps are stored as hex text because racks can be taller than 63U.
+def create_occupancy_table(conn):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {OCCUPANCY_TABLE} (rack_id INTEGER PRIMARY KEY, name TEXT, site TEXT, "
+                 "u_height INTEGER, starting_unit INTEGER, front TEXT, rear TEXT, device_count INTEGER, "
+                 "largest_free INTEGER, conflicts TEXT)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {OCCUPANCY_TABLE}_site_free ON {OCCUPANCY_TABLE} (site, largest_free)")
+
+
+# Rebuild the cached occupancy from the racks, devices and device types stored in the snapshot
+def refresh_occupancy(conn):
+    racks = [json.loads(data) for (data,) in conn.execute("SELECT data FROM racks ORDER BY id")]
+    devices = [json.loads(data) for (data,) in conn.execute("SELECT data FROM devices ORDER BY id")]
+    device_types = {item['id']: item for item in (json.loads(data) for (data,) in conn.execute("SELECT data FROM device_types"))}
+    occupancy = build_occupancy(racks, devices, device_types)
+
+    create_occupancy_table(conn)
+    conn.execute(f"DELETE FROM {OCCUPANCY_TABLE}")
+    conn.executemany(
+        f"INSERT INTO {OCCUPANCY_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(rack.rack_id, rack.name, rack.site, rack.u_height, rack.starting_unit, format(rack.front, 'x'), format(rack.rear, 'x'),
+          rack.device_count, rack.largest_free_block, json.dumps(rack.conflicts)) for rack in occupancy],
+    )
+    conn.commit()
+    return len(occupancy)
+
+
+# Cached occupancy, optionally only the racks of a site whose largest free block holds min_free units
+def load_occupancy(conn, site=None, min_free=0):
+    create_occupancy_table(conn)
+    query = f"SELECT rack_id, name, site, u_height, starting_unit, front, rear, device_count, conflicts FROM {OCCUPANCY_TABLE} WHERE largest_free >= ?"
+    parameters = [min_free]
+    if site:
+        query += " AND site = ?"
+        parameters.append(site)
+    occupancy = []
+    for rack_id, name, rack_site, u_height, starting_unit, front, rear, device_count, conflicts in conn.execute(query + " ORDER BY rack_id", parameters):
+        rack = RackOccupancy(rack_id, name, rack_site, u_height, starting_unit)
+        rack.front = int(front, 16)
+        rack.rear = int(rear, 16)
+        rack.device_count = device_count
+        rack.conflicts = [tuple(conflict) for conflict in json.loads(conflicts)]
+        occupancy.append(rack)
+    return occupancy
@@ -0,0 +1,176 @@
+# Rack Shard Module
+# Splits the rack report into one workbook per site (or location, or tenant) and renders the
+# workbooks in a process pool, so generation runs on as many cores as there are shards.
+# An index workbook and a JSON manifest link every rack to its shard file and sheet.
+import os
+import re
+import json
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from exporters import RACK_CELL_STYLE, RACK_HEADER_STYLE, add_named_styles, add_write_only_table, make_table, sheet_titles, stream_rack_workbook, styled_row
+
+# --shard-by choices; 'none' writes the single rack_details_with_devices.xlsx, 'instance'
+# splits a multi-instance report by NetBox instance
+SHARD_KEYS = ('none', 'site', 'location', 'tenant', 'instance')
+
+SHARD_DIRECTORY = 'rack_details'
+INDEX_PATH = 'rack_details_index.xlsx'
+MANIFEST_PATH = 'rack_details_manifest.json'
+
+# Shard of racks without a value for the key (no location, no tenant)
+UNASSIGNED_SHARD = 'unassigned'
+
+INDEX_HEADER = ['Shard', 'Rack', 'Site', 'Location', 'Devices', 'Workbook', 'Sheet']
+
+
+def default_processes():
+    return os.cpu_count() or 1
+
+
+# Start method of the shard pool. The callers run other threads (the concurrent steps of a
+# multi-command run, the serve daemon's HTTP server, debouncer and log listener), and a forked
+# child can inherit a lock one of them held and hang. forkserver forks the workers from a
+# single-threaded server process; spawn starts fresh interpreters where it isn't available.
+def pool_context():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+# Sheet name of a rack; in a merged multi-instance report it leads with the instance, since
+# rack names repeat across instances
+def rack_sheet_name(rack_info):
+    instance = rack_info.get('instance')
+    return f"{instance} {rack_info['name']}" if instance else rack_info['name']
+
+
+# Group (rack_info, rows) entries by the value of the shard key, shards in name order
+def partition_racks(entries, key):
+    shards = {}
+    for rack_info, rows in entries:
+        shards.setdefault(str(rack_info.get(key) or UNASSIGNED_SHARD), []).append((rack_info, rows))
+    return dict(sorted(shards.items()))
+
+
+# File name for a shard value: lower-case, safe characters only, unique within the run
+def shard_file_name(value, used):
+    base = re.sub(r'[^a-z0-9_.-]+', '-', value.lower()).strip('-.') or UNASSIGNED_SHARD
+    name = base
+    suffix = 1
+    while name in used:
+        suffix += 1
+        name = f"{base}-{suffix}"
+    used.add(name)
+    return name + '.xlsx'
+
+
+# Process pool task: write one shard workbook, return its sheet titles. Takes plain lists only.
+# The worker still imports the calling script as __mp_main__ first; netbox_api skips its log
+# listener and config.py there, and the imports cost about 0.2 s once per worker.
+def render_shard(path, header, sheets):
+    return stream_rack_workbook(((name, header, rows) for name, rows in sheets), path)
+
+
+# Delete the shard workbooks of the previous run (listed in its manifest) that are not in `keep`,
+# so a change of --shard-by or a site without racks doesn't leave stale workbooks behind
+def remove_previous_shards(manifest_path=MANIFEST_PATH, keep=()):
+    try:
+        with open(manifest_path) as manifest_file:
+            previous = json.load(manifest_file)
+    except (OSError, ValueError):
+        return 0
+    removed = 0
+    for shard in previous.get('shards', []):
+        if shard['path'] in keep:
+            continue
+        try:
+            os.remove(shard['path'])
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+# Render every shard (or only the shard values in `only`) with up to `processes` worker processes
+# and return the manifest of all shards. The largest shards are submitted first so one big site
+# doesn't finish last on its own.
+def write_rack_shards(entries, key, header, processes=None, directory=SHARD_DIRECTORY, only=None):
+    processes = max(1, processes or default_processes())
+    os.makedirs(directory, exist_ok=True)
+    shards = partition_racks(entries, key)
+    used = set()
+    paths = {value: os.path.join(directory, shard_file_name(value, used)) for value in shards}
+
+    def task(value):
+        return paths[value], header, [(rack_sheet_name(rack_info), rows) for rack_info, rows in shards[value]]
+
+    order = sorted(shards, key=lambda value: sum(len(rows) for _, rows in shards[value]), reverse=True)
+    titles = {value: sheet_titles(rack_sheet_name(rack_info) for rack_info, _ in shards[value]) for value in order if only is not None and value not in only}
+    order = [value for value in order if value not in titles]
+    if processes == 1 or len(order) <= 1:
+        titles.update({value: render_shard(*task(value)) for value in order})
+    else:
+        with ProcessPoolExecutor(max_workers=min(processes, len(order)), mp_context=pool_context()) as pool:
+            futures = {value: pool.submit(render_shard, *task(value)) for value in order}
+            titles.update({value: future.result() for value, future in futures.items()})
+
+    manifest = {
+        'generated': datetime.now().isoformat(timespec='seconds'),
+        'shard_by': key,
+        'shards': [],
+    }
+    for value, shard in shards.items():
+        manifest['shards'].append({
+            'key': value,
+            'path': paths[value],
+            'racks': len(shard),
+            'devices': sum(len(rows) for _, rows in shard),
+            'sheets': [
+                {
+                    'sheet': title,
+                    'rack': rack_info['name'],
+                    'rack_id': rack_info['id'],
+                    'site': rack_info['site'],
+                    'location': rack_info['location'],
+                    'devices': len(rows),
+                }
+                for title, (rack_info, rows) in zip(titles[value], shard)
+            ],
+        })
+    return manifest
+
+
+def write_manifest(manifest, path=MANIFEST_PATH):
+    with open(path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+
+# Index workbook: one row per rack, with a link that opens the rack's sheet in its shard workbook
+def write_index_workbook(manifest, path=INDEX_PATH):
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+
+    wb = openpyxl.Workbook(write_only=True)
+    add_named_styles(wb)
+    ws = wb.create_sheet(title='Index')
+    for index, width in enumerate((20, 24, 20, 20, 9, 36, 24), 1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+
+    ws.append(styled_row(ws, INDEX_HEADER, RACK_HEADER_STYLE))
+    row_count = 0
+    for shard in manifest['shards']:
+        for sheet in shard['sheets']:
+            row = styled_row(ws, [shard['key'], sheet['rack'], sheet['site'], sheet['location'], sheet['devices']], RACK_CELL_STYLE)
+            link = WriteOnlyCell(ws, value=shard['path'])
+            quoted = sheet['sheet'].replace("'", "''")
+            link.hyperlink = f"{shard['path']}#'{quoted}'!A1"
+            link.style = 'Hyperlink'
+            row.extend([link, WriteOnlyCell(ws, value=sheet['sheet'])])
+            ws.append(row)
+            row_count += 1
+    add_write_only_table(ws, make_table('RackIndex', INDEX_HEADER, row_count))
+    wb.save(path)
+    return row_count
@@ -0,0 +1,48 @@
+# Raw REST Backend Module
+# get_devices --backend raw: the REST listing pages are decoded into plain dicts (with orjson when
+# it is installed) and the export values are read straight from them. The rest backend builds a
+# pynetbox Record for every device and for each object nested in it (site, rack, status,
+# device_type, primary_ip, ...) only to turn them back into strings; here they stay dicts and are
+# rendered the way str() renders those records, so both backends export the same bytes.
+from lookup_tables import resolve_device
+
+
+# str() of a nested pynetbox record: its name, else its label, else its display ('' without any);
+# 'None' when the field is null
+def record_str(value):
+    if isinstance(value, dict):
+        return value.get("name") or value.get("label") or value.get("display") or ""
+    return str(value)
+
+
+# str() of an IP address record, which renders as the address
+def address_str(value):
+    if isinstance(value, dict):
+        return str(value.get("address"))
+    return str(value)
+
+
+# Render one device dict into the values netbox_api.device_values gives for the same device's
+# record. Related names come from the prefetched lookup tables, so they are required here.
+def raw_device_values(device, lookups):
+    resolved = resolve_device(device, lookups)
+    return {
+        "name": record_str(device),
+        "status": record_str(device.get("status")),
+        "site": record_str(device.get("site")),
+        "rack": record_str(device.get("rack")),
+        "role": resolved["role"],
+        "manufacturer": resolved["manufacturer"],
+        "device_type": str(resolved["type"]),
+        "serial": str(device.get("serial")),
+        "platform": str(resolved["platform"]),
+        "primary_ip": address_str(device.get("primary_ip")),
+        "custom_fields": device.get("custom_fields") or {},
+    }
+
+
+# Device values for a listing of device dicts. Status and the other device filters were
+# already applied by NetBox (or by the snapshot), so every device returned is exported.
+def raw_export_values(devices, lookups):
+    for device in devices:
+        yield raw_device_values(device, lookups)
@@ -0,0 +1,293 @@
+# Record Pipeline Module
+# The 'stream' transform of get_devices: devices flow through a chain of generators, from the
+# page fetch to a compact slotted DeviceRecord, and each record is fanned out to every sink
+# (CSV, XLSX, JSON, SQLite, Parquet, Arrow, NDJSON, the --delta state) in a single pass.
+# Nothing holds the whole fleet, so peak memory follows the page size and not the device count.
+import os
+import csv
+import json
+import sqlite3
+import tempfile
+
+from exporters import ColumnWidthTracker, stream_csv_to_xlsx
+from federation import INSTANCE_HEADER
+from profiling import phase_timer
+from table_exports import DEFAULT_CHUNK_ROWS, open_sink, require_pyarrow
+
+# --sink choices and the file each one writes
+SINK_NAMES = ('csv', 'xlsx', 'json', 'sqlite', 'parquet', 'arrow', 'ndjson')
+SINK_PATHS = {
+    'csv': 'output.csv',
+    'xlsx': 'output.xlsx',
+    'json': 'output.json',
+    'sqlite': 'output.db',
+    'parquet': 'output.parquet',
+    'arrow': 'output.arrow',
+}
+
+# Table the sqlite sink writes, one row per device
+SQLITE_TABLE = "devices"
+
+# Export column -> DeviceRecord attribute, in the column order of netbox_api.headers
+RECORD_FIELDS = {
+    'Name': 'name',
+    'Status': 'status',
+    'Site': 'site',
+    'Rack': 'rack',
+    'Role': 'role',
+    'Manufacturer': 'manufacturer',
+    'Type': 'type',
+    'Owner': 'owner',
+    'Birthday': 'birthday',
+    'Age (Months)': 'age',
+    'Service Contract': 'service_contract',
+    'Warranty': 'warranty',
+    'Serial Number': 'serial',
+    'Platform': 'platform',
+    'Software': 'software',
+    'SW_Version': 'sw_version',
+    'Primary IP': 'primary_ip',
+}
+
+
+# One exported device: a fixed set of slots instead of a per-device dict (about a quarter
+# of the size), so buffered chunks stay small. `fields` lists the slots in column order.
+class DeviceRecord:
+    __slots__ = tuple(RECORD_FIELDS.values())
+    fields = __slots__
+
+    def __init__(self, values):
+        for name, value in zip(self.fields, values):
+            setattr(self, name, value)
+
+    # Values in column order
+    def values(self):
+        return tuple(getattr(self, name) for name in self.fields)
+
+
+# A device of a merged multi-instance export, led by the Instance column
+class InstanceDeviceRecord(DeviceRecord):
+    __slots__ = ('instance',)
+    fields = ('instance',) + DeviceRecord.fields
+
+
+# Record class per export header layout
+RECORD_TYPES = {
+    tuple(RECORD_FIELDS): DeviceRecord,
+    (INSTANCE_HEADER,) + tuple(RECORD_FIELDS): InstanceDeviceRecord,
+}
+
+
+# Project export rows (dicts keyed by header) into records. Missing columns are None, as the
+# other transforms leave them.
+def project_records(rows, headers):
+    record_type = RECORD_TYPES.get(tuple(headers))
+    if record_type is None:
+        raise ValueError("DeviceRecord fields don't match the export headers")
+    for row in rows:
+        yield record_type([row.get(header) for header in headers])
+
+
+# Sinks take one record at a time in write() and finish their file in close(). `phase` is the
+# profiling phase their writes are charged to.
+class CsvRecordSink:
+    phase = "csv"
+
+    def __init__(self, path, headers):
+        self.path = path
+        self.width_tracker = ColumnWidthTracker(headers)
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(headers)
+
+    def write(self, record):
+        values = record.values()
+        self._writer.writerow(values)
+        self.width_tracker.update(values)
+
+    def close(self):
+        self._file.close()
+
+
+# A write-only sheet needs its column widths before the first row, so rows are spooled to CSV
+# (the csv sink's own file when there is one, a temporary file otherwise) and streamed into
+# the workbook on close
+class XlsxRecordSink:
+    phase = "xlsx"
+
+    def __init__(self, path, headers, csv_sink=None):
+        self.path = path
+        self._spool = csv_sink
+        self._owns_spool = csv_sink is None
+        if self._owns_spool:
+            spool_file, spool_path = tempfile.mkstemp(suffix='.csv', dir=os.path.dirname(os.path.abspath(path)))
+            os.close(spool_file)
+            self._spool = CsvRecordSink(spool_path, headers)
+
+    def write(self, record):
+        if self._owns_spool:
+            self._spool.write(record)
+
+    # The shared csv sink is closed before this one (sinks close in order)
+    def close(self):
+        if self._owns_spool:
+            self._spool.close()
+        try:
+            stream_csv_to_xlsx(self._spool.path, self.path, self._spool.width_tracker.widths, numeric_headers=('Age (Months)',))
+        finally:
+            if self._owns_spool:
+                os.remove(self._spool.path)
+
+
+# A JSON array of objects keyed by header, one object per line
+class JsonRecordSink:
+    phase = "export"
+
+    def __init__(self, path, headers):
+        self.path = path
+        self.headers = list(headers)
+        self._file = open(path, 'w')
+        self._file.write('[')
+        self._rows = 0
+
+    def write(self, record):
+        self._file.write(',\n' if self._rows else '\n')
+        self._file.write(json.dumps(dict(zip(self.headers, record.values())), ensure_ascii=False))
+        self._rows += 1
+
+    def close(self):
+        self._file.write('\n]\n' if self._rows else ']\n')
+        self._file.close()
+
+
+# One table with a column per header, replaced on every run and inserted in batches
+class SqliteRecordSink:
+    phase = "export"
+
+    def __init__(self, path, headers, batch_rows=5000):
+        self.path = path
+        self.batch_rows = batch_rows
+        self._conn = sqlite3.connect(path)
+        columns = ', '.join('"' + header.replace('"', '""') + '"' for header in headers)
+        self._conn.execute(f"DROP TABLE IF EXISTS {SQLITE_TABLE}")
+        self._conn.execute(f"CREATE TABLE {SQLITE_TABLE} ({columns})")
+        self._insert = f"INSERT INTO {SQLITE_TABLE} VALUES ({', '.join('?' * len(headers))})"
+        self._pending = []
+
+    def write(self, record):
+        self._pending.append(record.values())
+        if len(self._pending) >= self.batch_rows:
+            self._flush()
+
+    def _flush(self):
+        self._conn.executemany(self._insert, self._pending)
+        self._pending = []
+
+    def close(self):
+        self._flush()
+        self._conn.commit()
+        self._conn.close()
+
+
+# Parquet, Arrow and NDJSON through the table_exports sinks, which take column chunks
+class ChunkedRecordSink:
+    phase = "export"
+
+    def __init__(self, export_format, path, headers, stream=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+        self.path = path
+        self.headers = list(headers)
+        self.chunk_rows = chunk_rows
+        self._sink = open_sink(export_format, path, self.headers, stream)
+        self._chunk = []
+        self._written = False
+
+    def write(self, record):
+        self._chunk.append(record)
+        if len(self._chunk) >= self.chunk_rows:
+            self._flush()
+
+    def _flush(self):
+        rows = [record.values() for record in self._chunk]
+        self._sink.write({header: [values[index] for values in rows] for index, header in enumerate(self.headers)})
+        self._chunk = []
+        self._written = True
+
+    def close(self):
+        try:
+            if self._chunk or not self._written:
+                self._flush()
+        finally:
+            self._sink.close()
+
+
+# Feeds the --delta state (an export_delta.DeltaTracker); its report is written after the run
+class DeltaRecordSink:
+    phase = "transform"
+
+    def __init__(self, delta):
+        self.delta = delta
+
+    def write(self, record):
+        self.delta.add_values(record.values())
+
+    def close(self):
+        pass
+
+
+# Sinks for an export format when no --sink is given
+def default_sinks(export_format):
+    return ['csv', 'xlsx'] if export_format == 'xlsx' else [export_format]
+
+
+# Open the named sinks; paths maps sink names to files. CSV opens before XLSX so the workbook is
+# spooled from output.csv instead of a second copy.
+def open_record_sinks(names, paths, headers, stream=None, delta=None):
+    names = sorted(set(names), key=SINK_NAMES.index)
+    for name in names:
+        if name in ('parquet', 'arrow'):
+            require_pyarrow(name)
+    sinks = []
+    csv_sink = None
+    try:
+        for name in names:
+            if name == 'csv':
+                csv_sink = CsvRecordSink(paths['csv'], headers)
+                sinks.append(csv_sink)
+            elif name == 'xlsx':
+                sinks.append(XlsxRecordSink(paths['xlsx'], headers, csv_sink))
+            elif name == 'json':
+                sinks.append(JsonRecordSink(paths['json'], headers))
+            elif name == 'sqlite':
+                sinks.append(SqliteRecordSink(paths['sqlite'], headers))
+            else:
+                sinks.append(ChunkedRecordSink(name, paths.get(name), headers, stream))
+    except Exception:
+        for sink in sinks:
+            sink.close()
+        raise
+    if delta is not None:
+        sinks.append(DeltaRecordSink(delta))
+    return sinks
+
+
+# Send every record to every sink, then close the sinks in order; returns the record count.
+# Each write is charged to its sink's phase, so --profile splits CSV, XLSX and other output.
+def fan_out(records, sinks, progress=None):
+    count = 0
+    try:
+        for record in records:
+            for sink in sinks:
+                phase_timer.push(sink.phase)
+                sink.write(record)
+                phase_timer.pop()
+            count += 1
+            if progress is not None:
+                progress.update()
+    finally:
+        for sink in sinks:
+            phase_timer.push(sink.phase)
+            try:
+                sink.close()
+            finally:
+                phase_timer.pop()
+    return count
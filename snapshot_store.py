@@ -0,0 +1,105 @@
+# Local Inventory Snapshot Module
+import json
+import sqlite3
+
+from parallel_fetch import DEFAULT_WORKERS, DEFAULT_PAGE_SIZE, decode_json, fetch_raw
+from query_filters import filter_values, matches_filters
+
+DEFAULT_SNAPSHOT_PATH = "netbox_snapshot.db"
+
+# Snapshot table name -> (NetBox app, endpoint attribute)
+SNAPSHOT_KINDS = {
+    "devices": ("dcim", "devices"),
+    "racks": ("dcim", "racks"),
+    "device_types": ("dcim", "device_types"),
+    "manufacturers": ("dcim", "manufacturers"),
+    "device_roles": ("dcim", "device_roles"),
+    "platforms": ("dcim", "platforms"),
+    "custom_fields": ("extras", "custom_fields"),
+}
+
+
+# Open (and create if needed) the snapshot database
+def open_snapshot(path=DEFAULT_SNAPSHOT_PATH):
+    conn = sqlite3.connect(path)
+    for kind in SNAPSHOT_KINDS:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {kind} (id INTEGER PRIMARY KEY, last_updated TEXT, data TEXT NOT NULL)")
+    conn.execute("CREATE TABLE IF NOT EXISTS sync_state (kind TEXT PRIMARY KEY, last_sync TEXT, synced_at TEXT)")
+    conn.commit()
+    return conn
+
+
+# Map a pynetbox endpoint (e.g. nb.dcim.device_types) to its snapshot table
+def snapshot_kind(endpoint):
+    kind = endpoint.name.replace("-", "_")
+    if kind not in SNAPSHOT_KINDS:
+        raise KeyError(f"'{endpoint.name}' is not stored in the snapshot")
+    return kind
+
+
+def get_endpoint(nb_instance, kind):
+    app, name = SNAPSHOT_KINDS[kind]
+    return getattr(getattr(nb_instance, app), name)
+
+
+# Sync one kind: pull objects changed since the newest stored last_updated, then drop
+# local rows whose IDs no longer exist on the server
+def sync_kind(conn, nb_instance, kind, workers=DEFAULT_WORKERS, page_size=DEFAULT_PAGE_SIZE):
+    endpoint = get_endpoint(nb_instance, kind)
+    watermark = conn.execute(f"SELECT MAX(last_updated) FROM {kind}").fetchone()[0]
+
+    # Use the server's own timestamps as the watermark so client clock skew cannot skip changes
+    if watermark:
+        changed = fetch_raw(endpoint, workers, page_size, last_updated__gte=watermark)
+    else:
+        changed = fetch_raw(endpoint, workers, page_size)
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {kind} (id, last_updated, data) VALUES (?, ?, ?)",
+        [(item["id"], item.get("last_updated"), json.dumps(item)) for item in changed],
+    )
+
+    # Deletions don't show up in a last_updated query; reconcile against the brief ID listing
+    remote_ids = {item["id"] for item in fetch_raw(endpoint, workers, page_size, brief=1)}
+    local_ids = {row[0] for row in conn.execute(f"SELECT id FROM {kind}")}
+    deleted_ids = local_ids - remote_ids
+    conn.executemany(f"DELETE FROM {kind} WHERE id = ?", [(object_id,) for object_id in deleted_ids])
+
+    new_watermark = conn.execute(f"SELECT MAX(last_updated) FROM {kind}").fetchone()[0]
+    conn.execute(
+        "INSERT OR REPLACE INTO sync_state (kind, last_sync, synced_at) VALUES (?, ?, datetime('now'))",
+        (kind, new_watermark),
+    )
+    conn.commit()
+    return {"kind": kind, "updated": len(changed), "deleted": len(deleted_ids), "total": len(remote_ids)}
+
+
+# Sync every kind held in the snapshot
+def sync_snapshot(conn, nb_instance, workers=DEFAULT_WORKERS, page_size=DEFAULT_PAGE_SIZE):
+    return [sync_kind(conn, nb_instance, kind, workers, page_size) for kind in SNAPSHOT_KINDS]
+
+
+# Return the time of the last completed sync, or None if the snapshot was never synced
+def last_synced_at(conn):
+    return conn.execute("SELECT MIN(synced_at) FROM sync_state").fetchone()[0]
+
+
+# Load stored objects for an endpoint as plain dicts
+def load_raw(conn, endpoint, filters=None):
+    kind = snapshot_kind(endpoint)
+    items = [decode_json(data) for (data,) in conn.execute(f"SELECT data FROM {kind} ORDER BY id")]
+    if filters:
+        return [item for item in items if matches_filters(filter_values(item), filters)]
+    return items
+
+
+# Load stored objects for an endpoint as pynetbox records, applying the same query filters
+# (e.g. {"site": ["dc1"], "status": ["active"]}) NetBox would apply server-side
+def load_records(conn, endpoint, filters=None):
+    kind = snapshot_kind(endpoint)
+    records = []
+    for (data,) in conn.execute(f"SELECT data FROM {kind} ORDER BY id"):
+        item = decode_json(data)
+        if filters and not matches_filters(filter_values(item), filters):
+            continue
+        records.append(endpoint.return_obj(item, endpoint.api, endpoint))
+    return records
@@ -0,0 +1,171 @@
+# Table Export Module
+# Writes the device and rack reports as Parquet, Arrow IPC or newline-delimited JSON.
+# Rows are converted and written CHUNK_ROWS at a time, so memory stays bounded however large
+# the inventory is. pyarrow is only imported for the Parquet and Arrow formats.
+import sys
+import json
+
+# --format choices; 'xlsx' is the CSV + styled XLSX pair
+EXPORT_FORMATS = ('xlsx', 'parquet', 'arrow', 'ndjson')
+
+# File extension per format; ndjson goes to stdout
+FORMAT_EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+DEFAULT_CHUNK_ROWS = 10000
+PARQUET_COMPRESSION = 'zstd'
+
+# Column types of the typed formats; every column not listed is a string
+INTEGER_COLUMNS = ('Age (Months)', 'Rack Unit')
+DATE_COLUMNS = ('Birthday',)
+
+# Flat layout of the rack report: one row per racked device
+RACK_EXPORT_HEADER = ['Rack', 'Site', 'Device Name', 'Role', 'Type', 'Manufacturer', 'Rack Unit']
+
+
+def require_pyarrow(export_format):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise RuntimeError(f"--format {export_format} needs pyarrow (pip install pyarrow)")
+
+
+def arrow_schema(header):
+    import pyarrow as pa
+
+    fields = []
+    for name in header:
+        if name in INTEGER_COLUMNS:
+            fields.append(pa.field(name, pa.int64()))
+        elif name in DATE_COLUMNS:
+            fields.append(pa.field(name, pa.date32()))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def as_integer(value):
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, int):
+        return value
+    text = str(value).strip()
+    return int(text) if text.lstrip('-').isdigit() else None
+
+
+def as_string(value):
+    if value is None or value == '':
+        return None
+    return str(value)
+
+
+# One record batch from a dict of column lists. Dates are parsed by Arrow ('YYYY-MM-DD';
+# anything else becomes null), integers and strings are normalised in Python.
+def record_batch(columns, schema):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    arrays = []
+    for field in schema:
+        values = columns[field.name]
+        if pa.types.is_int64(field.type):
+            arrays.append(pa.array([as_integer(value) for value in values], pa.int64()))
+        elif pa.types.is_date32(field.type):
+            text = pa.array([as_string(value) for value in values], pa.string())
+            parsed = pc.strptime(text, format='%Y-%m-%d', unit='s', error_is_null=True)
+            arrays.append(parsed.cast(pa.date32()))
+        else:
+            arrays.append(pa.array([as_string(value) for value in values], pa.string()))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+# Writers for one output; write() takes a dict of equally long column lists
+class ParquetSink:
+    def __init__(self, path, header):
+        import pyarrow.parquet as pq
+
+        self.schema = arrow_schema(header)
+        self._writer = pq.ParquetWriter(path, self.schema, compression=PARQUET_COMPRESSION)
+
+    def write(self, columns):
+        self._writer.write_batch(record_batch(columns, self.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+class ArrowSink:
+    def __init__(self, path, header):
+        import pyarrow as pa
+
+        self.schema = arrow_schema(header)
+        self._file = pa.OSFile(path, 'wb')
+        self._writer = pa.ipc.new_file(self._file, self.schema)
+
+    def write(self, columns):
+        self._writer.write_batch(record_batch(columns, self.schema))
+
+    def close(self):
+        self._writer.close()
+        self._file.close()
+
+
+# One JSON object per row, keys in header order; integer columns as numbers, empty cells as null
+class NdjsonSink:
+    def __init__(self, stream, header):
+        self.header = header
+        self._stream = stream
+
+    def write(self, columns):
+        names = list(columns)
+        converters = [as_integer if name in INTEGER_COLUMNS else as_string for name in names]
+        for values in zip(*columns.values()):
+            row = {name: convert(value) for name, convert, value in zip(names, converters, values)}
+            self._stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self._stream.flush()
+
+
+def open_sink(export_format, path, header, stream=None):
+    if export_format == 'parquet':
+        require_pyarrow(export_format)
+        return ParquetSink(path, header)
+    if export_format == 'arrow':
+        require_pyarrow(export_format)
+        return ArrowSink(path, header)
+    if export_format == 'ndjson':
+        return NdjsonSink(stream or sys.stdout, header)
+    raise ValueError(f"Unknown export format '{export_format}'. Expected one of: {', '.join(EXPORT_FORMATS[1:])}")
+
+
+# Write rows (dicts keyed by header) in chunks; returns the number of rows written
+def export_rows(rows, header, export_format, path, chunk_rows=DEFAULT_CHUNK_ROWS, stream=None):
+    sink = open_sink(export_format, path, header, stream)
+    row_count = 0
+    try:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                sink.write({name: [item.get(name) for item in chunk] for name in header})
+                row_count += len(chunk)
+                chunk = []
+        if chunk or row_count == 0:
+            sink.write({name: [item.get(name) for item in chunk] for name in header})
+            row_count += len(chunk)
+    finally:
+        sink.close()
+    return row_count
+
+
+# Write a pandas DataFrame (the columnar device report) in chunks of rows
+def export_frame(frame, export_format, path, chunk_rows=DEFAULT_CHUNK_ROWS, stream=None):
+    header = list(frame.columns)
+    sink = open_sink(export_format, path, header, stream)
+    try:
+        for start in range(0, max(len(frame), 1), chunk_rows):
+            chunk = frame.iloc[start:start + chunk_rows]
+            sink.write({name: chunk[name].tolist() for name in header})
+    finally:
+        sink.close()
+    return len(frame)
@@ -0,0 +1,37 @@
+# Shared fixtures: the scripts live at the top of the repository, and the tests run them against
+# mock_netbox.py, in process or as the CLI from a scratch copy of the scripts
+import os
+import sys
+import subprocess
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from benchmark import prepare_workdir
+from mock_netbox import MockNetBoxServer
+
+
+@pytest.fixture(scope="module")
+def mock_netbox():
+    server = MockNetBoxServer(device_count=240).start()
+    yield server
+    server.stop()
+
+
+# Scratch copy of the scripts with a config.py pointing at the mock server
+@pytest.fixture(scope="module")
+def workdir(tmp_path_factory, mock_netbox):
+    directory = tmp_path_factory.mktemp("workdir")
+    prepare_workdir(str(directory), mock_netbox.url)
+    return directory
+
+
+# Runs netbox_api.py with the given arguments in the scratch copy
+@pytest.fixture(scope="module")
+def cli(workdir):
+    def run(*arguments, timeout=120):
+        return subprocess.run([sys.executable, "netbox_api.py"] + list(arguments), cwd=workdir, stdin=subprocess.DEVNULL,
+                              capture_output=True, text=True, timeout=timeout)
+    return run
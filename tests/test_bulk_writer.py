@@ -0,0 +1,90 @@
+# Bulk PATCHes of update_age against mock_netbox.py
+import os
+import json
+
+import pynetbox
+import pytest
+
+from bulk_writer import BulkWriteAborted, bulk_patch
+from http_session import make_session
+from mock_netbox import MockNetBoxServer
+
+
+@pytest.fixture
+def server():
+    server = MockNetBoxServer(device_count=100).start()
+    yield server
+    server.stop()
+
+
+def devices_endpoint(server):
+    nb = pynetbox.api(server.url, token="token")
+    nb.http_session = make_session(retries=0)
+    return nb.dcim.devices
+
+
+def age_updates(device_ids):
+    return [{"id": device_id, "name": f"device-{device_id:06d}", "old_age": None, "age": 7} for device_id in device_ids]
+
+
+# A 400 for one unknown device: the batch is split until only that device fails
+def test_validation_error_isolates_the_rejected_device(server):
+    planned = age_updates(list(range(1, 16)) + [999])
+    result = bulk_patch(devices_endpoint(server), planned, batch_size=16)
+    assert result["changed"] == 15
+    assert result["failed"] == 1
+    assert result["errors"][0][0] == "device-000999"
+    assert all(server.inventory.devices[device_id]["custom_fields"]["age"] == 7 for device_id in range(1, 16))
+
+
+# A 403 fails every device alike, so the run stops instead of splitting the batch
+def test_forbidden_is_raised_without_splitting(server):
+    server.deny_writes_after = 0
+    with pytest.raises(BulkWriteAborted) as aborted:
+        bulk_patch(devices_endpoint(server), age_updates(range(1, 101)), batch_size=10)
+    assert aborted.value.error.req.status_code == 403
+    assert aborted.value.result["changed"] == 0
+    assert server.stats.snapshot()["by_endpoint"] == {"PATCH /api/dcim/devices/": 1}
+
+
+# With several workers the batches not yet started are cancelled after the 403
+@pytest.mark.parametrize("workers", [1, 4])
+def test_forbidden_cancels_the_remaining_batches(server, workers):
+    server.deny_writes_after = 3
+    with pytest.raises(BulkWriteAborted) as aborted:
+        bulk_patch(devices_endpoint(server), age_updates(range(1, 101)), batch_size=5, workers=workers)
+    patches = server.stats.snapshot()["by_endpoint"]["PATCH /api/dcim/devices/"]
+    # The 4th request is refused; batches already taken by other workers are still sent
+    assert patches == 4 if workers == 1 else 4 <= patches < 20
+    assert aborted.value.result["changed"] == 15
+    assert aborted.value.result["requests"] == patches
+
+
+def journal_entries(workdir):
+    with open(os.path.join(workdir, "update_age.journal")) as journal_file:
+        return [json.loads(line) for line in journal_file]
+
+
+# The token is revoked after two batches: the CLI exits non-zero with the resume hint, the journal
+# holds the plan and the two written batches, and --resume writes the rest
+def test_cli_stops_on_forbidden_and_resumes(cli, workdir, mock_netbox):
+    mock_netbox.stats.reset()
+    mock_netbox.deny_writes_after = 2
+    stopped = cli("update_age", "--batch-size", "20", "--write-workers", "1")
+    assert stopped.returncode != 0
+    assert "Rerun with --resume" in stopped.stdout
+    assert mock_netbox.stats.snapshot()["by_endpoint"]["PATCH /api/dcim/devices/"] == 3
+
+    plan, *entries = journal_entries(workdir)
+    planned = [update["id"] for update in plan["updates"]]
+    assert plan["type"] == "plan" and len(planned) > 60
+    assert entries == [{"type": "done", "ids": planned[:20]}, {"type": "done", "ids": planned[20:40]}]
+
+    mock_netbox.deny_writes_after = None
+    resumed = cli("update_age", "--batch-size", "20", "--write-workers", "1", "--resume")
+    assert resumed.returncode == 0, resumed.stderr
+    assert "Resuming" in resumed.stdout
+    done = [device_id for entry in journal_entries(workdir) if entry["type"] == "done" for device_id in entry["ids"]]
+    assert sorted(done) == sorted(planned)
+    ages = {update["id"]: update["age"] for update in plan["updates"]}
+    assert all(mock_netbox.inventory.devices[device_id]["custom_fields"]["age"] == age for device_id, age in ages.items())
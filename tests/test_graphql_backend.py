@@ -0,0 +1,72 @@
+# GraphQL backend against the /graphql/ stub of mock_netbox.py
+import os
+
+import pytest
+import requests
+
+import graphql_backend
+from graphql_backend import GraphQLError, fetch_graphql_devices, graphql_device_values
+from query_filters import graphql_filter_values, matches_filters
+
+
+def output_csv(workdir):
+    with open(os.path.join(workdir, "output.csv"), "rb") as csv_file:
+        return csv_file.read()
+
+
+def test_pages_through_every_device(mock_netbox):
+    # 240 devices in pages of 80: three full pages and an empty one
+    mock_netbox.stats.reset()
+    devices, local_filters = fetch_graphql_devices(requests.Session(), mock_netbox.url, "token", page_size=80)
+    devices = list(devices)
+    assert [int(device["id"]) for device in devices] == sorted(mock_netbox.inventory.devices)
+    assert local_filters == {}
+    assert mock_netbox.stats.snapshot()["by_endpoint"] == {"POST /graphql/": 4}
+
+
+def test_filters_are_sent_to_the_server(mock_netbox):
+    filters = {"site": ["site-001"], "status": ["active"]}
+    devices, local_filters = fetch_graphql_devices(requests.Session(), mock_netbox.url, "token", 100, filters)
+    devices = list(devices)
+    expected = [device for device in mock_netbox.inventory.devices.values()
+                if device["site"]["slug"] == "site-001" and device["status"]["value"] == "active"]
+    assert local_filters == {}
+    assert 0 < len(devices) == len(expected) < len(mock_netbox.inventory.devices)
+    assert all(matches_filters(graphql_filter_values(device), filters) for device in devices)
+
+
+def test_rejected_filters_fall_back_to_local_filtering(mock_netbox, monkeypatch):
+    run_query = graphql_backend.run_query
+
+    def without_filters(session, netbox_url, token, query, variables):
+        if variables.get("filters"):
+            raise GraphQLError("Unknown argument 'filters' on field 'device_list'.")
+        return run_query(session, netbox_url, token, query, variables)
+    monkeypatch.setattr(graphql_backend, "run_query", without_filters)
+
+    filters = {"site": ["site-001"]}
+    devices, local_filters = fetch_graphql_devices(requests.Session(), mock_netbox.url, "token", 100, filters)
+    assert local_filters == filters
+    assert len(list(devices)) == len(mock_netbox.inventory.devices)
+
+
+def test_device_values_render_like_the_rest_records(mock_netbox):
+    devices, _ = fetch_graphql_devices(requests.Session(), mock_netbox.url, "token", 100)
+    values = {int(device["id"]): graphql_device_values(device) for device in devices}
+    unplaced = next(device_id for device_id, device in mock_netbox.inventory.devices.items() if device["platform"] is None)
+    assert values[unplaced]["platform"] == "None"
+    first = mock_netbox.inventory.devices[1]
+    assert values[1]["status"] == first["status"]["label"]
+    assert values[1]["primary_ip"] == first["primary_ip"]["address"]
+    assert values[1]["device_type"] == first["device_type"]["model"]
+
+
+# The client path: get_devices through the CLI writes the same output.csv with either backend
+@pytest.mark.parametrize("filters", [[], ["--site", "site-001"], ["--status", "any", "--role", "router"]])
+def test_cli_export_matches_rest(cli, workdir, filters):
+    rest = cli("get_devices", "--backend", "rest", *filters)
+    assert rest.returncode == 0, rest.stderr
+    expected = output_csv(workdir)
+    graphql = cli("get_devices", "--backend", "graphql", *filters)
+    assert graphql.returncode == 0, graphql.stderr
+    assert output_csv(workdir) == expected
@@ -0,0 +1,170 @@
+# serve/watch mode: webhook round-trips against the daemon, with mock_netbox.py as NetBox and
+# as the webhook sender
+import os
+import csv
+import sys
+import hmac
+import json
+import time
+import socket
+import hashlib
+import subprocess
+import urllib.error
+import urllib.request
+
+import pytest
+
+from mock_netbox import post_webhook
+from watch_daemon import Debouncer
+
+SECRET = "s3cret"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.loads(response.read())
+
+
+# POST a raw body signed with `secret`; returns (status, reply)
+def post_body(url, body, secret=SECRET):
+    signature = hmac.new(secret.encode("utf-8"), body, hashlib.sha512).hexdigest()
+    request = urllib.request.Request(url, data=body, method="POST",
+                                     headers={"Content-Type": "application/json", "X-Hook-Signature": signature})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+
+# Wait until `condition()` returns a true value and return it
+def wait_for(condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = condition()
+        if result:
+            return result
+        time.sleep(0.1)
+    raise AssertionError("condition not met within %ss" % timeout)
+
+
+def csv_rows(workdir):
+    with open(os.path.join(workdir, "output.csv"), newline="") as csv_file:
+        return list(csv.DictReader(csv_file))
+
+
+# The daemon in its own process, exporting every status, with a short debounce
+@pytest.fixture(scope="module")
+def daemon(workdir):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, "netbox_api.py", "serve", "--listen", f"127.0.0.1:{port}", "--debounce", "0.2",
+                                "--webhook-secret", SECRET, "--status", "any"],
+                               cwd=workdir, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+
+    def ready():
+        try:
+            return get_json(f"{base_url}/status")
+        except OSError:
+            assert process.poll() is None, "serve exited during startup"
+            return None
+    wait_for(ready, timeout=60)
+    yield base_url
+    process.terminate()
+    process.wait(timeout=30)
+
+
+def test_device_webhook_regenerates_csv_row(daemon, workdir, mock_netbox):
+    device = dict(mock_netbox.inventory.devices[5], serial="SN-WEBHOOK", status={"value": "active", "label": "Active"})
+    assert post_webhook(f"{daemon}/webhook", "updated", "device", device, SECRET) == 200
+
+    row = wait_for(lambda: next((row for row in csv_rows(workdir) if row["Serial Number"] == "SN-WEBHOOK"), None))
+    assert row["Name"] == device["name"]
+    assert row["Status"] == "Active"
+    assert row["Rack"] == device["rack"]["name"]
+
+
+def test_platform_created_after_startup_is_resolved(daemon, workdir, mock_netbox):
+    inventory = mock_netbox.inventory
+    with inventory.lock:
+        platform = inventory.platforms[99] = inventory.obj("dcim", "platforms", 99, name="nx-os", slug="nx-os")
+    device = dict(inventory.devices[8], serial="SN-PLATFORM", platform=inventory.brief(platform, "name", "slug"))
+    assert post_webhook(f"{daemon}/webhook", "updated", "device", device, SECRET) == 200
+
+    row = wait_for(lambda: next((row for row in csv_rows(workdir) if row["Serial Number"] == "SN-PLATFORM"), None))
+    assert row["Platform"] == "nx-os"
+
+
+def test_deleted_device_leaves_csv(daemon, workdir, mock_netbox):
+    device = mock_netbox.inventory.devices[6]
+    assert post_webhook(f"{daemon}/webhook", "deleted", "device", device, SECRET) == 200
+    wait_for(lambda: all(row["Name"] != device["name"] for row in csv_rows(workdir)))
+
+
+def test_rack_rename_updates_device_rows(daemon, workdir, mock_netbox):
+    rack = dict(mock_netbox.inventory.racks[3], name="rack-renamed", display="rack-renamed")
+    members = {device["name"] for device in mock_netbox.inventory.devices.values() if device["rack"]["id"] == 3}
+    assert post_webhook(f"{daemon}/webhook", "updated", "rack", rack, SECRET) == 200
+
+    def renamed():
+        rows = [row for row in csv_rows(workdir) if row["Name"] in members]
+        return rows and all(row["Rack"] == "rack-renamed" for row in rows)
+    wait_for(renamed)
+
+
+def test_bad_signature_is_rejected(daemon):
+    status, reply = post_body(f"{daemon}/webhook", b'{"event": "updated", "model": "device", "data": {"id": 1}}', secret="wrong")
+    assert status == 403
+    assert reply["detail"] == "Invalid signature."
+
+
+@pytest.mark.parametrize("body", [b"not json", b"[]", b'"device"', b"1", b'{"event": "updated", "model": "device", "data": [1]}'])
+def test_malformed_body_is_rejected(daemon, body):
+    status, reply = post_body(f"{daemon}/webhook", body)
+    assert status == 400
+    assert reply["detail"]
+
+
+def test_status_counters(daemon, mock_netbox):
+    before = get_json(f"{daemon}/status")
+    assert before["racks"] == len(mock_netbox.inventory.racks)
+
+    device = dict(mock_netbox.inventory.devices[7], serial="SN-STATUS")
+    assert post_webhook(f"{daemon}/webhook", "updated", "device", device, SECRET) == 200
+    assert post_webhook(f"{daemon}/webhook", "updated", "site", mock_netbox.inventory.sites[1], SECRET) == 200
+
+    after = wait_for(lambda: (lambda status: status if status["regenerations"] > before["regenerations"] else None)(get_json(f"{daemon}/status")))
+    assert after["events"] == before["events"] + 1
+    assert after["ignored"] == before["ignored"] + 1
+    assert after["devices"] == before["devices"]
+    assert after["failures"] == 0
+    assert after["last_error"] is None
+
+
+# A regeneration that fails keeps its IDs pending and is retried after the backoff
+def test_failed_regeneration_is_retried():
+    calls = []
+
+    def callback(devices, racks):
+        calls.append((set(devices), set(racks)))
+        if len(calls) == 1:
+            raise OSError("disk full")
+
+    debouncer = Debouncer(callback, delay=0.01)
+    try:
+        debouncer.touch({1, 2}, {3})
+        wait_for(lambda: debouncer.failures == 1)
+        assert debouncer.last_error == "disk full"
+        debouncer.touch({4}, set())
+        wait_for(lambda: debouncer.regenerations == 1, timeout=10)
+    finally:
+        debouncer.stop()
+    assert calls == [({1, 2}, {3}), ({1, 2, 4}, {3})]
+    assert debouncer.failures == 0
+    assert debouncer.last_error is None
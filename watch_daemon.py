@@ -0,0 +1,257 @@
+# Watch Daemon Module
+# Long-running 'serve' mode: the device and rack inventory stays in memory, NetBox webhooks for
+# device and rack create/update/delete are applied to it as they arrive, and the exports are
+# regenerated from memory for the objects that changed. Events are debounced, so a burst of
+# edits produces one rewrite.
+import hmac
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Defaults for --listen, --debounce and the longest a steady stream of events can delay a rewrite
+DEFAULT_LISTEN = "127.0.0.1:8081"
+DEFAULT_DEBOUNCE = 2.0
+MAX_WAIT_FACTOR = 10
+
+# A failed regeneration is retried after max(debounce, 1s), doubling per consecutive failure up to this many seconds
+MAX_RETRY_BACKOFF = 300.0
+
+# Webhook models the daemon keeps in memory
+WATCHED_MODELS = ("device", "rack")
+WEBHOOK_EVENTS = ("created", "updated", "deleted")
+
+
+def parse_listen(listen):
+    host, _, port = listen.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+# NetBox signs the body with HMAC-SHA512 of the webhook secret in X-Hook-Signature
+def verify_signature(secret, body, signature):
+    if not secret:
+        return True
+    expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(expected, signature or "")
+
+
+def related_id(item, name):
+    nested = item.get(name) if item else None
+    return nested.get("id") if isinstance(nested, dict) else None
+
+
+# Devices and racks by ID as NetBox serializes them, plus the device IDs in each rack
+class InventoryState:
+    def __init__(self, devices, racks):
+        self.lock = threading.Lock()
+        self.devices = {item["id"]: item for item in devices}
+        self.racks = {item["id"]: item for item in racks}
+        self.rack_devices = {}
+        for device in self.devices.values():
+            self._index(device)
+        self.events = 0
+        self.ignored = 0
+
+    def _index(self, device):
+        rack_id = related_id(device, "rack")
+        if rack_id is not None:
+            self.rack_devices.setdefault(rack_id, set()).add(device["id"])
+
+    def _unindex(self, device):
+        rack_id = related_id(device, "rack")
+        if rack_id is not None:
+            self.rack_devices.get(rack_id, set()).discard(device["id"])
+
+    # NetBox renames a rack, or moves its devices to the rack's new site, without sending device
+    # webhooks; carry both into the rack's devices so their rows follow
+    def _follow_rack(self, device_id, rack):
+        device = self.devices[device_id]
+        nested = dict(device.get("rack") or {}, name=rack.get("name"))
+        if "display" in rack:
+            nested["display"] = rack["display"]
+        self.devices[device_id] = dict(device, rack=nested)
+        if isinstance(rack.get("site"), dict):
+            self.devices[device_id]["site"] = rack["site"]
+
+    # Apply one webhook payload; returns the affected (device IDs, rack IDs). A device that moves
+    # racks affects both racks; a rack that changes affects itself and the devices in it.
+    # Raises ValueError when the body or its data is not a JSON object.
+    def apply(self, payload):
+        if not isinstance(payload, dict):
+            raise ValueError("Webhook body is not a JSON object.")
+        data = payload.get("data")
+        if data is None:
+            data = {}
+        if not isinstance(data, dict):
+            raise ValueError("Webhook 'data' is not a JSON object.")
+        model = payload.get("model")
+        event = payload.get("event")
+        object_id = data.get("id")
+        if model not in WATCHED_MODELS or event not in WEBHOOK_EVENTS or not isinstance(object_id, int):
+            with self.lock:
+                self.ignored += 1
+            return set(), set()
+
+        with self.lock:
+            self.events += 1
+            if model == "rack":
+                members = set(self.rack_devices.get(object_id, ()))
+                if event == "deleted":
+                    self.racks.pop(object_id, None)
+                else:
+                    self.racks[object_id] = data
+                    for device_id in members:
+                        self._follow_rack(device_id, data)
+                return members, {object_id}
+
+            affected_racks = set()
+            previous = self.devices.pop(object_id, None)
+            if previous is not None:
+                self._unindex(previous)
+                affected_racks.add(related_id(previous, "rack"))
+            if event != "deleted":
+                self.devices[object_id] = data
+                self._index(data)
+                affected_racks.add(related_id(data, "rack"))
+            affected_racks.discard(None)
+            return {object_id}, affected_racks
+
+
+# Collects affected IDs and calls callback(device_ids, rack_ids) once no event arrived for
+# `delay` seconds, or at the latest `max_wait` seconds after the first pending event
+class Debouncer:
+    def __init__(self, callback, delay=DEFAULT_DEBOUNCE, max_wait=None):
+        self.callback = callback
+        self.delay = delay
+        self.max_wait = max_wait if max_wait is not None else delay * MAX_WAIT_FACTOR
+        self.regenerations = 0
+        self.failures = 0
+        self.last_error = None
+        self._devices = set()
+        self._racks = set()
+        self._first = None
+        self._last = None
+        self._retry_at = None
+        self._stopping = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="regenerate", daemon=True)
+        self._thread.start()
+
+    def touch(self, device_ids, rack_ids):
+        if not device_ids and not rack_ids:
+            return
+        with self._condition:
+            now = time.monotonic()
+            self._devices |= device_ids
+            self._racks |= rack_ids
+            self._first = self._first or now
+            self._last = now
+            self._condition.notify()
+
+    # When the pending IDs are due; after a failure not before the retry backoff has passed
+    def _deadline(self):
+        due = min(self._last + self.delay, self._first + self.max_wait)
+        return due if self._retry_at is None else max(due, self._retry_at)
+
+    def _due(self, now):
+        return now >= self._deadline()
+
+    def _take(self):
+        devices, racks = self._devices, self._racks
+        self._devices, self._racks = set(), set()
+        self._first = self._last = None
+        return devices, racks
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopping and (self._first is None or not self._due(time.monotonic())):
+                    timeout = None if self._first is None else max(0.0, self._deadline() - time.monotonic())
+                    self._condition.wait(timeout)
+                if self._stopping:
+                    return
+                devices, racks = self._take()
+            self._regenerate(devices, racks)
+
+    def _regenerate(self, devices, racks):
+        try:
+            self.callback(devices, racks)
+        except Exception as error:
+            # Keep serving: put the IDs back with any that arrived meanwhile and retry them after a
+            # backoff, so the failed rows and sheets don't stay stale until the next event for them
+            with self._condition:
+                self.failures += 1
+                self.last_error = str(error)
+                now = time.monotonic()
+                self._devices |= devices
+                self._racks |= racks
+                self._first = self._first or now
+                self._last = self._last or now
+                self._retry_at = now + min(max(self.delay, 1.0) * 2 ** (self.failures - 1), MAX_RETRY_BACKOFF)
+                self._condition.notify()
+            return
+        with self._condition:
+            self.regenerations += 1
+            self.failures = 0
+            self.last_error = None
+            self._retry_at = None
+
+    # Stop the worker and run any pending regeneration right away
+    def stop(self):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join()
+        if self._first is not None:
+            self._regenerate(*self._take())
+
+
+# HTTP endpoint NetBox posts webhooks to (POST /webhook), plus GET /status with counters
+def make_webhook_server(listen, state, debouncer, secret=None, logger=None):
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/webhook":
+                self._reply(404, {"detail": "Not found."})
+                return
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if not verify_signature(secret, body, self.headers.get("X-Hook-Signature")):
+                self._reply(403, {"detail": "Invalid signature."})
+                return
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                self._reply(400, {"detail": "Body is not JSON."})
+                return
+            try:
+                devices, racks = state.apply(payload)
+            except ValueError as error:
+                self._reply(400, {"detail": str(error)})
+                return
+            debouncer.touch(devices, racks)
+            if logger is not None:
+                logger.debug("Webhook %s %s %s", payload.get("event"), payload.get("model"), (payload.get("data") or {}).get("id"))
+            self._reply(200, {"devices": sorted(devices), "racks": sorted(racks)})
+
+        def do_GET(self):
+            if self.path.rstrip("/") != "/status":
+                self._reply(404, {"detail": "Not found."})
+                return
+            with state.lock:
+                body = {"devices": len(state.devices), "racks": len(state.racks), "events": state.events, "ignored": state.ignored}
+            body.update(regenerations=debouncer.regenerations, failures=debouncer.failures, last_error=debouncer.last_error)
+            self._reply(200, body)
+
+        def log_message(self, format, *args):
+            if logger is not None:
+                logger.debug("Webhook server: " + format, *args)
+
+    return ThreadingHTTPServer(parse_listen(listen), WebhookHandler)